@@ -18,6 +18,9 @@ from base64 import urlsafe_b64encode
 from base58 import b58decode, b58encode
 from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
 from requests import Request, Session
+from utils.http import get_session
+from utils.dbconn import db_connect
+from utils.singleflight import single_flight
 import sqlite3
 from typing import Dict, Optional, Any
 from datetime import datetime, timedelta
@@ -62,7 +65,7 @@ ORDERLY_BASE_URL = "https://api.orderly.org"
 
 # generar private key desde secret base58
 _private_key = Ed25519PrivateKey.from_private_bytes(b58decode(ORDERLY_SECRET))
-_session = Session()
+_session = get_session()
 
 if not ORDERLY_SECRET:
     raise ValueError("❌ FALTA la variable ORDERLY_SECRET en el archivo .env")
@@ -72,7 +75,7 @@ try:
 except Exception as e:
     raise ValueError(f"❌ Error al decodificar ORDERLY_SECRET: {e}")
 
-_session = Session()
+_session = get_session()
 
 # derivar public key base58 (esta es la que va en el header orderly-key)
 ORDERLY_PUBLIC_KEY_B58 = "ed25519:" + b58encode(
@@ -105,6 +108,7 @@ def _sign_request(req: Request) -> Request:
     return req
 
 
+@single_flight(lambda method, path, params=None: ("aden", method, path, params) if method.upper() == "GET" else None)
 def _send_request(method: str, path: str, params=None):
     """Versión simplificada sin debug"""
     url = f"{ORDERLY_BASE_URL}{path}"
@@ -530,7 +534,7 @@ def save_aden_closed_positions(db_path="portfolio.db", debug=False):
     Versión mejorada similar a save_gate_closed_positions
     """
     import os, sqlite3
-    from db_manager import save_closed_position
+    from db_manager import save_closed_positions_bulk, closed_position_exists
 
     print("💾 Guardando posiciones cerradas de Aden en portfolio.db")
 
@@ -543,26 +547,18 @@ def save_aden_closed_positions(db_path="portfolio.db", debug=False):
         print("⚠️ No se obtuvieron posiciones cerradas de Aden.")
         return 0
 
-    conn = sqlite3.connect(db_path)
+    conn = db_connect(db_path)
     cur = conn.cursor()
-    saved, skipped = 0, 0
+    batch, skipped = [], 0
 
     for pos in closed_positions:
         try:
             # Deduplicación por (exchange, symbol, close_time) - igual que Gate
-            cur.execute(
-                """
-                SELECT COUNT(*) FROM closed_positions
-                WHERE exchange = ? AND symbol = ? AND close_time = ?
-            """,
-                (pos["exchange"], pos["symbol"], pos["close_time"]),
-            )
-
-            if cur.fetchone()[0]:
+            if closed_position_exists(cur, pos["exchange"], pos["symbol"], pos["close_time"]):
                 skipped += 1
                 continue
 
-            # Mapear a los nombres que espera save_closed_position
+            # Mapear a los nombres que espera save_closed_positions_bulk
             position_data = {
                 "exchange": pos["exchange"],
                 "symbol": pos["symbol"],
@@ -582,13 +578,13 @@ def save_aden_closed_positions(db_path="portfolio.db", debug=False):
                 "initial_margin": pos.get("initial_margin"),
             }
 
-            save_closed_position(position_data)
-            saved += 1
+            batch.append(position_data)
 
         except Exception as e:
             print(f"⚠️ Error guardando posición {pos.get('symbol')} (Aden): {e}")
 
     conn.close()
+    saved = save_closed_positions_bulk(batch, db_path=db_path)
     print(f"✅ Aden guardadas: {saved} | omitidas (duplicadas): {skipped}")
     return saved
 
@@ -3,12 +3,23 @@ import os, time, hmac, hashlib
 from datetime import datetime, timedelta, timezone
 from typing import Dict, Any, List, Optional
 import sqlite3
-from db_manager import save_closed_position
+from db_manager import save_closed_positions_bulk, closed_position_exists
 
 import requests
 from requests.exceptions import RequestException
 
 from utils.symbols import normalize_symbol  # único import interno que pediste
+from utils.http import get_session
+from utils.dbconn import db_connect
+from utils.singleflight import single_flight
+from utils.ratelimit import acquire
+from utils.resilience import call_with_retry
+from utils.clock import register_time_source, server_now_ms, is_timestamp_error, resync
+from utils.windows import fetch_windows, split_windows
+from utils.persymbol import for_each_symbol
+from utils.hostpool import HostPool
+
+_HTTP = get_session()  # pool keep-alive compartido entre adapters
 
 # ========== Config y hosts ==========
 # Host principal según la documentación
@@ -28,6 +39,35 @@ ASTER_API_SECRET = os.getenv("ASTER_API_SECRET") or ""
 _user_host = (os.getenv("ASTER_HOST") or _DEFAULT_HOST).rstrip("/")
 _HOSTS = [h.rstrip("/") for h in ([_user_host] + [x for x in _FALLBACK_HOSTS if x.rstrip("/") != _user_host])]
 
+# Sondeo de salud de hosts (s); 0 = solo métricas de las requests reales
+ASTER_HOST_PROBE_SEC = float(os.getenv("ASTER_HOST_PROBE_SEC", "60"))
+# Timeout de conexión por host: un host caído no debe costar el timeout completo
+ASTER_CONNECT_TIMEOUT = float(os.getenv("ASTER_CONNECT_TIMEOUT", "4"))
+
+
+def _probe_host(host: str):
+    r = _HTTP.get(f"{host}/fapi/v1/time", timeout=(ASTER_CONNECT_TIMEOUT, 8))
+    r.raise_for_status()
+    return r
+
+
+# Orden de hosts por latencia/errores, con failover sticky (utils.hostpool)
+_HOST_POOL = HostPool("aster", _HOSTS, probe=_probe_host, interval=ASTER_HOST_PROBE_SEC)
+
+
+def _aster_server_time_ms() -> int:
+    for host in _HOST_POOL.ordered():
+        try:
+            r = _probe_host(host)
+            _HOST_POOL.record_success(host)  # la latencia la mide solo el sondeo
+            return int(r.json()["serverTime"])
+        except RequestException as e:
+            _HOST_POOL.record_failure(host, repr(e))
+            continue
+    raise ConnectionError("Ningún host de Aster devolvió /fapi/v1/time")
+
+register_time_source("aster", _aster_server_time_ms)
+
 
 def _require_keys():
     if not ASTER_API_KEY or not ASTER_API_SECRET:
@@ -40,32 +80,57 @@ def _sign(params: Dict[str, Any]) -> Dict[str, Any]:
     params["signature"] = sig
     return params
 
+@single_flight(lambda path, params=None, timeout=30: ("aster", "GET", path, (params, timeout)))
 def aster_signed_request(path: str, params: Optional[Dict[str, Any]] = None, timeout=30) -> Any:
     """
-    GET firmado estilo MBX. Rota entre hosts hasta que uno responda.
-    Lanza excepción con el resumen de errores si todos fallan.
+    GET firmado estilo MBX. Va al host más rápido y sano (_HOST_POOL) y, si
+    falla, al siguiente. Lanza excepción con el resumen de errores si todos fallan.
     """
     _require_keys()
-    base = {"timestamp": int(time.time() * 1000), "recvWindow": 5000}
-    if params:
-        base.update(params)
-    signed = _sign(base)
+
+    def _signed():
+        # hora del servidor con offset cacheado (utils.clock)
+        base = {"timestamp": server_now_ms("aster"), "recvWindow": 5000}
+        if params:
+            base.update(params)
+        return _sign(base)
+
     headers = {"X-MBX-APIKEY": ASTER_API_KEY, "User-Agent": "python-requests"}
 
+    acquire("aster", path=path)
     last_errs = []
-    for host in _HOSTS:
+    hosts = _HOST_POOL.ordered()
+    for host in hosts:
         url = f"{host}{path}"
+
+        def _send(url=url):
+            # firma nueva en cada intento (y tras resync de reloj)
+            r = _HTTP.get(url, params=_signed(), headers=headers, timeout=(ASTER_CONNECT_TIMEOUT, timeout))
+            if is_timestamp_error(r):
+                resync("aster")
+                r = _HTTP.get(url, params=_signed(), headers=headers, timeout=(ASTER_CONNECT_TIMEOUT, timeout))
+            return r
+
         try:
-            r = requests.get(url, params=signed, headers=headers, timeout=timeout)
+            # reintentos/Retry-After/breaker por host; el failover entre hosts sigue aquí
+            r = call_with_retry(
+                f"aster@{host.split('://')[-1]}", _send, retries=2, path=path, rate_limit=False
+            )
+            if r.status_code >= 500:
+                _HOST_POOL.record_failure(host, f"HTTP {r.status_code}")
+            else:
+                _HOST_POOL.record_success(host)  # host vivo aunque sea un 4xx; sin latencia
             r.raise_for_status()
             return r.json()
         except RequestException as e:
+            if not isinstance(e, requests.HTTPError):
+                _HOST_POOL.record_failure(host, repr(e))
             # Guardamos el error y probamos el siguiente host
             last_errs.append(f"{host}: {repr(e)}")
             continue
 
     raise ConnectionError("Todos los hosts fallaron para "
-                          f"{path}. Intentados: {', '.join(_HOSTS)}. "
+                          f"{path}. Intentados: {', '.join(hosts)}. "
                           f"Errores: {' | '.join(last_errs[-3:])}")
     
 # === Helpers de costes para OPEN POSITIONS (reutiliza aster_signed_request) ===
@@ -360,7 +425,7 @@ def fetch_aster_open_positions():
             print(f"\n🔍 Obteniendo timestamps de apertura...")
             print(f"   Ventana de búsqueda: {datetime.fromtimestamp(search_start_ms/1000)} → ahora")
 
-        for symbol in set(symbols_to_fetch):
+        def _first_trade_ms(symbol: str) -> int:
             try:
                 # Buscar el PRIMER trade de este símbolo en la ventana
                 params = {
@@ -373,25 +438,23 @@ def fetch_aster_open_positions():
                 
                 if trades and len(trades) > 0:
                     first_trade_time = int(trades[0].get("time", 0))
-                    symbol_open_times[symbol] = first_trade_time
-                    
                     if debug:
                         print(f"   ✅ {symbol}: Primer trade en {datetime.fromtimestamp(first_trade_time/1000)}")
+                    return first_trade_time
                 else:
                     # Fallback: asumir última semana si no hay trades
-                    fallback_time = now_ms - 7 * 24 * 60 * 60 * 1000
-                    symbol_open_times[symbol] = fallback_time
-                    
                     if debug:
                         print(f"   ⚠️ {symbol}: Sin trades encontrados, usando fallback (7 días)")
-
-                time.sleep(0.05)  # Rate limiting
+                    return now_ms - 7 * 24 * 60 * 60 * 1000
 
             except Exception as e:
                 # Fallback silencioso: última semana
-                symbol_open_times[symbol] = now_ms - 7 * 24 * 60 * 60 * 1000
                 if debug:
                     print(f"   ❌ {symbol}: Error obteniendo trades: {e}, usando fallback")
+                return now_ms - 7 * 24 * 60 * 60 * 1000
+
+        # Un userTrades por símbolo: en paralelo (acotado por exchange)
+        symbol_open_times.update(for_each_symbol("aster", symbols_to_fetch, _first_trade_ms))
 
         # 4️⃣ Calcular costos para cada posición usando timestamp real
         if debug:
@@ -562,10 +625,7 @@ def fetch_funding_aster_windowed(
     seen: set = set()
     step_ms = int(step_days) * 24 * 3600 * 1000
 
-    start = int(since_ms)
-    while start <= until_ms:
-        end = min(start + step_ms - 1, until_ms)
-
+    def _pull(start: int, end: int) -> List[Dict[str, Any]]:
         params: Dict[str, Any] = {
             "incomeType": "FUNDING_FEE",
             "startTime": start,
@@ -579,7 +639,10 @@ def fetch_funding_aster_windowed(
         if debug:
             print(f"[Aster][{datetime.utcfromtimestamp(start/1000):%Y-%m-%d}→{datetime.utcfromtimestamp(end/1000):%Y-%m-%d}] "
                   f"items={len(data)}")
+        return data
 
+    # ventanas en paralelo; el dedupe se hace después, en orden de ventana
+    for data in fetch_windows(_pull, split_windows(since_ms, until_ms, step_ms)):
         for it in data:
             try:
                 ts = int(it.get("time") or it.get("timestamp") or it.get("tranTime") or 0)
@@ -604,9 +667,6 @@ def fetch_funding_aster_windowed(
             except Exception:
                 continue
 
-        start = end + 1
-        time.sleep(0.05)  # mimos al RL
-
     # orden cronológico (por si acaso)
     out.sort(key=lambda x: x["timestamp"] or 0)
     if debug and out:
@@ -821,7 +881,6 @@ def fetch_closed_positions_aster(
                 if debug:
                     print(f"[Aster] userTrades error {raw_sym} @ {c0:%Y-%m-%d}: {e}")
             cursor = c1
-            time.sleep(0.20)
 
         if debug:
             print(f"[Aster] {raw_sym}: Total trades descargados: {len(all_trades)}")
@@ -957,9 +1016,9 @@ def save_aster_closed_positions(db_path="portfolio.db", days=30, debug=False):
         return 0, 0
 
     # 2) Abrir conexión y preparar deduplicación
-    conn = sqlite3.connect(db_path)
+    conn = db_connect(db_path)
     cur = conn.cursor()
-    saved = 0
+    batch = []
     skipped = 0
 
     def to_ts(dt_str: str | None):
@@ -976,16 +1035,12 @@ def save_aster_closed_positions(db_path="portfolio.db", days=30, debug=False):
             open_ts  = to_ts(pos.get("open_date"))
             close_ts = to_ts(pos.get("close_date"))
 
-            cur.execute("""
-                SELECT COUNT(*) FROM closed_positions
-                WHERE exchange = ? AND symbol = ? AND close_time = ?
-            """, (pos["exchange"], pos["symbol"], close_ts))
-            if cur.fetchone()[0]:
+            if closed_position_exists(cur, pos["exchange"], pos["symbol"], close_ts):
                 skipped += 1
                 continue
 
-            # usa el writer centralizado
-            save_closed_position({
+            # usa el writer centralizado (un solo lote al final)
+            batch.append({
                 "exchange": pos["exchange"],
                 "symbol": pos["symbol"],
                 "side": pos["side"],
@@ -1001,11 +1056,12 @@ def save_aster_closed_positions(db_path="portfolio.db", days=30, debug=False):
                 "leverage": None,
                 "liquidation_price": None,
             })
-            saved += 1
 
         except Exception as e:
             print(f"⚠️ Error guardando posición {pos.get('symbol')} (Aster): {e}")
 
+    saved = save_closed_positions_bulk(batch, db_path=db_path)
+
     # 4) Cerrar correctamente
     try:
         conn.commit()
@@ -1213,20 +1269,13 @@ if __name__ == "__main__":
 # ========== Diagnóstico rápido ==========
 def diagnose_aster_hosts():
     """
-    Intenta /fapi/v1/time en todos los hosts para ver cuál responde.
+    Sondea /fapi/v1/time en todos los hosts ahora mismo (alimenta _HOST_POOL)
+    y devuelve cuáles responden, el orden que se usará y las métricas por host.
     """
-    base = {"timestamp": int(time.time() * 1000), "recvWindow": 5000}
-    headers = {"X-MBX-APIKEY": ASTER_API_KEY or "dummy"}
-    ok = []
-    bad = []
-    for host in _HOSTS:
-        url = f"{host}/fapi/v1/time"
-        try:
-            r = requests.get(url, params=base, headers=headers, timeout=8)
-            r.raise_for_status()
-            ok.append(host)
-        except Exception as e:
-            bad.append((host, str(e)))
-    return {"ok": ok, "bad": bad, "order": _HOSTS}
+    results = _HOST_POOL.probe_all()
+    stats = _HOST_POOL.status()
+    ok = [h for h, good in results.items() if good]
+    bad = [(h, stats[h]["last_error"]) for h, good in results.items() if not good]
+    return {"ok": ok, "bad": bad, "order": _HOST_POOL.ordered(), "hosts": stats}
 
 
@@ -12,6 +12,11 @@ def _backpack_debug(msg: str) -> None:
 from flask import Flask, render_template, jsonify
 import pandas as pd
 import requests
+from utils.http import get_session
+from utils.resilience import call_with_retry
+from utils.dbconn import db_connect
+
+_HTTP = get_session()  # pool keep-alive compartido entre adapters
 import time
 import hashlib
 import statistics
@@ -37,7 +42,7 @@ from collections import defaultdict
 from datetime import datetime, timedelta
 from collections import defaultdict
 import sqlite3
-from db_manager import init_db, save_closed_position
+from db_manager import init_db, save_closed_positions_bulk, closed_position_exists
 import re
 
 
@@ -106,29 +111,33 @@ def backpack_signed_request(
     if not BACKPACK_API_KEY or not BACKPACK_API_SECRET:
         raise RuntimeError("Missing BACKPACK_API_KEY / BACKPACK_API_SECRET")
 
-    ts_ms = int(time.time() * 1000)
+    if method.upper() not in ("GET", "POST"):
+        raise ValueError(f"Unsupported method: {method}")
     window_ms = 5000
 
     # Los params que se firman son:
     sign_params = params if method.upper() == "GET" else (body or {})
+    url = f"{BACKPACK_BASE_URL}{path}"
 
-    signature_b64 = _bp_sign_message(instruction, sign_params, ts_ms, window_ms)
-    headers = {
-        "X-API-KEY": BACKPACK_API_KEY,
-        "X-SIGNATURE": signature_b64,
-        "X-TIMESTAMP": str(ts_ms),
-        "X-WINDOW": str(window_ms),
-        "Content-Type": "application/json; charset=utf-8",
-        **UA_HEADERS,
-    }
+    def _send():
+        # firma nueva por intento: un reintento no reutiliza un timestamp viejo
+        ts_ms = int(time.time() * 1000)
+        signature_b64 = _bp_sign_message(instruction, sign_params, ts_ms, window_ms)
+        headers = {
+            "X-API-KEY": BACKPACK_API_KEY,
+            "X-SIGNATURE": signature_b64,
+            "X-TIMESTAMP": str(ts_ms),
+            "X-WINDOW": str(window_ms),
+            "Content-Type": "application/json; charset=utf-8",
+            **UA_HEADERS,
+        }
+        if method.upper() == "GET":
+            return _HTTP.get(url, headers=headers, params=params or {}, timeout=30)
+        return _HTTP.post(url, headers=headers, json=(body or {}), timeout=30)
 
-    url = f"{BACKPACK_BASE_URL}{path}"
-    if method.upper() == "GET":
-        r = requests.get(url, headers=headers, params=params or {}, timeout=30)
-    elif method.upper() == "POST":
-        r = requests.post(url, headers=headers, json=(body or {}), timeout=30)
-    else:
-        raise ValueError(f"Unsupported method: {method}")
+    r = call_with_retry(
+        "backpack", _send, retries=3 if method.upper() == "GET" else 1, path=path
+    )
 
     try:
         r.raise_for_status()
@@ -445,7 +454,7 @@ def process_closed_positions(exchange, trades, funding):
 
     for pos in positions:
         pos["exchange"] = exchange
-        save_closed_position(pos)
+    save_closed_positions_bulk(positions)
 
     print(f"✅ {exchange}: {len(positions)} posiciones cerradas guardadas.")
 
@@ -868,10 +877,10 @@ def save_backpack_closed_positions(db_path="portfolio.db", days=60):
         print("⚠️ No closed positions returned from Backpack.")
         return
 
-    conn = sqlite3.connect(db_path)
+    conn = db_connect(db_path)
     cur = conn.cursor()
 
-    saved_count = 0
+    batch = []  # se guarda todo en una transacción al final
     skipped = 0
 
     try:
@@ -930,15 +939,7 @@ def save_backpack_closed_positions(db_path="portfolio.db", days=60):
                         f"⚠️ [{symbol}] close_time ausente; se guardará sin chequeo de duplicados."
                     )
                 else:
-                    cur.execute(
-                        """
-                        SELECT COUNT(*) FROM closed_positions
-                        WHERE exchange = ? AND symbol = ? AND close_time = ?
-                    """,
-                        (exchange, symbol, close_ts),
-                    )
-                    exists = cur.fetchone()[0]
-                    if exists:
+                    if closed_position_exists(cur, exchange, symbol, close_ts):
                         skipped += 1
                         continue
 
@@ -956,7 +957,7 @@ def save_backpack_closed_positions(db_path="portfolio.db", days=60):
                 )
                 print(f"    open={open_ts} close={close_ts}")
 
-                # Payload final que se mandará a db_manager.save_closed_position
+                # Payload final que se mandará a db_manager.save_closed_positions_bulk
                 record = {
                     "exchange": exchange,
                     "symbol": symbol,  # ← Usar símbolo normalizado con USDT
@@ -979,9 +980,8 @@ def save_backpack_closed_positions(db_path="portfolio.db", days=60):
                 }
                 print("🔎 [DEBUG closed_backpack_save] payload:", record)
 
-                # Guardar
-                save_closed_position(record)
-                saved_count += 1
+                # Guardar (en lote al final)
+                batch.append(record)
 
             except Exception as e:
                 print(f"⚠️ Error saving Backpack position {pos.get('symbol')}: {e}")
@@ -990,6 +990,7 @@ def save_backpack_closed_positions(db_path="portfolio.db", days=60):
     finally:
         conn.close()
 
+    saved_count = save_closed_positions_bulk(batch, db_path=db_path)
     print(
         f"✅ Guardadas {saved_count} posiciones cerradas de Backpack (omitidas {skipped} duplicadas)."
     )
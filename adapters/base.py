@@ -1,5 +1,8 @@
+import asyncio
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Callable, Optional, Tuple
+
+from utils.async_http import get_async_client, run_shared, BLOCKING_POOL_WORKERS
 
 class BaseExchangeAdapter(ABC):
     slug: str
@@ -13,3 +16,133 @@ class BaseExchangeAdapter(ABC):
     @abstractmethod
     def save_closed_positions(self, db_path: str) -> None: ...
 
+
+
+# ===== Contrato async =====
+# Un solo event loop puede llamar a todos los exchanges a la vez. Los adapters
+# nativos usan self.http (cliente async compartido); los módulos antiguos basados
+# en requests se envuelven con WrappedAdapter.
+
+class AsyncExchangeAdapter(ABC):
+    slug: str
+
+    @property
+    def http(self):
+        return get_async_client()
+
+    @abstractmethod
+    async def fetch_open_positions(self) -> List[Dict[str, Any]]: ...
+    @abstractmethod
+    async def fetch_all_balances(self) -> Optional[Dict[str, Any]]: ...
+    @abstractmethod
+    async def fetch_funding(self, since: Optional[int] = None) -> List[Dict[str, Any]]: ...
+    @abstractmethod
+    async def save_closed_positions(self, db_path: str = "portfolio.db", days: Optional[int] = None) -> Any: ...
+
+
+class WrappedAdapter(AsyncExchangeAdapter):
+    """
+    Adapter async sobre las funciones síncronas de un módulo (las de
+    POSITIONS_FUNCTIONS / BALANCE_FUNCTIONS / FUNDING_PULLERS / SYNC_FUNCTIONS).
+
+    Cada llamada pasa por la coalescencia de utils.fanout con clave (pool, slug,
+    ventana): pools = {método: (pool, hilos)} permite usar los MISMOS pools que
+    el camino síncrono (p. ej. "positions"), así un exchange colgado ocupa un
+    solo hilo tanto si lo pide /api/positions como ?mode=async, y un timeout de
+    gather_adapters no deja otro hilo bloqueado en cada refresco.
+    """
+
+    DEFAULT_POOLS = {
+        "positions": ("adapter_positions", BLOCKING_POOL_WORKERS),
+        "balances": ("adapter_balances", BLOCKING_POOL_WORKERS),
+        "funding": ("adapter_funding", BLOCKING_POOL_WORKERS),
+        "closed": ("adapter_closed", BLOCKING_POOL_WORKERS),
+    }
+
+    def __init__(
+        self,
+        slug: str,
+        positions: Optional[Callable] = None,
+        balances: Optional[Callable] = None,
+        funding: Optional[Callable] = None,
+        closed: Optional[Callable] = None,
+        pools: Optional[Dict[str, Tuple[str, int]]] = None,
+    ):
+        self.slug = slug
+        self._positions = positions
+        self._balances = balances
+        self._funding = funding
+        self._closed = closed
+        self._pools = {**self.DEFAULT_POOLS, **(pools or {})}
+
+    async def _call(self, method: str, fn: Callable, variant=None):
+        pool, workers = self._pools[method]
+        return await run_shared(pool, self.slug, fn, workers, variant)
+
+    async def fetch_open_positions(self):
+        if not self._positions:
+            return []
+        return await self._call("positions", self._positions) or []
+
+    async def fetch_all_balances(self):
+        if not self._balances:
+            return None
+        return await self._call("balances", self._balances)
+
+    async def fetch_funding(self, since=None):
+        if not self._funding:
+            return []
+        if since is None:
+            return await self._call("funding", self._funding) or []
+        # la ventana entra en la clave: otro since no se engancha a este pull
+        return await self._call("funding", lambda: self._funding(since), since) or []
+
+    async def save_closed_positions(self, db_path="portfolio.db", days=None):
+        # SYNC_FUNCTIONS ya llevan su db_path; solo se les pasa la ventana
+        if not self._closed:
+            return 0
+        if days is None:
+            return await self._call("closed", self._closed)
+        return await self._call("closed", lambda: self._closed(days=days), days)
+
+
+async def gather_adapters(
+    adapters, method: str, *args, timeout: float = 30.0, timeouts=None, **kwargs
+):
+    """
+    Llama adapter.<method>(*args) en todos los adapters concurrentemente, con
+    deadline por adapter (timeouts[slug] o timeout).
+    Devuelve (results, status) con el mismo formato que utils.fanout.fan_out.
+    """
+    timeouts = timeouts or {}
+    loop = asyncio.get_running_loop()
+
+    async def _one(adapter):
+        t0 = loop.time()
+        try:
+            value = await asyncio.wait_for(
+                getattr(adapter, method)(*args, **kwargs),
+                timeout=timeouts.get(adapter.slug, timeout),
+            )
+            return adapter.slug, value, {
+                "status": "ok",
+                "latency_ms": int((loop.time() - t0) * 1000),
+            }
+        except asyncio.TimeoutError:
+            return adapter.slug, None, {
+                "status": "timeout",
+                "latency_ms": int((loop.time() - t0) * 1000),
+            }
+        except Exception as e:
+            return adapter.slug, None, {
+                "status": "error",
+                "latency_ms": int((loop.time() - t0) * 1000),
+                "error": str(e),
+            }
+
+    results, status = {}, {}
+    for slug, value, st in await asyncio.gather(*(_one(a) for a in adapters)):
+        status[slug] = st
+        if st["status"] == "ok":
+            results[slug] = value
+    return results, status
@@ -16,6 +16,14 @@ import sys
 import os
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 from utils.symbols import normalize_symbol
+from utils.http import get_session
+from utils.dbconn import db_connect
+from utils.singleflight import single_flight
+from utils.resilience import call_with_retry
+from utils.clock import register_time_source, offset_ms, server_now_ms, with_clock_retry
+from utils.windows import DAY_MS, fetch_windows, split_windows
+
+_HTTP = get_session()  # pool keep-alive compartido entre adapters
 
 UA_HEADERS = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
@@ -30,24 +38,34 @@ BINANCE_BASE_URL = "https://fapi.binance.com"
 
 
 
-def binance_server_offset_ms():
-    t0 = int(time.time() * 1000)
-    r = requests.get(f"{BINANCE_BASE_URL}/fapi/v1/time", headers=UA_HEADERS, timeout=10)
+def _binance_server_time_ms():
+    r = _HTTP.get(f"{BINANCE_BASE_URL}/fapi/v1/time", headers=UA_HEADERS, timeout=10)
     r.raise_for_status()
-    server = r.json()["serverTime"]
-    t1 = int(time.time() * 1000)
-    return server - ((t0 + t1) // 2)
+    return r.json()["serverTime"]
 
+register_time_source("binance", _binance_server_time_ms)
+
+def binance_server_offset_ms():
+    """Offset servidor-local cacheado (utils.clock); ya no cuesta una llamada por firma."""
+    return offset_ms("binance")
+
+@single_flight(lambda path, params=None, off=0: ("binance", "GET", path, (params, off)))
 def binance_signed_get(path, params=None, off=0):
     if not BINANCE_API_KEY or not BINANCE_API_SECRET:
         raise RuntimeError("Missing BINANCE_API_KEY/BINANCE_API_SECRET")
-    params = dict(params or {})
-    params["timestamp"] = int(time.time() * 1000) + off
-    qs = urlencode(params, doseq=True)
-    sig = hmac.new(BINANCE_API_SECRET.encode(), qs.encode(), hashlib.sha256).hexdigest()
+    base_params = dict(params or {})
     headers = {"X-MBX-APIKEY": BINANCE_API_KEY, **UA_HEADERS}
-    url = f"{BINANCE_BASE_URL}{path}?{qs}&signature={sig}"
-    r = requests.get(url, headers=headers, timeout=20)
+
+    def _send():
+        params = dict(base_params)
+        params["timestamp"] = server_now_ms("binance") + off
+        qs = urlencode(params, doseq=True)
+        sig = hmac.new(BINANCE_API_SECRET.encode(), qs.encode(), hashlib.sha256).hexdigest()
+        url = f"{BINANCE_BASE_URL}{path}?{qs}&signature={sig}"
+        return _HTTP.get(url, headers=headers, timeout=20)
+
+    # _send re-firma en cada intento; reintentos/Retry-After/breaker (utils.resilience)
+    r = with_clock_retry("binance", lambda: call_with_retry("binance", _send, path=path))
     r.raise_for_status()
     return r.json()
 
@@ -58,40 +76,37 @@ def fetch_account_binance(off=0):
     """
     try:
         # -------- FUTUROS --------
-        path = "/fapi/v2/account"
-        params = {
-            "timestamp": int(time.time() * 1000) + off,
-            "recvWindow": 5000
-        }
-        qs = urlencode(params, doseq=True)
-        sig = hmac.new(BINANCE_API_SECRET.encode(), qs.encode(), hashlib.sha256).hexdigest()
-        url = f"{BINANCE_BASE_URL}{path}?{qs}&signature={sig}"
+        data_futures = binance_signed_get("/fapi/v2/account", {"recvWindow": 5000}, off=off) or {}
         headers = {"X-MBX-APIKEY": BINANCE_API_KEY, **UA_HEADERS}
 
-        r = requests.get(url, headers=headers, timeout=30)
-        r.raise_for_status()
-        data_futures = r.json() or {}
-
         futures_wallet_balance = float(data_futures.get("totalWalletBalance", 0))
         futures_margin_balance = float(data_futures.get("totalMarginBalance", 0))
         futures_unrealized = float(data_futures.get("totalUnrealizedProfit", 0))
 
         # -------- SPOT --------
-        url_spot = "https://api.binance.com/api/v3/account"
-        params_spot = {
-            "timestamp": int(time.time() * 1000) + off,
-            "recvWindow": 5000
-        }
-        qs_spot = urlencode(params_spot, doseq=True)
-        sig_spot = hmac.new(BINANCE_API_SECRET.encode(), qs_spot.encode(), hashlib.sha256).hexdigest()
-        url_spot = f"{url_spot}?{qs_spot}&signature={sig_spot}"
-
-        r_spot = requests.get(url_spot, headers=headers, timeout=30)
+        def _send_spot():
+            params_spot = {
+                "timestamp": server_now_ms("binance") + off,
+                "recvWindow": 5000
+            }
+            qs_spot = urlencode(params_spot, doseq=True)
+            sig_spot = hmac.new(BINANCE_API_SECRET.encode(), qs_spot.encode(), hashlib.sha256).hexdigest()
+            url_spot = f"https://api.binance.com/api/v3/account?{qs_spot}&signature={sig_spot}"
+            return _HTTP.get(url_spot, headers=headers, timeout=30)
+
+        r_spot = with_clock_retry(
+            "binance", lambda: call_with_retry("binance", _send_spot, path="/api/v3/account")
+        )
         r_spot.raise_for_status()
         data_spot = r_spot.json() or {}
 
         # Traer precios para valuar balances spot
-        prices = {p["symbol"]: float(p["price"]) for p in requests.get("https://api.binance.com/api/v3/ticker/price").json()}
+        r_px = call_with_retry(
+            "binance",
+            lambda: _HTTP.get("https://api.binance.com/api/v3/ticker/price", timeout=30),
+            path="/api/v3/ticker/price",
+        )
+        prices = {p["symbol"]: float(p["price"]) for p in r_px.json()}
         total_spot_usdt = 0.0
         for bal in data_spot.get("balances", []):
             asset = bal["asset"]
@@ -377,14 +392,13 @@ def fetch_positions_binance_enriched(days=60, off=0, debug=False):
 
             # 2) trae trades suficientes para hallar el inicio del bloque abierto actual
             #    (ventanas de 7 días desde start_limit_ms → now)
-            trades = []
-            t0 = start_limit_ms
-            while t0 < now_ms:
-                t1 = min(t0 + 7*24*60*60*1000, now_ms)
-                tpage = _bn_user_trades_range(sym, t0, t1, off=off, debug=False, position_side=pos_side_field)
-                trades.extend(tpage)
-                t0 = t1
-                # micro-optimización: si ya tenemos muchísimos trades y encontramos luego el inicio, salimos
+            #    las ventanas se piden en paralelo y se concatenan en orden cronológico
+            pages = fetch_windows(
+                lambda t0, t1: _bn_user_trades_range(
+                    sym, t0, t1, off=off, debug=False, position_side=pos_side_field),
+                split_windows(start_limit_ms, now_ms, 7 * DAY_MS, inclusive=False),
+            )
+            trades = [t for tpage in pages for t in tpage]
 
             # 3) localizar inicio del bloque actual
             open_idx, open_time_ms = _find_open_block_start(trades, current_qty=qty, debug=debug)
@@ -492,10 +506,7 @@ def fetch_funding_binance_windowed(
     seen: set = set()
     step_ms = int(step_days) * 24 * 3600 * 1000
 
-    start = int(since_ms)
-    while start <= until_ms:
-        end = min(start + step_ms - 1, until_ms)
-
+    def _pull(start: int, end: int) -> List[Dict[str, Any]]:
         params: Dict[str, Any] = {
             "incomeType": "FUNDING_FEE",
             "startTime": start,
@@ -515,8 +526,11 @@ def fetch_funding_binance_windowed(
         if debug:
             print(f"[Binance] window {datetime.utcfromtimestamp(start/1000):%Y-%m-%d}→"
                   f"{datetime.utcfromtimestamp(end/1000):%Y-%m-%d} items={len(data)}")
+        return data or []
 
-        for it in data or []:
+    # ventanas en paralelo; el dedupe se hace después, en orden de ventana
+    for data in fetch_windows(_pull, split_windows(since_ms, until_ms, step_ms)):
+        for it in data:
             if it.get("incomeType") != "FUNDING_FEE":
                 continue
             ts = int(it.get("time") or 0)
@@ -537,9 +551,6 @@ def fetch_funding_binance_windowed(
                 "external_id": tran_id,
             })
 
-        start = end + 1
-        time.sleep(0.05)  # mimo al RL
-
     out.sort(key=lambda x: x["timestamp"] or 0)
     if debug and out:
         first, last = out[0]["timestamp"], out[-1]["timestamp"]
@@ -725,17 +736,10 @@ def fetch_closed_positions_binance(days=30, off=0, debug=False):
     def signed_get(path, params=None):
         if not BINANCE_API_KEY or not BINANCE_API_SECRET:
             raise RuntimeError("Missing BINANCE_API_KEY/BINANCE_API_SECRET")       
-        params = dict(params or {})
-        params["timestamp"] = int(time.time() * 1000) + int(off)
-        qs = urlencode(params, doseq=True)
-        sig = hmac.new(BINANCE_API_SECRET.encode(), qs.encode(), hashlib.sha256).hexdigest()
-        url = f"{BINANCE_BASE_URL}{path}?{qs}&signature={sig}"
-        headers = {"X-MBX-APIKEY": BINANCE_API_KEY, **UA_HEADERS}
         if debug:
             print(f"[GET] {path} {params}")
-        r = requests.get(url, headers=headers, timeout=25)
-        r.raise_for_status()
-        return r.json()
+        # firma por intento + reintentos/breaker comunes
+        return binance_signed_get(path, params, off=int(off))
 
     try:
         now = int(time.time() * 1000)
@@ -950,7 +954,7 @@ def save_binance_closed_positions(db_path="portfolio.db", days=30, debug=False):
     """
     import sqlite3
     import db_manager as dm
-    from db_manager import save_closed_position as save_cp
+    from db_manager import save_closed_positions_bulk, CLOSED_EXISTS_EXACT_SQL
 
     dm.DB_PATH = db_path
 
@@ -960,9 +964,9 @@ def save_binance_closed_positions(db_path="portfolio.db", days=30, debug=False):
             print("⚠️ No se encontraron posiciones cerradas en Binance.")
         return 0
 
-    conn = sqlite3.connect(db_path)
+    conn = db_connect(db_path)
     cur = conn.cursor()
-    saved = 0
+    batch = []
     skipped = 0
 
     for pos in positions:
@@ -980,10 +984,7 @@ def save_binance_closed_positions(db_path="portfolio.db", days=30, debug=False):
             open_ts  = int(pos.get("open_time") or 0)
 
             # MEJOR DEDUPLICACIÓN: Usar exchange + symbol + open_time + close_time + size
-            cur.execute("""
-                SELECT 1 FROM closed_positions
-                WHERE exchange = ? AND symbol = ? AND open_time = ? AND close_time = ? AND ABS(size - ?) < 1e-8
-            """, (exchange, symbol, open_ts, close_ts, size))
+            cur.execute(CLOSED_EXISTS_EXACT_SQL, (exchange, symbol, open_ts, close_ts, size))
             
             if cur.fetchone():
                 if debug:
@@ -1022,13 +1023,13 @@ def save_binance_closed_positions(db_path="portfolio.db", days=30, debug=False):
                 "liquidation_price": pos.get("liquidation_price"),
             }
 
-            save_cp(payload)
-            saved += 1
+            batch.append(payload)
 
         except Exception as e:
             print(f"⚠️ Error guardando {pos.get('symbol','?')}: {e}")
 
     conn.close()
+    saved = save_closed_positions_bulk(batch, db_path=db_path)
     if debug:
         print(f"✅ Guardadas {saved} | ⏭️ omitidas {skipped} (duplicadas).")
     return saved
@@ -2,6 +2,13 @@ from __future__ import annotations
 import os, time, hmac, hashlib, requests, sqlite3, json, re
 from urllib.parse import urlencode
 from typing import Any, Dict, List, Optional
+from utils.http import get_session
+from utils.dbconn import db_connect
+from utils.singleflight import single_flight
+from utils.resilience import call_with_retry
+from utils.persymbol import for_each_symbol
+
+_HTTP = get_session()  # pool keep-alive compartido entre adapters
 from datetime import datetime, timezone
 from dotenv import load_dotenv
 
@@ -169,11 +176,17 @@ def _sign_params(params: dict) -> dict:
     params["signature"] = signature
     return params
 
+@single_flight(lambda path, params=None: ("bingx", "GET", path, params))
 def _get(path, params=None):
     headers = {"X-BX-APIKEY": BINGX_API_KEY}
-    p = _sign_params(params or {})
     url = BINGX_BASE + path
-    r = requests.get(url, params=p, headers=headers, timeout=15)
+
+    def _send():
+        # copia nueva por intento: timestamp y firma frescos
+        p = _sign_params(dict(params or {}))
+        return _HTTP.get(url, params=p, headers=headers, timeout=15)
+
+    r = call_with_retry("bingx", _send, path=path)
     r.raise_for_status()
     return r.json()
 
@@ -181,7 +194,7 @@ def _get_public(path: str, params: Optional[dict] = None) -> dict:
     p = dict(params or {})
     p.setdefault("timestamp", int(time.time() * 1000))
     url = BINGX_BASE + path
-    r = requests.get(url, params=p, timeout=15)
+    r = call_with_retry("bingx", lambda: _HTTP.get(url, params=p, timeout=15), path=path)
     r.raise_for_status()
     return r.json()
 
@@ -348,7 +361,8 @@ def fetch_closed_positions_bingx(
     if debug:
         print(f"🔍 Consultando {len(symbols)} símbolos ({_ms_to_str(start_ms)} → {_ms_to_str(now_ms)})")
 
-    for sym in symbols:
+    def _pull_symbol(sym: str) -> list[dict]:
+        rows: list[dict] = []
         sym_dash = _bx_to_dash(sym)
         if debug:
             print(f"   • {sym_dash}")
@@ -392,7 +406,7 @@ def fetch_closed_positions_bingx(
                         
                         raw_symbol = _bx_no_dash(row.get("symbol") or sym_dash)
                         
-                        results.append({
+                        rows.append({
                             "exchange": "bingx",
                             "symbol": normalize_symbol(raw_symbol),
                             "symbol_raw": row.get("symbol") or sym_dash,
@@ -427,8 +441,11 @@ def fetch_closed_positions_bingx(
                 if debug:
                     print(f"      [ERROR] {e}")
                 break
+        return rows
 
-        time.sleep(0.2)  # Throttle
+    # positionHistory exige símbolo: en paralelo (acotado por exchange), en el orden de symbols
+    for _sym, rows in for_each_symbol("bingx", symbols, _pull_symbol):
+        results.extend(rows)
 
     if debug:
         print(f"✅ Posiciones cerradas encontradas: {len(results)}")
@@ -514,10 +531,13 @@ def fetch_funding_bingx(limit=100, start_time=None, end_time=None, symbol: str |
 
 # db helper
 try:
-    from db_manager import save_closed_position
+    from db_manager import save_closed_positions_bulk, closed_position_exists
 except Exception:
-    def save_closed_position(_: Dict[str, Any]):
-        raise RuntimeError("db_manager.save_closed_position no disponible")
+    def save_closed_positions_bulk(_: List[Dict[str, Any]], db_path=None):
+        raise RuntimeError("db_manager.save_closed_positions_bulk no disponible")
+
+    def closed_position_exists(*_args, **_kwargs):
+        raise RuntimeError("db_manager.closed_position_exists no disponible")
 
 def save_bingx_closed_positions(
     db_path="portfolio.db",
@@ -542,26 +562,24 @@ def save_bingx_closed_positions(
         print("⚠️ No se obtuvieron posiciones cerradas de BingX.")
         return
 
-    conn = sqlite3.connect(db_path)
+    conn = db_connect(db_path)
     cur = conn.cursor()
-    saved = skipped = 0
+    batch = []
+    skipped = 0
     
     for pos in positions:
         try:
             # Verificar si ya existe
-            cur.execute("""SELECT COUNT(*) FROM closed_positions
-                           WHERE exchange=? AND symbol=? AND close_time=?""",
-                        (pos["exchange"], pos["symbol"], pos["close_time"]))
-            if cur.fetchone()[0]:
+            if closed_position_exists(cur, pos["exchange"], pos["symbol"], pos["close_time"]):
                 skipped += 1
                 continue
             
-            save_closed_position(pos)
-            saved += 1
+            batch.append(pos)
         except Exception as e:
             print(f"⚠️ Error guardando {pos.get('symbol')}: {e}")
     
     conn.close()
+    saved = save_closed_positions_bulk(batch, db_path=db_path)
     print(f"✅ BingX: {saved} guardadas, {skipped} omitidas (duplicadas)")
 
 # ============================================================
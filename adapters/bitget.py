@@ -20,6 +20,12 @@ HERE = os.path.dirname(os.path.abspath(__file__))
 ROOT = os.path.dirname(HERE)  # carpeta raíz del proyecto
 if ROOT not in sys.path:
     sys.path.insert(0, ROOT)
+from utils.http import get_session
+from utils.dbconn import db_connect
+from utils.singleflight import single_flight
+from utils.resilience import call_with_retry
+
+_HTTP = get_session()  # pool keep-alive compartido entre adapters
 # ====== Imports para prints
 # from pp import (
 #     p_closed_debug_header, p_closed_debug_count, p_closed_debug_norm_size,
@@ -51,7 +57,7 @@ from pathlib import Path
 
 def _init_bitget_margin_cache(db_path: str = "cache.db"):
     """Initialize margin tracking table for Bitget positions"""
-    conn = sqlite3.connect(db_path)
+    conn = db_connect(db_path)
     cursor = conn.cursor()
     cursor.execute(
         """
@@ -80,7 +86,7 @@ def _get_init_margin(
     """
     _init_bitget_margin_cache(db_path)
 
-    conn = sqlite3.connect(db_path)
+    conn = db_connect(db_path)
     cursor = conn.cursor()
 
     # Check if position already exists
@@ -153,6 +159,11 @@ def _bitget_sign(
     return base64.b64encode(mac.digest()).decode()
 
 
+@single_flight(
+    lambda method, path, params=None, body=None, version="v2": ("bitget", method, path, params)
+    if method.upper() == "GET"
+    else None
+)
 def _bitget_request(
     method: str, path: str, params: Dict = None, body: Dict = None, version: str = "v2"
 ) -> Dict:
@@ -160,33 +171,36 @@ def _bitget_request(
     if not all([BITGET_API_KEY, BITGET_API_SECRET, BITGET_API_PASSPHRASE]):
         raise ValueError("Missing Bitget API credentials")
 
-    timestamp = str(int(time.time() * 1000))
     # ⚠️ construimos y reutilizamos EXACTAMENTE el mismo query string para firmar y para la URL
     query_string = urlencode(params or {}, doseq=True)
     body_str = json.dumps(body) if body else ""
 
-    # la firma incluye ?query_string si existe
-    signature = _bitget_sign(timestamp, method, path, query_string, body_str)
-
-    headers = {
-        "ACCESS-KEY": BITGET_API_KEY,
-        "ACCESS-SIGN": signature,
-        "ACCESS-TIMESTAMP": timestamp,
-        "ACCESS-PASSPHRASE": BITGET_API_PASSPHRASE,
-        "Content-Type": "application/json",
-        "locale": "en-US",
-    }
-
     # construimos URL final con el MISMO query string
     url = f"{BITGET_BASE_URL}{path}" + (f"?{query_string}" if query_string else "")
 
-    try:
+    def _send():
+        # timestamp y firma nuevos en cada intento (la firma incluye ?query_string)
+        timestamp = str(int(time.time() * 1000))
+        signature = _bitget_sign(timestamp, method, path, query_string, body_str)
+        headers = {
+            "ACCESS-KEY": BITGET_API_KEY,
+            "ACCESS-SIGN": signature,
+            "ACCESS-TIMESTAMP": timestamp,
+            "ACCESS-PASSPHRASE": BITGET_API_PASSPHRASE,
+            "Content-Type": "application/json",
+            "locale": "en-US",
+        }
         if method.upper() == "GET":
-            response = requests.get(url, headers=headers, timeout=30)
-        else:
-            response = requests.post(
-                url, data=body_str if body_str else None, headers=headers, timeout=30
-            )
+            return _HTTP.get(url, headers=headers, timeout=30)
+        return _HTTP.post(
+            url, data=body_str if body_str else None, headers=headers, timeout=30
+        )
+
+    try:
+        # reintentos/Retry-After/breaker comunes (utils.resilience); POST sin reintento
+        response = call_with_retry(
+            "bitget", _send, retries=3 if method.upper() == "GET" else 1, path=path
+        )
         response.raise_for_status()
         return response.json()
     except Exception as e:
@@ -479,8 +493,6 @@ def fetch_bitget_funding_fees(
             break
         id_less = end_id
         pages += 1
-        # pequeño respiro (RL 10/s)
-        time.sleep(0.05)
 
     out.sort(key=lambda x: x["timestamp"] or 0)
     if debug:
@@ -522,7 +534,7 @@ def save_bitget_closed_positions(
     # ------------------------------------------------------------------------------
 
     try:
-        from db_manager import save_closed_position
+        from db_manager import save_closed_positions_bulk
     except Exception as e:
         print(f"❌ No module db_manager: {e}")
         return {
@@ -603,11 +615,12 @@ def save_bitget_closed_positions(
     duplicated = 0
     updated = 0  # mantenemos 0 para compatibilidad
     seen_ids = set()  # por si la API repite páginas
+    batch = []  # se guardan todas en una transacción al final
 
     end_id = None
     page = 0
 
-    conn = sqlite3.connect(db_path)
+    conn = db_connect(db_path)
     cur = conn.cursor()
 
     try:
@@ -753,11 +766,10 @@ def save_bitget_closed_positions(
                         "liquidation_price": None,
                     }
 
-                    save_closed_position(payload)
-                    inserted += 1
+                    batch.append(payload)
                     if debug:
                         print(
-                            f"  ✅ saved {symbol_norm} {side} size={size} realized={net_profit:.8f}"
+                            f"  ✅ a guardar {symbol_norm} {side} size={size} realized={net_profit:.8f}"
                         )
 
                 except Exception as e:
@@ -777,6 +789,8 @@ def save_bitget_closed_positions(
         except Exception:
             pass
 
+    inserted = save_closed_positions_bulk(batch, db_path=db_path)
+
     if debug:
         print(
             f"✅ Bitget guardadas: {inserted} | omitidas: {skipped} | sin_fecha: {skipped_no_time} | duplicadas: {duplicated}"
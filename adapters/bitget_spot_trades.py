@@ -35,9 +35,10 @@ if UTILS_DIR not in sys.path:
 # Importa SIEMPRE con el prefijo utils.* para evitar choques con stdlib
 from utils.symbols import normalize_symbol
 from utils.time import to_s
+from utils.dbconn import db_connect
+from db_manager import closed_position_key
 
 
-FLOAT_EPS = 1e-8  # tolerancia en comparaciones float
 # === Auth / request helpers (Bitget) ===
 try:
     # Firma y request centralizado (ya usado en tu proyecto).  :contentReference[oaicite:8]{index=8}
@@ -103,58 +104,6 @@ def _is_stable_swap(pair: str) -> bool:
     return b in STABLES and q in STABLES
 
 
-def _ensure_closed_positions_unique_index(conn: sqlite3.Connection):
-    """
-    Crea un índice UNIQUE estable para evitar duplicados “lógicos”
-    sin depender de redondeos. Usa open_time+close_time como llave temporal.
-    """
-    cur = conn.cursor()
-    cur.execute(
-        """
-        CREATE UNIQUE INDEX IF NOT EXISTS ux_closed_positions_no_dupes
-        ON closed_positions(exchange, symbol, side, open_time, close_time);
-    """
-    )
-    conn.commit()
-
-
-def _exists_closed_position(conn: sqlite3.Connection, row: dict) -> bool:
-    """
-    Evita duplicados comprobando una coincidencia “lógica”:
-    misma (exchange, symbol, side, open_time, close_time) y
-    floats equivalentes dentro de una tolerancia.
-    """
-    q = """
-    SELECT id
-    FROM closed_positions
-    WHERE exchange = ?
-      AND symbol   = ?
-      AND side     = ?
-      AND open_time  = ?
-      AND close_time = ?
-      AND ABS(size - ?)         < ?
-      AND ABS(entry_price - ?)  < ?
-      AND ABS(close_price - ?)  < ?
-    LIMIT 1
-    """
-    vals = (
-        row.get("exchange", "bitget"),
-        row.get("symbol"),
-        row.get("side"),
-        int(row.get("open_time") or 0),
-        int(row.get("close_time") or 0),
-        float(row.get("size") or 0.0),
-        FLOAT_EPS,
-        float(row.get("entry_price") or 0.0),
-        FLOAT_EPS,
-        float(row.get("close_price") or 0.0),
-        FLOAT_EPS,
-    )
-    cur = conn.cursor()
-    cur.execute(q, vals)
-    return cur.fetchone() is not None
-
-
 # ---------- Estructuras ----------
 @dataclass
 class Fill:
@@ -265,10 +214,8 @@ def fetch_spot_trades(
                 break
             id_less = str(last_trade_id)
             page_idx += 1
-            time.sleep(0.05)  # RL ~10/s
 
         end = start - 1
-        time.sleep(0.1)
 
     # Orden ascendente para FIFO estable
     all_fills.sort(key=lambda x: x.ts)
@@ -347,8 +294,9 @@ INSERT_SQL = (
     "INSERT OR IGNORE INTO closed_positions ("
     "exchange, symbol, side, size, entry_price, close_price, "
     "open_time, close_time, pnl, realized_pnl, funding_total, fee_total, "
-    "pnl_percent, apr, initial_margin, notional, leverage, liquidation_price, ignore_trade"
-    ") VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)"
+    "pnl_percent, apr, initial_margin, notional, leverage, liquidation_price, ignore_trade, "
+    "dedupe_key"
+    ") VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)"
 )
 
 
@@ -389,32 +337,16 @@ def _insert_row(conn: sqlite3.Connection, row: Dict[str, Any], verbose: bool = F
         0.0,  # leverage
         None,  # liquidation_price
         int(bool(row.get("ignore_trade", False))),
+        closed_position_key(
+            row.get("exchange", "bitget"), row.get("symbol"), row.get("side"),
+            open_s, close_s, size,
+        ),
     )
 
-    # 1) Chequeo previo (rápido) anti-duplicados
-    if _exists_closed_position(
-        conn,
-        {
-            "exchange": vals[0],
-            "symbol": vals[1],
-            "side": vals[2],
-            "size": vals[3],
-            "entry_price": vals[4],
-            "close_price": vals[5],
-            "open_time": vals[6],
-            "close_time": vals[7],
-        },
-    ):
-        if verbose:
-            print(
-                f"⚠️ Duplicado detectado (pre-insert): {vals[1]} {vals[2]} {vals[7]} → SKIP"
-            )
-        return
-
     cur = conn.cursor()
     cur.execute(INSERT_SQL, vals)
     if cur.rowcount == 0:
-        # 2) INSERT OR IGNORE no insertó → ya existe por UNIQUE INDEX
+        # INSERT OR IGNORE no insertó → ya existe por UNIQUE INDEX (dedupe_key)
         if verbose:
             print(
                 f"⚠️ Duplicado ignorado por UNIQUE: {vals[1]} {vals[2]} {vals[7]} → SKIP"
@@ -442,7 +374,7 @@ def save_bitget_spot_positions(
     Devuelve: (guardadas, ignoradas)
     """
     # Asegura DB con columna ignore_trade.  :contentReference[oaicite:10]{index=10}
-    from db_manager import init_db, migrate_spot_support
+    from db_manager import init_db, migrate_spot_support, ensure_closed_dedupe
 
     init_db()
     migrate_spot_support()
@@ -474,8 +406,8 @@ def save_bitget_spot_positions(
 
     saved = 0
     ignored = 0
-    conn = sqlite3.connect(db_path)
-    _ensure_closed_positions_unique_index(conn)  # <- importante
+    conn = db_connect(db_path)
+    ensure_closed_dedupe(conn)  # <- índice UNIQUE por dedupe_key
 
     for pair, trades in by_pair.items():
         base, quote = _split_pair(pair)
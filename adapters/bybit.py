@@ -2,6 +2,14 @@ from __future__ import annotations
 import os, time, hmac, hashlib, json
 from typing import Any, Dict, List, Optional, Tuple
 import requests
+from utils.http import get_session
+from utils.dbconn import db_connect
+from utils.singleflight import single_flight
+from utils.clock import register_time_source, server_now_ms, with_clock_retry
+from utils.resilience import call_with_retry
+from utils.windows import DAY_MS, fetch_windows, split_windows
+
+_HTTP = get_session()  # pool keep-alive compartido entre adapters
 
 # ==== Utils proyecto (fallbacks seguros si ejecutas este archivo suelto) ====
 try:
@@ -58,25 +66,46 @@ def _qs(params: Dict[str, Any]) -> str:
         cleaned[k] = v
     return "&".join([f"{k}={cleaned[k]}" for k in sorted(cleaned.keys())])
 
+def _bybit_server_time_ms() -> int:
+    r = _HTTP.get(f"{BYBIT_BASE_URL}/v5/market/time", timeout=10)
+    r.raise_for_status()
+    return int(r.json()["result"]["timeNano"]) // 1_000_000
+
+register_time_source("bybit", _bybit_server_time_ms)
+
+def _bybit_time_error(resp) -> bool:
+    # retCode 10002: timestamp fuera de recv_window (HTTP 200)
+    try:
+        return resp.json().get("retCode") == 10002
+    except Exception:
+        return False
+
+@single_flight(lambda path, params=None, auth=True: ("bybit", "GET", path, (params, auth)))
 def _get(path: str, params: Dict[str, Any] | None=None, auth: bool=True) -> dict:
     params = params or {}
-    url = f"{BYBIT_BASE_URL}{path}"
-    headers = {}
+    qs = _qs(params)
+    url = f"{BYBIT_BASE_URL}{path}" + (f"?{qs}" if qs else "")
+
+    def _send():
+        headers = {}
+        if auth:
+            ts = str(server_now_ms("bybit"))  # offset cacheado (utils.clock)
+            sig = _sign_v5(qs, ts, RECV_WINDOW)
+            headers = {
+                "X-BAPI-API-KEY": BYBIT_API_KEY,
+                "X-BAPI-TIMESTAMP": ts,
+                "X-BAPI-RECV-WINDOW": RECV_WINDOW,
+                "X-BAPI-SIGN": sig,
+            }
+        return _HTTP.get(url, headers=headers, timeout=TIMEOUT)
+
+    # reintentos/Retry-After/breaker por fuera; la firma se rehace en cada intento
     if auth:
-        ts = str(_now_ms())
-        qs = _qs(params)
-        sig = _sign_v5(qs, ts, RECV_WINDOW)
-        headers = {
-            "X-BAPI-API-KEY": BYBIT_API_KEY,
-            "X-BAPI-TIMESTAMP": ts,
-            "X-BAPI-RECV-WINDOW": RECV_WINDOW,
-            "X-BAPI-SIGN": sig,
-        }
-        if qs: url = f"{url}?{qs}"
+        r = with_clock_retry(
+            "bybit", lambda: call_with_retry("bybit", _send, path=path), check=_bybit_time_error
+        )
     else:
-        qs = _qs(params)
-        if qs: url = f"{url}?{qs}"
-    r = requests.get(url, headers=headers, timeout=TIMEOUT)
+        r = call_with_retry("bybit", _send, path=path)
     data = r.json()
     if data.get("retCode") != 0:
         raise RuntimeError(f"Bybit API error {data.get('retCode')} - {data.get('retMsg')}")
@@ -110,9 +139,8 @@ def _fetch_transaction_logs_cached(
     if end_ms is None:
         end_ms = _now_ms()
     
-    events: List[dict] = []
-
-    def _window_pull(s_ms: int, e_ms: int):
+    def _window_pull(s_ms: int, e_ms: int) -> List[dict]:
+        events: List[dict] = []
         cursor = None
         pages = 0
         while True:
@@ -136,14 +164,11 @@ def _fetch_transaction_logs_cached(
                 events.append(it)
             cursor = res.get("nextPageCursor")
             if not cursor: break
+        return events
 
-    # 🔧 WINDOWING DE 7 DÍAS
-    s = int(start_ms)
-    while s < end_ms:
-        e = min(s + 7*24*3600*1000 - 1, end_ms)
-        _window_pull(s, e)
-        s = e + 1
-        if s <= 0: break
+    # 🔧 WINDOWING DE 7 DÍAS (ventanas en paralelo, concatenadas en orden)
+    windows = split_windows(start_ms, end_ms, 7 * DAY_MS)
+    events = [it for chunk in fetch_windows(_window_pull, windows) for it in chunk]
 
     _TRANSACTION_LOGS_CACHE[cache_key] = events
     return events
@@ -404,9 +429,8 @@ def _fetch_txlogs_windowed(
     if cache_key in _TXLOG_CACHE_GENERIC:
         return _TXLOG_CACHE_GENERIC[cache_key]
 
-    out: List[dict] = []
-
-    def _pull(s_ms: int, e_ms: int):
+    def _pull(s_ms: int, e_ms: int) -> List[dict]:
+        out: List[dict] = []
         cursor = None
         pages = 0
         while True:
@@ -433,13 +457,11 @@ def _fetch_txlogs_windowed(
             cursor = res.get("nextPageCursor")
             if not cursor:
                 break
+        return out
 
-    # 🔧 WINDOWING DE 7 DÍAS - CRÍTICO PARA EVITAR ERROR 10001
-    s = int(start_ms)
-    while s < end_ms:
-        e = min(s + 7 * 24 * 3600 * 1000 - 1, end_ms)
-        _pull(s, e)
-        s = e + 1
+    # 🔧 WINDOWING DE 7 DÍAS - CRÍTICO PARA EVITAR ERROR 10001 (ventanas en paralelo)
+    windows = split_windows(start_ms, end_ms, 7 * DAY_MS)
+    out = [it for chunk in fetch_windows(_pull, windows) for it in chunk]
 
     # ordena cronológicamente por seguridad
     out.sort(key=lambda x: _to_ms(x.get("transactionTime")))
@@ -638,46 +660,39 @@ def save_bybit_closed_positions(
     Guarda en SQLite usando verificación explícita de duplicados.
     """
     try:
-        from db_manager import save_closed_position
+        from db_manager import save_closed_positions_bulk, closed_position_exists
     except Exception as e:
-        raise RuntimeError(f"db_manager.save_closed_position no disponible: {e}")
+        raise RuntimeError(f"db_manager.save_closed_positions_bulk no disponible: {e}")
 
     rows = fetch_bybit_closed_positions_fifo(
         days=days, category=category, currency=currency, symbol=symbol, debug=debug
     )
     
     import sqlite3
-    conn = sqlite3.connect(db_path)
+    conn = db_connect(db_path)
     cur = conn.cursor()
     
-    saved = 0
+    batch = []
     dup = 0
     for row in rows:
         try:
-            cur.execute("""
-                SELECT COUNT(*) FROM closed_positions 
-                WHERE exchange = ? AND symbol = ? AND close_time = ? AND side = ?
-            """, (row["exchange"], row["symbol"], row["close_time"], row["side"]))
-            
-            if cur.fetchone()[0] > 0:
+            if closed_position_exists(
+                cur, row["exchange"], row["symbol"], row["close_time"], side=row["side"]
+            ):
                 dup += 1
                 if debug:
                     print(f"⏭️  Duplicado: {row['symbol']} {row['side']} {row['close_time']}")
                 continue
                 
-            save_closed_position(row)
-            saved += 1
+            batch.append(row)
             if debug:
-                print(f"✅ Guardada: {row['symbol']} {row['side']} realized={row['realized_pnl']:.2f}")
+                print(f"✅ A guardar: {row['symbol']} {row['side']} realized={row['realized_pnl']:.2f}")
                 
         except Exception as e:
-            msg = str(e).lower()
-            if "unique" in msg or "duplicate" in msg:
-                dup += 1
-            else:
-                print(f"❌ Error: {row.get('symbol')} - {e}")
+            print(f"❌ Error: {row.get('symbol')} - {e}")
     
     conn.close()
+    saved = save_closed_positions_bulk(batch, db_path=db_path)
     
     if debug:
         print(f"✅ Bybit FIFO: {saved} guardadas, {dup} duplicados")
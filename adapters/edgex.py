@@ -32,6 +32,12 @@ from decimal import Decimal
 from collections import defaultdict
 from urllib.parse import urlencode, quote
 import requests
+from utils.http import get_session
+from utils.dbconn import db_connect
+from utils.singleflight import single_flight
+from utils.resilience import call_with_retry
+
+_HTTP = get_session()  # pool keep-alive compartido entre adapters
 
 # Intentar importar web3/eth para firma ECDSA (opcional - fallback a HMAC si no disponible)
 try:
@@ -217,6 +223,11 @@ def _headers(ts: str, signature: Optional[str]) -> Dict[str, str]:
 # =========================
 # Cliente HTTP
 # =========================
+@single_flight(
+    lambda method, path, params=None, private=False, **kw: ("edgex", method, path, (params, private, kw))
+    if method.upper() == "GET"
+    else None
+)
 def _edgex_request(
     method: str,
     path: str,
@@ -248,54 +259,41 @@ def _edgex_request(
     if private and "accountId" not in params and EDGEX_ACCOUNT_ID:
         params["accountId"] = EDGEX_ACCOUNT_ID
 
-    # Generar firma para endpoints privados
-    ts = str(_now_ms())
-    headers = {}
-
-    if private:
-        sign_content = _build_sign_string(method.upper(), path, params, ts)
-        signature = _edgex_signature(sign_content, EDGEX_API_KEY)
-        headers = _headers(ts, signature)
-    else:
-        headers = _headers(ts, None)
-
     # Construir URL con query params para GET
     if method.upper() in ("GET", "DELETE") and params:
         qs = urlencode(params)
         url = f"{url}?{qs}"
 
-    last_err = None
-    for attempt in range(1, max_retries + 1):
-        try:
-            if method.upper() == "GET":
-                r = requests.get(url, headers=headers, timeout=timeout)
-            elif method.upper() == "DELETE":
-                r = requests.delete(url, headers=headers, timeout=timeout)
-            else:  # POST
-                r = requests.post(
-                    url, headers=headers, json=params if params else {}, timeout=timeout
-                )
-
-            r.raise_for_status()
-            data = r.json() if r.text else {}
-
-            # Verificar código de error en respuesta
-            if isinstance(data, dict):
-                code = data.get("code", "SUCCESS")
-                if code not in ("SUCCESS", "0", 0):
-                    raise RuntimeError(
-                        f"EdgeX error: code={code} msg={data.get('msg', data.get('message', 'Unknown'))}"
-                    )
-
-            return data
+    def _send():
+        # timestamp y firma nuevos en cada intento: un reintento no reenvía una firma caducada
+        ts = str(_now_ms())
+        if private:
+            sign_content = _build_sign_string(method.upper(), path, params, ts)
+            headers = _headers(ts, _edgex_signature(sign_content, EDGEX_API_KEY))
+        else:
+            headers = _headers(ts, None)
+        if method.upper() == "GET":
+            return _HTTP.get(url, headers=headers, timeout=timeout)
+        if method.upper() == "DELETE":
+            return _HTTP.delete(url, headers=headers, timeout=timeout)
+        return _HTTP.post(  # POST
+            url, headers=headers, json=params if params else {}, timeout=timeout
+        )
 
-        except Exception as e:
-            last_err = e
-            if attempt >= max_retries:
-                raise
-            time.sleep(retry_backoff * attempt)
+    # reintentos/Retry-After/circuit breaker comunes (utils.resilience)
+    r = call_with_retry("edgex", _send, retries=max_retries, path=path, base=retry_backoff)
+    r.raise_for_status()
+    data = r.json() if r.text else {}
+
+    # Verificar código de error en respuesta
+    if isinstance(data, dict):
+        code = data.get("code", "SUCCESS")
+        if code not in ("SUCCESS", "0", 0):
+            raise RuntimeError(
+                f"EdgeX error: code={code} msg={data.get('msg', data.get('message', 'Unknown'))}"
+            )
 
-    raise last_err or RuntimeError("EdgeX request failed")
+    return data
 
 
 # =========================
@@ -686,9 +684,6 @@ def fetch_edgex_funding_fees(
             if not offset_data:
                 break
 
-            # Pequeño delay para rate limiting
-            time.sleep(0.1)
-
         return acc
 
     except Exception as e:
@@ -747,8 +742,6 @@ def _fetch_trade_fills(
             if not offset_data:
                 break
 
-            time.sleep(0.1)
-
         return fills
 
     except Exception as e:
@@ -905,6 +898,32 @@ def _reconstruct_closed_positions_fifo(
     return closed_positions
 
 
+def _reconstruct_fifo_with_contracts(
+    fills: List[Dict[str, Any]], contract_map: Dict[str, str]
+) -> List[Dict[str, Any]]:
+    """Igual que _reconstruct_closed_positions_fifo pero con el mapa contractId → símbolo
+    ya resuelto (en un proceso hijo no se vuelve a pedir la metadata)."""
+    if contract_map:
+        _CONTRACT_MAP.update(contract_map)
+    return _reconstruct_closed_positions_fifo(fills)
+
+
+def _reconstruct_closed_positions_fifo_pooled(
+    fills: List[Dict[str, Any]],
+) -> List[Dict[str, Any]]:
+    """FIFO por contractId en el pool de procesos (en línea si hay pocos fills)."""
+    from utils.procpool import reconstruct_in_pool
+
+    if not _CONTRACT_MAP:
+        _fetch_contract_metadata()
+    return reconstruct_in_pool(
+        _reconstruct_fifo_with_contracts,
+        fills,
+        lambda f: str(f.get("contractId", "")),
+        dict(_CONTRACT_MAP),
+    )
+
+
 # =========================
 # CLOSED POSITIONS (save_edgex_closed_positions)
 # =========================
@@ -933,7 +952,7 @@ def save_edgex_closed_positions(
 
     try:
         # Importar db_manager para guardar
-        from db_manager import save_closed_position
+        from db_manager import save_closed_positions_bulk
 
         # 1. Obtener trade fills
         if debug:
@@ -953,7 +972,7 @@ def save_edgex_closed_positions(
         if debug:
             print("🔧 Reconstruyendo posiciones cerradas con FIFO...")
 
-        closed = _reconstruct_closed_positions_fifo(fills)
+        closed = _reconstruct_closed_positions_fifo_pooled(fills)
 
         if not closed:
             if debug:
@@ -968,12 +987,12 @@ def save_edgex_closed_positions(
             print(f"❌ Database not found: {db_path}")
             return 0
 
-        conn = sqlite3.connect(db_path)
+        conn = db_connect(db_path)
         cur = conn.cursor()
-        saved = 0
+        batch = []
         skipped = 0
 
-        # 4. Guardar cada posición
+        # 4. Preparar cada posición (se guardan en un solo lote)
         for pos in closed:
             try:
                 # Verificar si ya existe (deduplicación)
@@ -990,8 +1009,7 @@ def save_edgex_closed_positions(
                     continue
 
                 # Guardar usando db_manager (recalcula métricas)
-                save_closed_position(pos)
-                saved += 1
+                batch.append(pos)
 
                 if debug:
                     print(
@@ -1005,6 +1023,7 @@ def save_edgex_closed_positions(
                 continue
 
         conn.close()
+        saved = save_closed_positions_bulk(batch, db_path=db_path)
 
         if debug:
             print(f"✅ EdgeX guardadas: {saved} | omitidas (duplicadas): {skipped}")
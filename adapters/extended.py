@@ -1,6 +1,11 @@
 from flask import Flask, render_template, jsonify
 import pandas as pd
 import requests
+from utils.http import get_session
+from utils.dbconn import db_connect
+from utils.resilience import call_with_retry
+
+_HTTP = get_session()  # pool keep-alive compartido entre adapters
 import time
 import hashlib
 from dotenv import load_dotenv
@@ -12,7 +17,7 @@ import math
 from datetime import datetime, timezone
 import json, urllib
 import sqlite3
-from db_manager import save_closed_position
+from db_manager import save_closed_positions_bulk, closed_position_exists
 
 
 EXTENDED_OPEN_VERBOSE = os.getenv("EXTENDED_OPEN_VERBOSE", "0") == "1"
@@ -71,21 +76,22 @@ def extended_get(path: str, params=None, api_key=None, api_secret=None):
 
     try:
         url = f"{EXT_BASE_URL}/api/v1{path}"
-        timestamp = str(int(time.time() * 1000))
-
-        message = timestamp + "GET" + f"/api/v1{path}" + ""
-        signature = hmac.new(
-            api_secret.encode("utf-8"), message.encode("utf-8"), hashlib.sha256
-        ).hexdigest()
 
-        headers = {
-            "X-API-KEY": api_key,
-            "X-TIMESTAMP": timestamp,
-            "X-SIGNATURE": signature,
-            "Content-Type": "application/json",
-        }
+        def _send():
+            timestamp = str(int(time.time() * 1000))
+            message = timestamp + "GET" + f"/api/v1{path}" + ""
+            signature = hmac.new(
+                api_secret.encode("utf-8"), message.encode("utf-8"), hashlib.sha256
+            ).hexdigest()
+            headers = {
+                "X-API-KEY": api_key,
+                "X-TIMESTAMP": timestamp,
+                "X-SIGNATURE": signature,
+                "Content-Type": "application/json",
+            }
+            return _HTTP.get(url, headers=headers, params=params, timeout=30)
 
-        response = requests.get(url, headers=headers, params=params, timeout=30)
+        response = call_with_retry("extended", _send, path=path)
         response.raise_for_status()
         return response.json()
     except Exception as e:
@@ -287,7 +293,6 @@ def fetch_funding_extended(
                 break
 
             cursor = next_cursor
-            time.sleep(0.1)  # Rate limiting
 
         # Procesar y normalizar funding payments
         results = []
@@ -410,7 +415,6 @@ def fetch_closed_positions_extended(limit=1000, debug=False):
                     break
 
                 cursor = next_cursor
-                time.sleep(0.1)
 
             # Procesar y normalizar las posiciones con funding de esta subcuenta
             for pos in positions_this_account:
@@ -508,28 +512,20 @@ def save_extended_closed_positions(db_path="portfolio.db", debug=False):
         print("⚠️ No closed positions returned from Extended.")
         return
 
-    conn = sqlite3.connect(db_path)
+    conn = db_connect(db_path)
     cur = conn.cursor()
-    saved = 0
+    batch = []
     skipped = 0
 
     for pos in closed_positions:
         try:
             # deduplicación por (exchange, symbol, close_time)
-            cur.execute(
-                """
-                SELECT COUNT(*) FROM closed_positions
-                WHERE exchange = ? AND symbol = ? AND close_time = ?
-            """,
-                (pos["exchange"], pos["symbol"], pos["close_time"]),
-            )
-
-            if cur.fetchone()[0]:
+            if closed_position_exists(cur, pos["exchange"], pos["symbol"], pos["close_time"]):
                 skipped += 1
                 continue
 
-            # Usar el helper centralizado
-            save_closed_position(
+            # Se guarda todo el lote al final con el helper centralizado
+            batch.append(
                 {
                     "exchange": pos["exchange"],
                     "symbol": pos["symbol"],
@@ -547,12 +543,12 @@ def save_extended_closed_positions(db_path="portfolio.db", debug=False):
                     "liquidation_price": pos.get("liquidation_price"),
                 }
             )
-            saved += 1
 
         except Exception as e:
             print(f"⚠️ Error guardando {pos.get('symbol')} (Extended): {e}")
 
     conn.close()
+    saved = save_closed_positions_bulk(batch, db_path=db_path)
     print(f"✅ Extended guardadas: {saved} | omitidas (duplicadas): {skipped}")
 
 
@@ -4,7 +4,7 @@ from collections import defaultdict
 from datetime import datetime, timedelta
 from collections import defaultdict
 import sqlite3
-from db_manager import init_db, save_closed_position
+from db_manager import init_db, save_closed_positions_bulk, closed_position_exists
 import os
 import time
 import hmac
@@ -17,6 +17,12 @@ import sys
 from difflib import SequenceMatcher
 
 import requests
+from utils.http import get_session
+from utils.dbconn import db_connect
+from utils.singleflight import single_flight
+from utils.resilience import call_with_retry
+
+_HTTP = get_session()  # pool keep-alive compartido entre adapters
 
 from dotenv import load_dotenv
 
@@ -98,6 +104,11 @@ def _headers(
     return headers
 
 
+@single_flight(
+    lambda method, path, params=None, body_obj=None, timeout=15: ("gate", method, path, (params, timeout))
+    if method.upper() == "GET"
+    else None
+)
 def _request(
     method: str,
     path: str,
@@ -106,9 +117,10 @@ def _request(
     timeout: int = 15,
 ) -> Any:
     url = f"{GATE_HOST}{GATE_PREFIX}{path}"
-    headers = _headers(method, path, params, body_obj)
-    try:
-        resp = requests.request(
+
+    def _send():
+        # cabeceras (Timestamp + SIGN) nuevas en cada intento
+        return _HTTP.request(
             method.upper(),
             url,
             params=params,
@@ -117,9 +129,14 @@ def _request(
                 if body_obj is None
                 else json.dumps(body_obj, separators=(",", ":"), ensure_ascii=False)
             ),
-            headers=headers,
+            headers=_headers(method, path, params, body_obj),
             timeout=timeout,
         )
+
+    try:
+        resp = call_with_retry(
+            "gate", _send, retries=3 if method.upper() == "GET" else 1, path=path
+        )
     except requests.RequestException as e:
         raise GateV4Error(f"Error de red: {e}") from e
     if resp.status_code >= 400:
@@ -581,9 +598,9 @@ def save_gate_closed_positions(
         print("⚠️ No se obtuvieron posiciones cerradas de Gate.io.")
         return 0
 
-    conn = sqlite3.connect(db_path)
+    conn = db_connect(db_path)
     cur = conn.cursor()
-    saved = 0
+    batch = []
     skipped = 0
 
     for pos in closed_positions:
@@ -595,18 +612,11 @@ def save_gate_closed_positions(
             print(f"🔤 Normalizando símbolo: {original_symbol} → {normalized_symbol}")
 
             # Deduplicación por (exchange, symbol, close_time) usando el símbolo normalizado
-            cur.execute(
-                """
-                SELECT COUNT(*) FROM closed_positions
-                WHERE exchange = ? AND symbol = ? AND close_time = ?
-            """,
-                (pos["exchange"], normalized_symbol, pos["close_time"]),
-            )
-            if cur.fetchone()[0]:
+            if closed_position_exists(cur, pos["exchange"], normalized_symbol, pos["close_time"]):
                 skipped += 1
                 continue
 
-            # Mapear a los nombres que espera save_closed_position / DB
+            # Mapear a los nombres que espera save_closed_positions_bulk / DB
             position_data = {
                 "exchange": pos["exchange"],
                 "symbol": normalized_symbol,  # Usar el símbolo normalizado
@@ -625,13 +635,13 @@ def save_gate_closed_positions(
                 "liquidation_price": pos.get("liquidation_price"),
             }
 
-            save_closed_position(position_data)
-            saved += 1
+            batch.append(position_data)
 
         except Exception as e:
             print(f"⚠️ Error guardando posición {pos.get('symbol')}: {e}")
 
     conn.close()
+    saved = save_closed_positions_bulk(batch, db_path=db_path)
     print(f"✅ Gate guardadas: {saved} | omitidas (duplicadas): {skipped}")
     return saved
 
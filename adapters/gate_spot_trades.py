@@ -56,6 +56,9 @@ if UTILS_DIR not in sys.path:
 
 from utils.symbols import normalize_symbol  # utils/symbols.py
 from utils.time import to_s  # utils/time.py (convierte ms↔s robustamente)
+from utils.dbconn import db_connect
+from db_manager import closed_position_key
+from utils.windows import fetch_windows, split_windows
 
 # === Gate.auth helpers ===
 try:
@@ -76,37 +79,6 @@ STABLES = {"USDT", "USDC"}
 IGNORE_BASES = {"BTC", "ETH"}  # ignora cualquier trade que las involucre
 
 
-def get_existing_trade_hashes(db_path: str) -> set:
-    """
-    Obtiene un set de hashes únicos para trades ya existentes en la base de datos.
-    El hash se basa en exchange + symbol + side + close_time + size
-    """
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-
-    try:
-        cursor.execute(
-            """
-            SELECT exchange, symbol, side, close_time, size 
-            FROM closed_positions 
-            WHERE exchange = 'gate'
-        """
-        )
-        existing_trades = cursor.fetchall()
-
-        # Crear hashes únicos basados en los campos clave
-        hashes = set()
-        for trade in existing_trades:
-            exchange, symbol, side, close_time, size = trade
-            # Crear un hash único para este trade
-            trade_hash = f"{exchange}_{symbol}_{side}_{close_time}_{round(size, 8)}"
-            hashes.add(trade_hash)
-
-        return hashes
-    finally:
-        conn.close()
-
-
 def _num(x: Any, d: float = 0.0) -> float:
     try:
         return float(x)
@@ -179,17 +151,14 @@ def fetch_spot_trades(
     if existing_hashes is None:
         existing_hashes = set()
 
-    all_fills = []
     to_ts = int(_t.time())
     from_ts = to_ts - max(1, int(days_back)) * 24 * 3600
 
-    # Dividir en ventanas de máximo 30 días
+    # Ventanas de máximo 30 días, independientes: se piden en paralelo
     window_days = 30
-    current_to = to_ts
-
-    while current_to > from_ts:
-        current_from = max(from_ts, current_to - (window_days * 24 * 3600))
 
+    def _pull_window(current_from: int, current_to: int) -> List[Fill]:
+        fills: List[Fill] = []
         page = 1
         max_pages = 10  # Límite de páginas por ventana
 
@@ -228,7 +197,7 @@ def fetch_spot_trades(
 
                     # Solo agregar si no existe
                     if trade_hash not in existing_hashes:
-                        all_fills.append(Fill(ts, pair, side, amt, px, fee, fee_ccy))
+                        fills.append(Fill(ts, pair, side, amt, px, fee, fee_ccy))
                         new_trades_in_page += 1
                     else:
                         if debug:
@@ -246,15 +215,14 @@ def fetch_spot_trades(
                     break
 
                 page += 1
-                _t.sleep(0.1)
 
             except Exception as e:
                 print(f"❌ Error en página {page}: {e}")
                 break
+        return fills
 
-        # Mover la ventana hacia atrás
-        current_to = current_from - 1
-        _t.sleep(0.2)
+    windows = split_windows(from_ts, to_ts, window_days * 24 * 3600)
+    all_fills = [f for chunk in fetch_windows(_pull_window, windows) for f in chunk]
 
     # Orden por tiempo ascendente para FIFO estable
     all_fills.sort(key=lambda f: f.ts)
@@ -324,8 +292,9 @@ INSERT_SQL = (
     "INSERT OR IGNORE INTO closed_positions ("
     "exchange, symbol, side, size, entry_price, close_price, "
     "open_time, close_time, pnl, realized_pnl, funding_total, fee_total, "
-    "pnl_percent, apr, initial_margin, notional, leverage, liquidation_price, ignore_trade"
-    ") VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)"
+    "pnl_percent, apr, initial_margin, notional, leverage, liquidation_price, ignore_trade, "
+    "dedupe_key"
+    ") VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)"
 )
 
 
@@ -367,6 +336,10 @@ def _insert_row(conn: sqlite3.Connection, row: Dict[str, Any], verbose: bool = F
         0.0,  # leverage
         None,  # liquidation_price
         int(bool(row.get("ignore_trade", False))),
+        closed_position_key(
+            row.get("exchange", "gate"), row.get("symbol"), row.get("side"),
+            open_s, close_s, size,
+        ),
     )
     cur = conn.cursor()
     cur.execute(INSERT_SQL, vals)
@@ -397,21 +370,13 @@ def save_gate_spot_positions(
     # --- umbral de "polvo" para cierre (0.1% del pico); mínimo absoluto 0.01 ---
     DUST_RATIO = 0.001
 
-    from db_manager import init_db, migrate_spot_support
+    from db_manager import init_db, migrate_spot_support, ensure_closed_dedupe
 
     init_db()
     migrate_spot_support()
 
-    _dbg("🔍 Obteniendo trades existentes de la base de datos...")
-    existing_hashes = get_existing_trade_hashes(db_path)
-    _dbg(f"📋 Trades existentes encontrados: {len(existing_hashes)}")
-
-    fills = fetch_spot_trades(
-        days_back=days_back,
-        limit=1000,
-        existing_hashes=existing_hashes,
-        debug=debug,
-    )
+    # Sin precarga de existentes: los duplicados los descarta el índice UNIQUE (dedupe_key)
+    fills = fetch_spot_trades(days_back=days_back, limit=1000, debug=debug)
 
     total_trades_found = len(fills)
     _dbg(f"🔎 GATE spot fills nuevos a procesar: {total_trades_found}")
@@ -446,7 +411,8 @@ def save_gate_spot_positions(
     saved = 0
     ignored = 0
 
-    conn = sqlite3.connect(db_path)
+    conn = db_connect(db_path)
+    ensure_closed_dedupe(conn)  # <- índice UNIQUE por dedupe_key
 
     for pair, trades in by_pair.items():
         base, quote = _split_pair(pair)
@@ -19,7 +19,7 @@ if str(_PARENT) not in sys.path:
     sys.path.insert(0, str(_PARENT))
 
 from utils.symbols import normalize_symbol
-from db_manager import init_funding_db, upsert_funding_events, save_closed_position
+from db_manager import init_funding_db, upsert_funding_events, save_closed_positions_bulk
 
 # Ruta a portfolio.db (en el directorio padre)
 DB_PATH = _PARENT / "portfolio.db"
@@ -421,6 +421,7 @@ def process_uploads(
     saved_positions = 0
     if roundtrips:
         try:
+            batch = []
             for rt in roundtrips:
                 open_s = rt.open_ts_ms // 1000
                 close_s = rt.close_ts_ms // 1000
@@ -450,8 +451,7 @@ def process_uploads(
                     "liquidation_price": None,
                 }
 
-                save_closed_position(pos_data)
-                saved_positions += 1
+                batch.append(pos_data)
 
                 print(
                     f"[KCEX] ✅ {rt.symbol} {rt.side} size={rt.size:.4f} "
@@ -460,6 +460,8 @@ def process_uploads(
                     f"funding={funding_total:.2f} realized={realized_pnl:.2f}"
                 )
 
+            saved_positions = save_closed_positions_bulk(batch)
+
         except Exception as e:
             return {"ok": False, "error": f"Error guardando closed positions: {str(e)}"}
 
@@ -4,6 +4,14 @@ import os, time, hmac, hashlib, base64, json, sqlite3
 from urllib.parse import urlencode
 from typing import Any, Dict, List, Optional
 import requests
+from utils.http import get_session
+from utils.dbconn import db_connect
+from utils.singleflight import single_flight
+from utils.clock import register_time_source, server_now_ms, with_clock_retry
+from utils.resilience import call_with_retry
+from utils.persymbol import for_each_symbol
+
+_HTTP = get_session()  # pool keep-alive compartido entre adapters
 #====== Imports para prints
 # from pp import (
 #     p_closed_debug_header, p_closed_debug_count, p_closed_debug_norm_size,
@@ -82,14 +90,16 @@ def _safe_float(x, default=0.0) -> float:
 # =========================
 # Firma y headers KuCoin v3
 # =========================
+def _kucoin_server_time_ms() -> int:
+    r = _HTTP.get(f"{KUCOIN_BASE_URL}/api/v1/timestamp", timeout=5)
+    r.raise_for_status()
+    return int(r.json().get("data"))
+
+register_time_source("kucoin", _kucoin_server_time_ms)
+
 def kucoin_server_timestamp_ms() -> str:
-    """Timestamp del servidor (ms) como string; si falla, local."""
-    try:
-        r = requests.get(f"{KUCOIN_BASE_URL}/api/v1/timestamp", timeout=5)
-        r.raise_for_status()
-        return str(int(r.json().get("data")))
-    except Exception:
-        return str(_now_ms())
+    """Timestamp del servidor (ms) como string, con el offset cacheado (utils.clock); si no se pudo medir, local."""
+    return str(server_now_ms("kucoin"))
 
 def _kucoin_sign(timestamp: str, method: str, endpoint: str, secret: str, body: str = "") -> str:
     str_to_sign = f"{timestamp}{method.upper()}{endpoint}{body}"
@@ -124,21 +134,29 @@ def _kucoin_headers(api_key: str, api_secret: str, passphrase: str,
         "Content-Type": "application/json"
     }
 
+@single_flight(lambda base, endpoint_with_query, method="GET", body=None: ("kucoin", method, base + endpoint_with_query, None) if method.upper() == "GET" else None)
 def _get(base: str, endpoint_with_query: str, method: str = "GET", body: Optional[dict] = None) -> dict:
     """
     Llamada GET/POST firmada a KuCoin.
     Para GET, body debe ser None.
     """
     body_str = "" if body is None else json.dumps(body, separators=(",", ":"))
-    headers = _kucoin_headers(
-        KUCOIN_API_KEY, KUCOIN_API_SECRET, KUCOIN_API_PASSPHRASE,
-        method, endpoint_with_query, body_str
-    )
     url = f"{base}{endpoint_with_query}"
-    if method.upper() == "GET":
-        r = requests.get(url, headers=headers, timeout=20)
-    else:
-        r = requests.post(url, headers=headers, data=body_str, timeout=20)
+
+    def _send():
+        headers = _kucoin_headers(
+            KUCOIN_API_KEY, KUCOIN_API_SECRET, KUCOIN_API_PASSPHRASE,
+            method, endpoint_with_query, body_str
+        )
+        if method.upper() == "GET":
+            return _HTTP.get(url, headers=headers, timeout=20)
+        return _HTTP.post(url, headers=headers, data=body_str, timeout=20)
+
+    path = endpoint_with_query.split("?", 1)[0]
+    retries = 3 if method.upper() == "GET" else 1
+    r = with_clock_retry(
+        "kucoin", lambda: call_with_retry("kucoin", _send, retries=retries, path=path)
+    )
     r.raise_for_status()
     return r.json() if r.text else {}
 
@@ -314,7 +332,7 @@ def _kucoin_symbols_from_db(db_path: str = "portfolio.db", max_rows: int = 200)
     """
     try:
         import sqlite3
-        conn = sqlite3.connect(db_path)
+        conn = db_connect(db_path)
         cur = conn.cursor()
         cur.execute("PRAGMA table_info(closed_positions)")
         cols = {row[1] for row in cur.fetchall()}
@@ -327,11 +345,8 @@ def _kucoin_symbols_from_db(db_path: str = "portfolio.db", max_rows: int = 200)
             """, (max_rows,))
             rows = [r[0] for r in cur.fetchall()]
         else:
-            cur.execute("""
-                SELECT DISTINCT symbol FROM closed_positions
-                WHERE exchange='kucoin' AND symbol IS NOT NULL AND symbol <> ''
-                ORDER BY close_time DESC LIMIT ?
-            """, (max_rows,))
+            from db_manager import KUCOIN_CLOSED_SYMBOLS_SQL  # mismo SQL que CLOSED_HOT_QUERIES
+            cur.execute(KUCOIN_CLOSED_SYMBOLS_SQL, (max_rows,))
             bases = [r[0] for r in cur.fetchall()]
             rows = []
             for b in bases:
@@ -395,9 +410,9 @@ def fetch_funding_kucoin(limit: int = 5000,
 
     # ventana de 85-90 días para cumplir < 3 meses
     step_ms = 85 * 24 * 3600 * 1000
-    out: List[Dict[str, Any]] = []
 
-    for sym in symbols:
+    def _pull_symbol(sym: str) -> List[Dict[str, Any]]:
+        out: List[Dict[str, Any]] = []
         start = since
         while start < now_ms and len(out) < limit:
             end = min(start + step_ms, now_ms)
@@ -442,6 +457,13 @@ def fetch_funding_kucoin(limit: int = 5000,
             start = end
             if not items:
                 break  # no hay más en esta ventana
+        return out
+
+    # un símbolo por request: se piden en paralelo y se concatenan en orden
+    out: List[Dict[str, Any]] = []
+    for _sym, items in for_each_symbol("kucoin", symbols, _pull_symbol):
+        out.extend(items)
+    out = out[:limit]
 
     out.sort(key=lambda x: x["timestamp"] or 0)
     if debug:
@@ -603,7 +625,7 @@ def save_kucoin_closed_positions(*args, **kwargs):
       - save_kucoin_closed_positions(db_path="portfolio.db", days=90, debug=False)
     """
     import os, sqlite3
-    from db_manager import save_closed_position, DB_PATH as _DEFAULT_DB_PATH
+    from db_manager import save_closed_positions_bulk, closed_position_exists, DB_PATH as _DEFAULT_DB_PATH
 
     # -------- helpers --------
     def _f(x, d=0.0):
@@ -666,7 +688,7 @@ def save_kucoin_closed_positions(*args, **kwargs):
     if args and isinstance(args[0], dict):
         # Modo: una sola posición
         position = _enrich(args[0])
-        save_closed_position(position)
+        save_closed_positions_bulk([position])
         return
 
     # Modo: bulk con db_path/days/debug
@@ -690,30 +712,26 @@ def save_kucoin_closed_positions(*args, **kwargs):
         print(f"❌ Database not found: {db_path}")
         return
 
-    conn = sqlite3.connect(db_path)
+    conn = db_connect(db_path)
     cur = conn.cursor()
-    saved = 0
+    batch = []
     skipped = 0
 
     for pos in positions:
         try:
             # dedupe por exchange+symbol+close_time
-            cur.execute(
-                "SELECT 1 FROM closed_positions WHERE exchange=? AND symbol=? AND close_time=? LIMIT 1",
-                (pos.get("exchange"), pos.get("symbol"), pos.get("close_time"))
-            )
-            if cur.fetchone():
+            if closed_position_exists(cur, pos.get("exchange"), pos.get("symbol"), pos.get("close_time")):
                 skipped += 1
                 continue
 
-            save_closed_position(_enrich(pos))
-            saved += 1
+            batch.append(_enrich(pos))
 
         except Exception as e:
             if debug:
                 print(f"⚠️ Error guardando posición {pos.get('symbol')}: {e}")
 
     conn.close()
+    saved = save_closed_positions_bulk(batch, db_path=db_path)
     print(f"✅ KuCoin guardadas: {saved} | omitidas (duplicadas): {skipped}")
 
 if __name__ == "__main__":
@@ -30,7 +30,7 @@ if str(_PARENT) not in sys.path:
     sys.path.insert(0, str(_PARENT))
 
 from utils.symbols import normalize_symbol
-from db_manager import init_funding_db, upsert_funding_events, save_closed_position
+from db_manager import init_funding_db, upsert_funding_events, save_closed_positions_bulk
 
 # Ruta a portfolio.db (en el directorio padre)
 DB_PATH = _PARENT / "portfolio.db"
@@ -521,6 +521,7 @@ def process_uploads(
     saved_positions = 0
     if roundtrips:
         try:
+            batch = []
             for rt in roundtrips:
                 open_s = rt.open_ts_ms // 1000
                 close_s = rt.close_ts_ms // 1000
@@ -552,8 +553,7 @@ def process_uploads(
                     "_lock_size": True,  # Evitar recálculo de size
                 }
 
-                save_closed_position(pos_data)
-                saved_positions += 1
+                batch.append(pos_data)
 
                 print(
                     f"[LBANK] ✅ {rt.symbol} {rt.side} size={rt.size:.4f} "
@@ -562,6 +562,8 @@ def process_uploads(
                     f"funding={funding_total:.2f} realized={realized_pnl:.2f}"
                 )
 
+            saved_positions = save_closed_positions_bulk(batch)
+
         except Exception as e:
             import traceback
 
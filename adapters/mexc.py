@@ -10,6 +10,13 @@ load_dotenv()
 from datetime import datetime, timezone
 
 import requests
+from utils.http import get_session
+from utils.dbconn import db_connect
+from utils.singleflight import single_flight
+from utils.resilience import call_with_retry
+from utils.clock import register_time_source, server_now_ms, with_clock_retry
+
+_HTTP = get_session()  # pool keep-alive compartido entre adapters
 
 # === Añade cerca de los imports / helpers ===
 _MARK_CACHE = {}  # { "SYMBOL": (price_float, ts_seconds) }
@@ -116,6 +123,21 @@ def _mexc_signature(param_str: str, ts: str) -> str:
     return digest
 
 
+def _mexc_server_time_ms() -> int:
+    r = _HTTP.get(f"{MEXC_BASE_URL}/api/v1/contract/ping", timeout=10)
+    r.raise_for_status()
+    return int(r.json()["data"])
+
+
+register_time_source("mexc", _mexc_server_time_ms)
+
+
+def _mexc_time_error(resp) -> bool:
+    """MEXC futuros responde 200 + success=false cuando Request-Time cae fuera de Recv-Window."""
+    text = (getattr(resp, "text", "") or "").lower()
+    return '"success":false' in text.replace(" ", "") and ("request-time" in text or "recv" in text)
+
+
 def _headers(ts: str, signature: Optional[str]) -> Dict[str, str]:
     hdrs = {
         "Content-Type": "application/JSON",
@@ -129,6 +151,11 @@ def _headers(ts: str, signature: Optional[str]) -> Dict[str, str]:
     return hdrs
 
 
+@single_flight(
+    lambda method, path, params=None, private=False, **kw: ("mexc", method, path, (params, private, kw))
+    if method.upper() == "GET"
+    else None
+)
 def _request(
     method: str,
     path: str,
@@ -145,8 +172,7 @@ def _request(
     url = f"{MEXC_BASE_URL}{path}"
     params = dict(params or {})
 
-    # Firma
-    ts = str(_now_ms())
+    # Firma (sobre estos params, que no cambian entre intentos)
     sign_str = ""
     if private:
         if method.upper() in ("GET", "DELETE"):
@@ -154,46 +180,42 @@ def _request(
         else:
             # POST → JSON string (sin ordenar) (no lo usamos por ahora)
             sign_str = json.dumps(params, separators=(",", ":"))
-        sig = _mexc_signature(sign_str, ts)
-        headers = _headers(ts, sig)
-    else:
-        headers = _headers(ts, None)
 
     # Query en URL para GET/DELETE
     if method.upper() in ("GET", "DELETE") and params:
         qs = urlencode(params)
         url = f"{url}?{qs}"
 
-    last_err = None
-    for attempt in range(1, max_retries + 1):
-        try:
-            if method.upper() == "GET":
-                r = requests.get(url, headers=headers, timeout=timeout)
-            elif method.upper() == "DELETE":
-                r = requests.delete(url, headers=headers, timeout=timeout)
-            else:
-                r = requests.post(
-                    url,
-                    headers=headers,
-                    data=json.dumps(params) if params else "{}",
-                    timeout=timeout,
-                )
-            r.raise_for_status()
-            data = r.json() if r.text else {}
-            # Protocolo MEXC common
-            if isinstance(data, dict) and not data.get("success", True):
-                # algunos endpoints devuelven success=false + code/message
-                raise RuntimeError(
-                    f"MEXC error: code={data.get('code')} msg={data.get('message')}"
-                )
-            return data
-        except Exception as e:
-            last_err = e
-            if attempt >= max_retries:
-                raise
-            time.sleep(retry_backoff * attempt)
-    # si sale del loop
-    raise last_err or RuntimeError("MEXC request failed")
+    def _send():
+        # Request-Time con el offset cacheado del servidor (utils.clock); se firma en cada intento
+        ts = str(server_now_ms("mexc"))
+        headers = _headers(ts, _mexc_signature(sign_str, ts) if private else None)
+        if method.upper() == "GET":
+            return _HTTP.get(url, headers=headers, timeout=timeout)
+        if method.upper() == "DELETE":
+            return _HTTP.delete(url, headers=headers, timeout=timeout)
+        return _HTTP.post(
+            url,
+            headers=headers,
+            data=json.dumps(params) if params else "{}",
+            timeout=timeout,
+        )
+
+    # reintentos/Retry-After/circuit breaker comunes (utils.resilience)
+    r = with_clock_retry(
+        "mexc",
+        lambda: call_with_retry("mexc", _send, retries=max_retries, path=path, base=retry_backoff),
+        check=_mexc_time_error,
+    )
+    r.raise_for_status()
+    data = r.json() if r.text else {}
+    # Protocolo MEXC common
+    if isinstance(data, dict) and not data.get("success", True):
+        # algunos endpoints devuelven success=false + code/message
+        raise RuntimeError(
+            f"MEXC error: code={data.get('code')} msg={data.get('message')}"
+        )
+    return data
 
 
 # ============
@@ -750,7 +772,7 @@ def save_mexc_closed_positions(
 ) -> int:
     try:
         import sqlite3
-        from db_manager import save_closed_position
+        from db_manager import save_closed_positions_bulk
 
         rows = _iter_history_positions(days=days)
         if not rows:
@@ -762,10 +784,10 @@ def save_mexc_closed_positions(
             print(f"❌ Database not found: {db_path}")
             return 0
 
-        conn = sqlite3.connect(db_path)
+        conn = db_connect(db_path)
         cur = conn.cursor()
-        saved = 0
-        replaced = 0
+        batch = []
+        replace_ids = []
 
         for r in rows:
             try:
@@ -782,24 +804,15 @@ def save_mexc_closed_positions(
                 row = cur.fetchone()
 
                 if row:
-                    # 🔁 Reemplazar para aplicar el size corregido
-                    cur.execute(
-                        """
-                        DELETE FROM closed_positions
-                        WHERE id = ?
-                    """,
-                        (row[0],),
-                    )
-                    conn.commit()
-                    replaced += 1
+                    # 🔁 Reemplazar para aplicar el size corregido (DELETE en la misma transacción que el lote)
+                    replace_ids.append((row[0],))
                     if debug:
                         print(
                             f"🔁 Reemplazando duplicado: {pos['symbol']} close_time={pos['close_time']}"
                         )
 
                 # Insert centralizado (db_manager recalcula métricas)
-                save_closed_position(pos)
-                saved += 1
+                batch.append(pos)
 
                 if debug:
                     src = (
@@ -819,13 +832,21 @@ def save_mexc_closed_positions(
                 print(f"❌ Error guardando posición MEXC {r.get('symbol', '')}: {e}")
                 continue
 
-        conn.close()
+        # DELETEs + lote en la misma conexión/transacción: el commit del lote
+        # los hace atómicos y, si el lote falla, el rollback deshace también los DELETE
+        try:
+            cur.executemany("DELETE FROM closed_positions WHERE id = ?", replace_ids)
+            saved = save_closed_positions_bulk(batch, conn=conn)
+        finally:
+            conn.close()
+        replaced = len(replace_ids)
         print(f"✅ MEXC guardadas: {saved} | reemplazadas: {replaced}")
         return saved
 
     except Exception as e:
+        # se relanza: el sync lo reporta como error del exchange, no como "0 guardadas"
         print(f"❌ MEXC closed positions error: {e}")
-        return 0
+        raise
 
 
 # =========================
@@ -1038,9 +1059,6 @@ def debug_dump_mexc_funding(
             print("↳ fin: página vacía")
             break
 
-        # pequeño respiro para no pegarse con el rate-limit (20 req / 2 s)
-        time.sleep(0.1)
-
     print("\n============== RESUMEN ==============")
     print(f"total_vistos={total_seen}")
     if earliest or latest:
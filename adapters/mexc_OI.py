@@ -203,9 +203,7 @@ if __name__ == "__main__":
     for sym in test_symbols:
         print(f"\n{'─'*60}")
         test_ticker(sym)
-        test_contract_detail(sym)
-        import time
-        time.sleep(1)  # Espera 1 seg entre símbolos (rate limit)
+        test_contract_detail(sym)  # _request ya respeta el rate limit de mexc
     """
     
     # ═══════════════════════════════════════════════════════════
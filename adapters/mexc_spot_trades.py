@@ -29,6 +29,14 @@ if BASE_DIR not in sys.path:
 
 from utils.symbols import normalize_symbol
 from utils.time import to_s
+from utils.dbconn import db_connect
+from db_manager import closed_position_key, ensure_closed_dedupe
+from utils.http import get_session
+from utils.resilience import call_with_retry
+from utils.clock import register_time_source, server_now_ms, with_clock_retry
+from utils.persymbol import for_each_symbol
+
+_HTTP = get_session()  # pool keep-alive compartido entre adapters
 
 # === MEXC Spot Configuration ===
 MEXC_SPOT_BASE_URL = "https://api.mexc.com"
@@ -54,6 +62,15 @@ def _has_creds() -> bool:
     return bool(MEXC_API_KEY and MEXC_API_SECRET)
 
 
+def _mexc_spot_server_time_ms() -> int:
+    r = _HTTP.get(f"{MEXC_SPOT_BASE_URL}/api/v3/time", timeout=10)
+    r.raise_for_status()
+    return int(r.json()["serverTime"])
+
+
+register_time_source("mexc_spot", _mexc_spot_server_time_ms)
+
+
 def _generate_signature(params: Dict[str, Any]) -> str:
     """Genera firma HMAC SHA256 para MEXC Spot"""
     query_string = urlencode(params)
@@ -82,88 +99,48 @@ def _mexc_spot_request(
         "X-MEXC-APIKEY": MEXC_API_KEY,
     }
 
-    # Para endpoints privados, agregar timestamp y firma
-    if private:
-        params["timestamp"] = _now_ms()
-        params["recvWindow"] = MEXC_RECV_WINDOW
-
-        # Generar firma
-        signature = _generate_signature(params)
-        params["signature"] = signature
-
-    last_err = None
-    for attempt in range(1, max_retries + 1):
-        try:
-            if method.upper() == "GET":
-                # CORREGIDO: Usar el parámetro 'params' de requests para evitar duplicación
-                response = requests.get(
-                    url, headers=headers, params=params, timeout=timeout
-                )
-            else:
-                # Para POST, parámetros van en body
-                response = requests.post(
-                    url, headers=headers, data=params, timeout=timeout
-                )
-
-            response.raise_for_status()
-            data = response.json()
-
-            # Verificar respuesta de error MEXC
-            if isinstance(data, dict) and "code" in data and data["code"] != 200:
-                error_msg = data.get("msg", "Unknown error")
-                raise RuntimeError(f"MEXC API error {data['code']}: {error_msg}")
-
-            return data
-
-        except requests.exceptions.Timeout:
-            print(f"⏰ Timeout en intento {attempt}/{max_retries} para {endpoint}")
-            if attempt >= max_retries:
-                raise
-            time.sleep(attempt * 1)
-        except requests.exceptions.ConnectionError as e:
-            print(f"🔌 Connection error en intento {attempt}/{max_retries}: {e}")
-            if attempt >= max_retries:
-                raise
-            time.sleep(attempt * 1)
-        except Exception as e:
-            last_err = e
-            if attempt >= max_retries:
-                raise
-            time.sleep(attempt * 1)
-
-    raise last_err or RuntimeError("MEXC Spot request failed")
+    def _send():
+        req_params = dict(params)
+        # Para endpoints privados, agregar timestamp (hora del servidor, utils.clock) y firma
+        if private:
+            req_params["timestamp"] = server_now_ms("mexc_spot")
+            req_params["recvWindow"] = MEXC_RECV_WINDOW
 
+            # Generar firma
+            signature = _generate_signature(req_params)
+            req_params["signature"] = signature
 
-# === Funciones de base de datos ===
-def get_existing_trade_hashes(db_path: str) -> set:
-    """Obtiene hashes de trades ya existentes en la base de datos"""
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
+        if method.upper() == "GET":
+            # CORREGIDO: Usar el parámetro 'params' de requests para evitar duplicación
+            return _HTTP.get(url, headers=headers, params=req_params, timeout=timeout)
+        # Para POST, parámetros van en body
+        return _HTTP.post(url, headers=headers, data=req_params, timeout=timeout)
 
+    # reintentos/Retry-After/circuit breaker comunes (utils.resilience)
     try:
-        cursor.execute(
-            """
-            SELECT exchange, symbol, side, open_time, close_time, size 
-            FROM closed_positions 
-            WHERE exchange = 'mexc' AND side IN ('spotbuy', 'spotsell', 'swapstable')
-        """
+        response = with_clock_retry(
+            "mexc_spot",
+            lambda: call_with_retry("mexc_spot", _send, retries=max_retries, path=endpoint, base=1.0),
         )
-        existing_trades = cursor.fetchall()
-
-        hashes = set()
-        for trade in existing_trades:
-            exchange, symbol, side, open_time, close_time, size = trade
-            # Hash más específico incluyendo open_time y close_time
-            trade_hash = (
-                f"{exchange}_{symbol}_{side}_{open_time}_{close_time}_{round(size, 8)}"
-            )
-            hashes.add(trade_hash)
+    except requests.exceptions.Timeout:
+        print(f"⏰ Timeout tras {max_retries} intentos para {endpoint}")
+        raise
+    except requests.exceptions.ConnectionError as e:
+        print(f"🔌 Connection error tras {max_retries} intentos: {e}")
+        raise
+
+    response.raise_for_status()
+    data = response.json()
 
-        return hashes
-    finally:
-        conn.close()
+    # Verificar respuesta de error MEXC
+    if isinstance(data, dict) and "code" in data and data["code"] != 200:
+        error_msg = data.get("msg", "Unknown error")
+        raise RuntimeError(f"MEXC API error {data['code']}: {error_msg}")
 
+    return data
 
+
+# === Funciones de base de datos ===
 def _insert_row(conn: sqlite3.Connection, row: dict):
     """Inserta una fila en closed_positions si no existe"""
     cols = [
@@ -182,13 +159,13 @@ def _insert_row(conn: sqlite3.Connection, row: dict):
         "ignore_trade",
     ]
 
-    # Verificar si ya existe
-    check_sql = """
-        SELECT COUNT(*) FROM closed_positions 
-        WHERE exchange = ? AND symbol = ? AND side = ? 
-        AND open_time = ? AND close_time = ? AND size = ?
-    """
-    check_vals = (
+    # INSERT OR IGNORE: el índice UNIQUE de dedupe_key descarta duplicados
+    sql = (
+        f"INSERT OR IGNORE INTO closed_positions ({', '.join(cols)}, dedupe_key) "
+        f"VALUES ({', '.join('?' * (len(cols) + 1))})"
+    )
+    vals = tuple(row.get(c, 0 if c != "ignore_trade" else 0) for c in cols)
+    key = closed_position_key(
         row.get("exchange"),
         row.get("symbol"),
         row.get("side"),
@@ -197,21 +174,12 @@ def _insert_row(conn: sqlite3.Connection, row: dict):
         row.get("size"),
     )
 
-    cursor = conn.cursor()
-    cursor.execute(check_sql, check_vals)
-    exists = cursor.fetchone()[0] > 0
-
-    if exists:
+    cursor = conn.execute(sql, vals + (key,))
+    if cursor.rowcount == 0:
         print(
             f"   🔄 Posición ya existe (ignorada): {row.get('symbol')} {row.get('side')} {row.get('size')}"
         )
-        return  # Ya existe, no insertar
-
-    # Insertar si no existe
-    sql = f"INSERT INTO closed_positions ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))})"
-    vals = tuple(row.get(c, 0 if c != "ignore_trade" else 0) for c in cols)
-
-    conn.execute(sql, vals)
+        return
     print(
         f"   💾 Nueva posición guardada: {row.get('symbol')} {row.get('side')} {row.get('size')}"
     )
@@ -436,8 +404,7 @@ def fetch_spot_trades_for_symbol(
             fee = _num(trade.get("commission", 0))
             fee_ccy = (trade.get("commissionAsset") or "").upper()
 
-            # CORREGIDO: Usar el mismo formato que en get_existing_trade_hashes
-            # Para spot, open_time y close_time son iguales (trade individual)
+            # Dedupe de fills dentro de la misma descarga
             trade_hash = f"mexc_{pair}_{side}_{ts}_{ts}_{round(amt, 8)}"
 
             if trade_hash not in existing_hashes:
@@ -487,22 +454,27 @@ def save_mexc_spot_positions(
 
     print(f"🎯 Procesando {len(symbols)} símbolos")
 
-    existing_hashes = get_existing_trade_hashes(db_path)
-    conn = sqlite3.connect(db_path)
+    conn = db_connect(db_path)
+    ensure_closed_dedupe(conn)  # <- índice UNIQUE por dedupe_key
     saved = 0
     ignored = 0
     symbols_with_trades = 0
     total_trades_found = 0
 
-    for symbol in symbols:
+    # myTrades exige símbolo: se descargan todos en paralelo y el FIFO va en serie
+    fetched = for_each_symbol(
+        "mexc_spot",
+        symbols,
+        lambda sym: fetch_spot_trades_for_symbol(sym, days_back, 1000, debug=debug),
+    )
+
+    for symbol, fills in fetched:
         if debug:
             print(f"\n{'='*60}")
             print(f"🔄 Procesando {symbol}")
             print(f"{'='*60}")
 
-        fills = fetch_spot_trades_for_symbol(
-            symbol, days_back, 1000, existing_hashes, debug
-        )
+        fills = fills or []
         total_trades_found += len(fills)
 
         if not fills:
@@ -8,7 +8,7 @@
 #
 # Requisitos del proyecto:
 # - Shapes EXACTOS para abiertas, funding y balances.
-# - Persistencia de cerradas vía db_manager.save_closed_position(...)
+# - Persistencia de cerradas vía db_manager.save_closed_positions_bulk(...)
 # - **Opción recomendada**: SOLO guardar en DB ciclos totalmente cerrados
 #   (OKX type in {2: close all, 3: liquidation}).
 #   Además, limpiar de la DB cierres parciales previos (types {1,4,5}).
@@ -43,9 +43,15 @@ from dotenv import load_dotenv
 load_dotenv()
 
 import requests
+from utils.http import get_session
+from utils.dbconn import db_connect
+from utils.resilience import call_with_retry
+from utils.singleflight import single_flight
+
+_HTTP = get_session()  # pool keep-alive compartido entre adapters
 
 # Persistencia del proyecto
-from db_manager import save_closed_position  # guarda una fila en closed_positions
+from db_manager import save_closed_positions_bulk, closed_position_exists  # guarda un lote en closed_positions
 
 __all__ = [
     "fetch_okx_open_positions",
@@ -110,6 +116,11 @@ def _sign_okx(ts: str, method: str, request_path: str, body: str) -> str:
     return base64.b64encode(mac).decode()
 
 
+@single_flight(
+    lambda method, path, params=None, body=None, **kw: ("okx", method, path, (params, kw))
+    if method.upper() == "GET"
+    else None
+)
 def _okx_request(
     method: str,
     path: str,
@@ -139,7 +150,8 @@ def _okx_request(
         else json.dumps(body, separators=(",", ":"), ensure_ascii=False)
     )
 
-    for attempt in range(1, retries + 1):
+    def _send():
+        # se firma en cada intento: el timestamp de OKX caduca
         ts = _iso_ts()
         sign = _sign_okx(ts, method, path + q, body_str)
         headers = {
@@ -149,29 +161,23 @@ def _okx_request(
             "OK-ACCESS-PASSPHRASE": OKX_API_PASSPHRASE,
             "Content-Type": "application/json",
         }
-        try:
-            resp = requests.request(
-                method.upper(),
-                url,
-                headers=headers,
-                data=(None if body is None else body_str),
-                timeout=timeout,
-            )
-        except requests.RequestException:
-            if attempt == retries:
-                raise
-            time.sleep(backoff * attempt)
-            continue
+        return _HTTP.request(
+            method.upper(),
+            url,
+            headers=headers,
+            data=(None if body is None else body_str),
+            timeout=timeout,
+        )
 
-        if resp.status_code == 429 or resp.status_code >= 500:
-            if attempt == retries:
-                resp.raise_for_status()
-            time.sleep(backoff * attempt)
-            continue
+    for attempt in range(1, retries + 1):
+        # reintentos en red/429/5xx, Retry-After y circuit breaker (utils.resilience)
+        resp = call_with_retry("okx", _send, retries=retries, path=path, base=backoff)
+        resp.raise_for_status()
 
         data = resp.json()
         if data.get("code") != "0":
-            # errores OKX estilo {"code":"60009","msg":"Login failed"}
+            # errores OKX estilo {"code":"60009","msg":"Login failed"} (HTTP 200):
+            # se reintentan a nivel de aplicación como antes
             if attempt == retries:
                 raise RuntimeError(f"OKX error {data.get('code')}: {data.get('msg')}")
             time.sleep(backoff * attempt)
@@ -598,7 +604,7 @@ def purge_okx_partial_closes(
     if not partial_rows:
         return 0
 
-    conn = sqlite3.connect(db_path)
+    conn = db_connect(db_path)
     cur = conn.cursor()
     removed = 0
     for r in partial_rows:
@@ -666,26 +672,19 @@ def save_okx_closed_positions(
         _log("⚠️ No se obtuvieron posiciones cerradas completas de OKX.")
         return 0
 
-    conn = sqlite3.connect(db_path)
+    conn = db_connect(db_path)
     cur = conn.cursor()
-    saved = 0
+    batch = []
     skipped = 0
 
     for pos in closed:
         try:
-            cur.execute(
-                """
-                SELECT COUNT(*) FROM closed_positions
-                WHERE exchange=? AND symbol=? AND close_time=?
-                """,
-                (pos["exchange"], pos["symbol"], pos["close_time"]),
-            )
-            if cur.fetchone()[0]:
+            if closed_position_exists(cur, pos["exchange"], pos["symbol"], pos["close_time"]):
                 skipped += 1
                 continue
 
-            # save_closed_position aplica reglas: fee_total negativa, pnl_percent, apr, etc.
-            save_closed_position(
+            # save_closed_positions_bulk aplica reglas: fee_total negativa, pnl_percent, apr, etc.
+            batch.append(
                 {
                     "exchange": pos["exchange"],
                     "symbol": pos["symbol"],
@@ -705,18 +704,18 @@ def save_okx_closed_positions(
                     "liquidation_price": pos.get("liquidation_price"),
                 }
             )
-            saved += 1
             if debug:
                 price_pnl = (
                     pos.get("realized_pnl", 0.0)
                     - pos.get("funding_total", 0.0)
                     - pos.get("fee_total", 0.0)
                 )
-                _log(f"   💾 OKX saved {pos['symbol']} | price_pnl≈{price_pnl:.6f}")
+                _log(f"   💾 OKX a guardar {pos['symbol']} | price_pnl≈{price_pnl:.6f}")
         except Exception as e:
             _log(f"⚠️ Error guardando {pos.get('symbol')}: {e}")
 
     conn.close()
+    saved = save_closed_positions_bulk(batch, db_path=db_path)
     _log(f"✅ OKX guardadas: {saved} | omitidas (duplicadas): {skipped}")
     return saved
 
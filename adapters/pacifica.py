@@ -41,6 +41,13 @@ load_dotenv(os.path.join(os.path.dirname(__file__), ".env"))
 # Agregar path para imports locales
 sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
 
+from utils.procpool import reconstruct_in_pool
+from utils.http import get_session
+from utils.dbconn import db_connect
+from utils.resilience import call_with_retry
+
+_HTTP = get_session()  # pool keep-alive compartido entre adapters
+
 # ========== CONFIGURACIÓN ==========
 
 # 🔐 Credenciales desde .env
@@ -145,8 +152,11 @@ def _request(
             if params:
                 print(f"   Params: {params}")
 
-        response = requests.request(
-            method, url, params=params, headers=UA_HEADERS, timeout=30
+        response = call_with_retry(
+            "pacifica",
+            lambda: _HTTP.request(method, url, params=params, headers=UA_HEADERS, timeout=30),
+            retries=3 if method.upper() == "GET" else 1,
+            path=endpoint,
         )
         response.raise_for_status()
         data = response.json()
@@ -535,11 +545,15 @@ def fetch_pacifica_trades_history(
             if debug:
                 print(f"📄 Página {page} | cursor={cursor}")
 
-            response = requests.get(
-                f"{PACIFICA_BASE_URL}/trades/history",
-                params=params,
-                headers=UA_HEADERS,
-                timeout=30,
+            response = call_with_retry(
+                "pacifica",
+                lambda: _HTTP.get(
+                    f"{PACIFICA_BASE_URL}/trades/history",
+                    params=params,
+                    headers=UA_HEADERS,
+                    timeout=30,
+                ),
+                path="/trades/history",
             )
             response.raise_for_status()
             data = response.json()
@@ -562,8 +576,6 @@ def fetch_pacifica_trades_history(
             if not has_more or not cursor:
                 break
 
-            time.sleep(0.1)  # Rate limiting
-
         if debug:
             print(f"✅ Total trades fetched: {len(all_trades)}")
 
@@ -882,11 +894,15 @@ def fetch_pacifica_funding_fees(
             if debug:
                 print(f"💸 Funding Página {page} | cursor={cursor}")
 
-            response = requests.get(
-                f"{PACIFICA_BASE_URL}/funding/history",
-                params=params,
-                headers=UA_HEADERS,
-                timeout=30,
+            response = call_with_retry(
+                "pacifica",
+                lambda: _HTTP.get(
+                    f"{PACIFICA_BASE_URL}/funding/history",
+                    params=params,
+                    headers=UA_HEADERS,
+                    timeout=30,
+                ),
+                path="/funding/history",
             )
             response.raise_for_status()
             data = response.json()
@@ -941,8 +957,6 @@ def fetch_pacifica_funding_fees(
             if not has_more or not cursor:
                 break
 
-            time.sleep(0.1)  # Rate limiting
-
         if debug:
             print(f"✅ Total funding events: {len(all_funding)}")
             if all_funding:
@@ -1065,7 +1079,12 @@ def save_pacifica_closed_positions(
             print(f"   📄 {len(trades)} trades fetched")
 
         # 2️⃣ Reconstruir posiciones con FIFO
-        closed_positions = reconstruct_closed_positions_from_trades(trades, debug=debug)
+        closed_positions = reconstruct_in_pool(
+            reconstruct_closed_positions_from_trades,
+            trades,
+            lambda t: t.get("symbol", ""),
+            debug=debug,
+        )
 
         if not closed_positions:
             if debug:
@@ -1091,13 +1110,13 @@ def save_pacifica_closed_positions(
         # 5️⃣ Guardar en DB con deduplicación
         # Importar db_manager (adaptado al path de tu proyecto)
         sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
-        from db_manager import save_closed_position
+        from db_manager import save_closed_positions_bulk
 
         import sqlite3
 
-        conn = sqlite3.connect(db_path)
+        conn = db_connect(db_path)
 
-        saved = 0
+        batch = []
         skipped = 0
 
         for pos in closed_positions:
@@ -1119,18 +1138,15 @@ def save_pacifica_closed_positions(
                     )
                 continue
 
-            # Guardar
-            try:
-                save_closed_position(pos)
-                saved += 1
-                if debug:
-                    print(
-                        f"   ✅ {pos['symbol']} | PnL: {pos['realized_pnl']:.2f} | APR: {pos['apr']:.1f}%"
-                    )
-            except Exception as e:
-                print(f"   ❌ Error: {pos['symbol']}: {e}")
+            # Guardar (en lote al final)
+            batch.append(pos)
+            if debug:
+                print(
+                    f"   ✅ {pos['symbol']} | PnL: {pos['realized_pnl']:.2f} | APR: {pos['apr']:.1f}%"
+                )
 
         conn.close()
+        saved = save_closed_positions_bulk(batch, db_path=db_path)
 
         print(f"   ✅ Pacifica: {saved} guardadas, {skipped} duplicadas")
 
@@ -1170,7 +1186,7 @@ def save_pacifica_funding_events(days: int = 30, debug: bool = False):
         # Conectar a DB
         import sqlite3
 
-        conn = sqlite3.connect("portfolio.db")
+        conn = db_connect("portfolio.db")
         cursor = conn.cursor()
 
         # Crear tabla si no existe
@@ -4,7 +4,7 @@
 # - __all__ con 4 funciones públicas (opens, funding, balances, closed->DB)
 # - Normalización de símbolo EXACTA (rule A)
 # - Shapes EXACTOS para abiertas (B), funding (C) y balances (D)
-# - Persistencia de cerradas usando db_manager.save_closed_position(...) (E)
+# - Persistencia de cerradas usando db_manager.save_closed_positions_bulk(...) (E)
 # - Respeta toggles/prints del proyecto (usa helpers si existen)
 # - CLI de debug: --dry-run (default), --save-closed, --funding N, --opens
 
@@ -21,9 +21,16 @@ try:
     from dotenv import load_dotenv; load_dotenv()
 except Exception:
     pass
+from utils.procpool import reconstruct_in_pool
+from utils.http import get_session
+from utils.singleflight import single_flight
+from utils.ratelimit import acquire
+from utils.resilience import call_with_retry
+
+_HTTP = get_session()  # pool keep-alive compartido entre adapters
 # Importar db_manager
 try:
-    from db_manager import save_closed_position, init_db
+    from db_manager import save_closed_positions_bulk, init_db
 except ImportError as e:
     print(f"❌ Error importando db_manager: {e}")
     raise
@@ -110,9 +117,9 @@ else:
 # DB helper (obligatorio)
 # =======================
 try:
-    from db_manager import save_closed_position
+    from db_manager import save_closed_positions_bulk
 except Exception as e:
-    raise RuntimeError("No se pudo importar db_manager.save_closed_position") from e
+    raise RuntimeError("No se pudo importar db_manager.save_closed_positions_bulk") from e
 
 # =======================
 # Utilidades de red / transformación
@@ -123,26 +130,23 @@ def _headers() -> Dict[str, str]:
         raise RuntimeError("Falta PARADEX_JWT (JWT válido de Paradex).")
     return {"Accept": "application/json", "Authorization": f"Bearer {tok}"}
 
+@single_flight(lambda path, params=None, timeout=20, retries=3: ("paradex", "GET", path, (params, timeout, retries)))
 def _get(path: str, params: Optional[Dict[str, Any]] = None, timeout: int = 20, retries: int = 3) -> Any:
     url = f"{BASE_URL}{path}"
-    last = None
-    for i in range(retries):
-        try:
-            r = requests.get(url, params=params, headers=_headers(), timeout=timeout)
-            if r.status_code >= 400:
-                last = RuntimeError(f"HTTP {r.status_code} {r.text}")
-            else:
-                try:
-                    return r.json()
-                except Exception:
-                    return r.text
-        except Exception as e:
-            last = e
-        # backoff simple
-        time.sleep(0.25 * (i + 1) + random.random() * 0.1)
-    if last:
-        raise last
-    return None
+    # _headers() dentro del send: el JWT puede refrescarse entre intentos
+    r = call_with_retry(
+        "paradex",
+        lambda: _HTTP.get(url, params=params, headers=_headers(), timeout=timeout),
+        retries=retries,
+        path=path,
+        base=0.25,
+    )
+    if r.status_code >= 400:
+        raise RuntimeError(f"HTTP {r.status_code} {r.text}")
+    try:
+        return r.json()
+    except Exception:
+        return r.text
 
 def _num(x: Any, default: float = 0.0) -> float:
     try:
@@ -460,7 +464,8 @@ def _get_all_fills(days_back: int = 60) -> List[Dict]:
             
             print(f"🔍 [DEBUG] Solicitando página {page_count + 1}...")
             
-            response = requests.get(
+            acquire("paradex", path="/fills")
+            response = _HTTP.get(
                 url, 
                 params=current_params, 
                 headers=_headers(), 
@@ -481,7 +486,6 @@ def _get_all_fills(days_back: int = 60) -> List[Dict]:
                     if next_cursor:
                         cursor = next_cursor
                         page_count += 1
-                        time.sleep(0.2)  # Rate limiting
                     else:
                         print(f"🎯 [DEBUG] No más páginas. Total: {total_fills} fills")
                         break
@@ -658,6 +662,11 @@ def _fifo_realized_pnl(block_trades):
     # Si queda algún residuo muy pequeño, lo ignoramos (tolerancia numérica).
     return realized
 
+def _block_order(block: List[Dict]) -> tuple:
+    """Orden de los bloques de _identify_positions: cierre (último fill) y mercado."""
+    return (int(block[-1].get("created_at") or 0), block[-1].get("market") or "")
+
+
 def _identify_positions(fills: List[Dict]) -> List[List[Dict]]:
     """
     Identifica posiciones individuales usando un enfoque FIFO por mercado
@@ -839,14 +848,16 @@ def reconstruct_paradex_positions(days_back: int = 60, debug: bool = True) -> No
         
         # Identificar posiciones individuales usando FIFO
         print("🔍 [DEBUG] Identificando posiciones individuales...")
-        positions = _identify_positions(all_fills)
+        positions = reconstruct_in_pool(
+            _identify_positions, all_fills, lambda f: f.get("market"), sort_key=_block_order
+        )
         
         if not positions:
             print("ℹ️  [DEBUG] No se identificaron posiciones completas")
             return
         
         # Procesar cada posición
-        saved_positions = 0
+        batch = []
         print(f"🔄 [DEBUG] Procesando {len(positions)} posiciones identificadas...")
         
         for i, position_fills in enumerate(positions, 1):
@@ -881,9 +892,8 @@ def reconstruct_paradex_positions(days_back: int = 60, debug: bool = True) -> No
                     position_data["initial_margin"] = position_data["notional"] / 3.0
                     position_data["_lock_size"] = True  # Evitar recálculo en db_manager
                     
-                    save_closed_position(position_data)
-                    saved_positions += 1
-                    print(f"💾 [DEBUG] Posición {i} guardada en DB")
+                    batch.append(position_data)
+                    print(f"💾 [DEBUG] Posición {i} preparada para DB")
                     
                 except Exception as e:
                     print(f"❌ [DEBUG] Error guardando posición {i}: {e}")
@@ -895,6 +905,7 @@ def reconstruct_paradex_positions(days_back: int = 60, debug: bool = True) -> No
             
             print("-" * 60)
         
+        saved_positions = save_closed_positions_bulk(batch)
         print(f"\n🎉 [DEBUG] RECONSTRUCCIÓN COMPLETADA!")
         print(f"📊 Resumen:")
         print(f"   • Fills procesados: {len(all_fills)}")
@@ -907,36 +918,6 @@ def reconstruct_paradex_positions(days_back: int = 60, debug: bool = True) -> No
         import traceback
         traceback.print_exc()
 
-# =======================
-# Función adicional para verificar datos existentes
-# =======================
-def _position_exists_in_db(position_data: Dict) -> bool:
-    """Verifica si una posición ya existe en la base de datos"""
-    try:
-        conn = sqlite3.connect("portfolio.db")
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT COUNT(*) FROM closed_positions 
-            WHERE exchange = ? AND symbol = ? AND side = ? 
-            AND open_time = ? AND close_time = ?
-            AND ABS(size - ?) < 0.001
-        """, (
-            position_data['exchange'],
-            position_data['symbol'], 
-            position_data['side'],
-            position_data['open_time'],
-            position_data['close_time'],
-            position_data['size']
-        ))
-        
-        count = cursor.fetchone()[0]
-        conn.close()
-        return count > 0
-        
-    except Exception as e:
-        print(f"❌ Error verificando posición en DB: {e}")
-        return False
 
 def save_paradex_closed_positions(days_back: int = 60) -> int:
     """
@@ -966,13 +947,15 @@ def save_paradex_closed_positions(days_back: int = 60) -> int:
             return 0
         
         # Identificar posiciones individuales usando FIFO
-        positions = _identify_positions(all_fills)
+        positions = reconstruct_in_pool(
+            _identify_positions, all_fills, lambda f: f.get("market"), sort_key=_block_order
+        )
         
         if not positions:
             p_closed_sync_none(EXCHANGE)
             return 0
         
-        saved_count = 0
+        batch = []
         skipped_count = 0
         
         if PRINT_CLOSED_DEBUG:
@@ -988,12 +971,6 @@ def save_paradex_closed_positions(days_back: int = 60) -> int:
             
             # Solo guardar posiciones con tamaño significativo (> 0.001)
             if position_data and position_data.get("size", 0) > 0.001:
-                # VERIFICAR DUPLICADO antes de procesar (igual que en Extended)
-                if _position_exists_in_db(position_data):
-                    print(f"⚠️ [DEBUG] Posición ya existe en DB, omitiendo: {position_data['symbol']}")
-                    skipped_count += 1
-                    continue
-                    
                 if PRINT_CLOSED_DEBUG:
                     symbol = position_data["symbol"]
                     side = position_data["side"]
@@ -1023,9 +1000,7 @@ def save_paradex_closed_positions(days_back: int = 60) -> int:
                     position_data["initial_margin"] = position_data["notional"] / 3.0
                     position_data["_lock_size"] = True  # Evitar recálculo en db_manager
                     
-                    # Guardar en base de datos
-                    save_closed_position(position_data)
-                    saved_count += 1
+                    batch.append(position_data)
                     
                 except Exception as e:
                     print(f"❌ Error guardando posición {market}: {e}")
@@ -1033,6 +1008,11 @@ def save_paradex_closed_positions(days_back: int = 60) -> int:
             else:
                 skipped_count += 1
         
+        # Guardar en base de datos (una sola transacción; duplicados → dedupe_key;
+        # un fallo del lote lanza excepción, no se cuenta como omitidas)
+        saved_count = save_closed_positions_bulk(batch)
+        skipped_count += len(batch) - saved_count
+        
         # Mostrar resumen
         p_closed_sync_saved(EXCHANGE, saved_count, skipped_count)
         
@@ -9,3 +9,16 @@ REGISTRY: Dict[str, object] = {
 
 def get_adapters():
     return REGISTRY.items()
+
+
+# ===== Adapters async (AsyncExchangeAdapter) =====
+ASYNC_REGISTRY: Dict[str, object] = {}
+
+def register_async_adapter(adapter):
+    ASYNC_REGISTRY[adapter.slug] = adapter
+    return adapter
+
+def get_async_adapters(slugs=None):
+    if slugs is None:
+        return list(ASYNC_REGISTRY.values())
+    return [ASYNC_REGISTRY[s] for s in slugs if s in ASYNC_REGISTRY]
@@ -6,7 +6,14 @@
 
 import os, time, hmac, hashlib, base64, json, re
 from typing import Any, Dict, List, Optional, Tuple
+import threading
 import requests
+from utils.http import get_session
+from utils.resilience import call_with_retry
+from utils.dbconn import db_connect
+from utils.persymbol import for_each_symbol
+
+_HTTP = get_session()  # pool keep-alive compartido entre adapters
 
 WHITEBIT_API_KEY   = os.getenv("WHITEBIT_API_KEY", "").strip()
 WHITEBIT_API_SECRET= os.getenv("WHITEBIT_API_SECRET", "").strip()
@@ -36,12 +43,24 @@ def normalize_symbol(sym: str) -> str:
 def _now_ms() -> int:
     return int(time.time() * 1000)
 
+_NONCE_LOCK = threading.Lock()
+_LAST_NONCE = 0
+
+def _next_nonce() -> int:
+    """Nonce único y creciente aunque haya varias requests firmándose en el mismo ms."""
+    global _LAST_NONCE
+    with _NONCE_LOCK:
+        _LAST_NONCE = max(_now_ms(), _LAST_NONCE + 1)
+        return _LAST_NONCE
+
 def _auth_headers(path: str, payload: Dict[str, Any]) -> Tuple[Dict[str, str], Dict[str, Any]]:
     if not WHITEBIT_API_KEY or not WHITEBIT_API_SECRET:
         raise RuntimeError("Faltan WHITEBIT_API_KEY / WHITEBIT_API_SECRET en el entorno.")
     body = dict(payload)
     body["request"] = path
-    body.setdefault("nonce", _now_ms())
+    body.setdefault("nonce", _next_nonce())
+    # requests en paralelo pueden llegar desordenadas: ventana de nonce (±5s) en vez de orden estricto
+    body.setdefault("nonceWindow", True)
     body_json = json.dumps(body, separators=(",", ":"), ensure_ascii=False)
     payload_b64 = base64.b64encode(body_json.encode("utf-8"))
     signature = hmac.new(WHITEBIT_API_SECRET.encode("utf-8"), payload_b64, hashlib.sha512).hexdigest()
@@ -54,8 +73,12 @@ def _auth_headers(path: str, payload: Dict[str, Any]) -> Tuple[Dict[str, str], D
     return headers, body
 
 def _post(path: str, payload: Dict[str, Any]) -> Any:
-    headers, body = _auth_headers(path, payload)
-    r = requests.post(f"{WHITEBIT_BASE_URL}{path}", data=json.dumps(body), headers=headers, timeout=TIMEOUT)
+    # los endpoints privados son POST de solo lectura: se reintentan con nonce nuevo cada vez
+    def _send():
+        headers, body = _auth_headers(path, payload)
+        return _HTTP.post(f"{WHITEBIT_BASE_URL}{path}", data=json.dumps(body), headers=headers, timeout=TIMEOUT)
+
+    r = call_with_retry("whitebit", _send, path=path)
     r.raise_for_status()
     return r.json()
 
@@ -161,8 +184,9 @@ def fetch_whitebit_funding_fees(limit: int = 50, market: Optional[str] = None,
     # Si no se descubrió ninguno, devolvemos vacío para no provocar 422
     if not mkts:
         return []
-    out: List[Dict[str, Any]] = []
-    for m in list(dict.fromkeys(mkts)):
+
+    def _pull_market(m: str) -> List[Dict[str, Any]]:
+        out: List[Dict[str, Any]] = []
         payload = {"market": m, "limit": max(1, min(100, int(limit)))}
         if start_ts: payload["startDate"] = int(start_ts)
         if end_ts:   payload["endDate"] = int(end_ts)
@@ -185,13 +209,16 @@ def fetch_whitebit_funding_fees(limit: int = 50, market: Optional[str] = None,
             if code == 422:
                 # Mercados no válidos o no soportados -> saltar sin ruido
                 print(f"⏭️ WhiteBIT funding: mercado no válido o sin soporte, se omite: {m}")
-                continue
             else:
                 print(f"❌ WhiteBIT funding HTTP error {m}: {e}")
-                continue
         except Exception as e:
             print(f"❌ WhiteBIT funding error {m}: {e}")
-            continue
+        return out
+
+    # un POST por mercado: en paralelo, concatenados en el orden de mkts
+    out: List[Dict[str, Any]] = []
+    for _m, items in for_each_symbol("whitebit", mkts, _pull_market):
+        out.extend(items)
     return out
 
 # ========= BALANCES =========
@@ -302,9 +329,9 @@ def _side_from_legs(legs: List[Dict[str, Any]]) -> str:
 
 def save_whitebit_closed_positions(db_path: str = "portfolio.db", days: int = 50, debug: bool = False) -> Tuple[int, int]:
     try:
-        from db_manager import save_closed_position
+        from db_manager import save_closed_positions_bulk, closed_position_exists
     except Exception as e:
-        print(f"❌ db_manager.save_closed_position no disponible: {e}")
+        print(f"❌ db_manager.save_closed_positions_bulk no disponible: {e}")
         return (0, 0)
 
     # descarga positions/history con ventana
@@ -353,10 +380,11 @@ def save_whitebit_closed_positions(db_path: str = "portfolio.db", days: int = 50
     if not _os.path.exists(db_path):
         print(f"❌ DB no encontrada: {db_path}")
         return (0, 0)
-    conn = sqlite3.connect(db_path)
+    conn = db_connect(db_path)
     cur = conn.cursor()
 
-    saved = skipped = 0
+    batch: List[Dict[str, Any]] = []
+    skipped = 0
     for pid, legs in grouped.items():
         try:
             mkt  = (legs[-1].get("market") or "").upper()
@@ -368,9 +396,7 @@ def save_whitebit_closed_positions(db_path: str = "portfolio.db", days: int = 50
             close_s = int(_f(legs[-1].get("modifyDate")))
 
             # evita duplicados
-            cur.execute("SELECT COUNT(*) FROM closed_positions WHERE exchange=? AND symbol=? AND close_time=?",
-                        ("whitebit", sym, close_s))
-            if cur.fetchone()[0] > 0:
+            if closed_position_exists(cur, "whitebit", sym, close_s):
                 skipped += 1
                 continue
 
@@ -408,7 +434,7 @@ def save_whitebit_closed_positions(db_path: str = "portfolio.db", days: int = 50
                 print(f" pnl(precio)={price_pnl} | realized(DB)={realized_db}")
                 print(f" open/close ts: {open_s} / {close_s}")
 
-            save_closed_position({
+            batch.append({
                 "exchange": "whitebit",
                 "symbol": sym,
                 "side": side,
@@ -426,12 +452,12 @@ def save_whitebit_closed_positions(db_path: str = "portfolio.db", days: int = 50
                 "initial_margin": None,
                 "liquidation_price": None,
             })
-            saved += 1
         except Exception as e:
             print(f"❌ build/save error pid={pid}: {e}")
             continue
 
     conn.close()
+    saved = save_closed_positions_bulk(batch, db_path=db_path)
     print(f"✅ WhiteBIT guardadas={saved} | omitidas={skipped}")
     return (saved, skipped)
 
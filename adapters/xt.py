@@ -52,14 +52,29 @@ except Exception:
         s = re.split(r'[_/-]', s)[0]
         return s
 
+# ============ Pool de procesos para la reconstrucción FIFO ============
+try:
+    from utils.procpool import reconstruct_in_pool
+except Exception:
+    def reconstruct_in_pool(fn, items, key, *args, **kwargs):
+        return fn(list(items or []), *args, **kwargs)
+
+# ============ Rate limit compartido ============
+try:
+    from utils.ratelimit import acquire
+except Exception:
+    def acquire(exchange, weight=None, path=None):
+        return 0.0
+
 # ============ DB manager ============
 try:
-    from db_manager import save_closed_position
+    from db_manager import save_closed_positions_bulk
 except Exception:
     # Fallback que imprime lo que guardaríamos si el módulo no está.
-    def save_closed_position(position: dict):
-        print("⚠️ db_manager.save_closed_position no disponible; payload:")
-        print(json.dumps(position, indent=2, ensure_ascii=False))
+    def save_closed_positions_bulk(positions, db_path=None, verbose=False):
+        print("⚠️ db_manager.save_closed_positions_bulk no disponible; payload:")
+        print(json.dumps(positions, indent=2, ensure_ascii=False))
+        return 0
 
 # ============ Config/ENV ============
 from dotenv import load_dotenv
@@ -184,14 +199,17 @@ def _get_perp() -> Perp:
     if _perp_cli is None:
         _perp_cli = Perp(host=XT_FAPI_HOST, access_key=XT_API_KEY, secret_key=XT_API_SECRET)
 
-        # 🔇 Silenciar prints verbosos de pyxt._fetch (method/url/headers/params…)
+        # ⏱️ Rate limit compartido + 🔇 silenciar prints verbosos de pyxt._fetch (method/url/headers/params…)
         try:
             import io, contextlib, os
             # permite reactivar el log con variable de entorno
             quiet = os.getenv("XT_HTTP_DEBUG", "0") != "1"
-            if quiet and hasattr(_perp_cli, "_fetch"):
+            if hasattr(_perp_cli, "_fetch"):
                 _orig_fetch = _perp_cli._fetch  # método bound del cliente
                 def _quiet_fetch(*args, **kwargs):
+                    acquire(EXCHANGE)
+                    if not quiet:
+                        return _orig_fetch(*args, **kwargs)
                     # oculta cualquier print en stdout dentro de _fetch
                     with contextlib.redirect_stdout(io.StringIO()):
                         return _orig_fetch(*args, **kwargs)
@@ -584,7 +602,6 @@ def fetch_xt_transactions(limit: int = 2000,
         if len(items) < page_size:
             break
         current_page += 1
-        time.sleep(0.05)
 
     return out
 
@@ -847,49 +864,14 @@ def reconstruct_xt_closed_from_transactions(days: int = DEFAULT_DAYS_TRADES,
         fund_items = fetch_xt_funding_fees(limit=2000, start_ms=start_ms, end_ms=end_ms, symbol=None)
         funding_map = _group_funding_by_symbol(fund_items)
 
-    # 4) Reconstrucción FIFO
-    blocks = _fifo_blocks_from_fills(fills, funding_map=funding_map)
+    # 4) Reconstrucción FIFO (por símbolo; en procesos si hay muchos fills)
+    blocks = reconstruct_in_pool(
+        _fifo_blocks_from_fills, fills,
+        lambda f: normalize_symbol(f.get("symbol") or ""),
+        funding_map=funding_map,
+    )
     return blocks
 
-# --- dedupe: evitar duplicados en closed_positions ---
-def _exists_closed_in_db(row: dict, db_path: str = "portfolio.db") -> bool:
-    """
-    Considera duplicado si ya existe una fila con:
-      exchange, symbol, close_time y (size, entry_price, close_price) ~=
-    con tolerancia numérica pequeña para floats.
-    """
-    try:
-        import sqlite3
-        eps = 1e-6
-        conn = sqlite3.connect(db_path)
-        cur = conn.cursor()
-        cur.execute(
-            """
-            SELECT 1
-              FROM closed_positions
-             WHERE exchange = ?
-               AND symbol   = ?
-               AND close_time = ?
-               AND ABS(size - ?) < ?
-               AND ABS(entry_price - ?) < ?
-               AND ABS(close_price - ?) < ?
-             LIMIT 1
-            """,
-            (
-                row.get("exchange"),
-                row.get("symbol"),
-                int(row.get("close_time") or 0),
-                float(row.get("size") or 0.0), eps,
-                float(row.get("entry_price") or 0.0), eps,
-                float(row.get("close_price") or 0.0), eps,
-            ),
-        )
-        found = cur.fetchone() is not None
-        conn.close()
-        return found
-    except Exception:
-        # En caso de error en la consulta, no bloquear guardado.
-        return False
 
 def save_xt_closed_positions(db_path: str = "portfolio.db",
                              days: int = DEFAULT_DAYS_TRADES,
@@ -898,7 +880,7 @@ def save_xt_closed_positions(db_path: str = "portfolio.db",
                              inject_funding: bool = True) -> int:
     _ensure_xt_keys()
     """
-    Reconstruye y guarda en SQLite usando db_manager.save_closed_position.
+    Reconstruye y guarda en SQLite usando db_manager.save_closed_positions_bulk.
     Devuelve el número de bloques guardados.
     """
     p_closed_sync_start(EXCHANGE)
@@ -907,24 +889,11 @@ def save_xt_closed_positions(db_path: str = "portfolio.db",
         p_closed_sync_none(EXCHANGE)
         return 0
 
-    saved = 0
-    dup = 0
-    for b in blocks:
-        # dedupe proactivo: evitamos insertar si ya existe una fila equivalente
-        if _exists_closed_in_db(b, db_path):
-            dup += 1
-            continue
-        try:
-            save_closed_position(b)
-            saved += 1
-        except Exception as e:
-            # fallback por si el DB manager llega a tener un índice único
-            if "UNIQUE" in str(e).upper() or "duplicate" in str(e).lower():
-                dup += 1
-            else:
-                # puedes loguear si quieres, pero no contamos como guardada
-                pass
-            # ✅ imprimir y devolver métricas estándar
+    # una sola transacción; los duplicados los descarta el índice UNIQUE (dedupe_key).
+    # Si el lote falla se lanza excepción, así la diferencia son solo duplicados.
+    saved = save_closed_positions_bulk(blocks, db_path=db_path)
+    dup = len(blocks) - saved
+    # ✅ imprimir y devolver métricas estándar
     p_closed_sync_saved(EXCHANGE, saved, dup)
     p_closed_sync_done(EXCHANGE)
     return saved
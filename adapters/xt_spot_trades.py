@@ -38,6 +38,9 @@ UTILS_DIR = os.path.join(BASE_DIR, "utils")
 if UTILS_DIR not in sys.path:
     sys.path.append(UTILS_DIR)
 
+from utils.dbconn import db_connect
+from db_manager import save_closed_positions_bulk
+
 # === XT helpers (reutilizar del adapter principal) ===
 try:
     from adapters.xt import (
@@ -183,55 +186,6 @@ class RoundAgg:
         }
 
 
-def get_existing_trade_hashes(db_path: str) -> set:
-    """Obtiene hashes de trades ya existentes en DB - MEJORADO"""
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-
-    try:
-        cursor.execute(
-            """
-SELECT exchange, symbol, side, open_time, close_time, size, entry_price, close_price
-FROM closed_positions 
-WHERE exchange = 'xt'
-"""
-        )
-        existing_trades = cursor.fetchall()
-
-        hashes = set()
-        for trade in existing_trades:
-            (
-                exchange,
-                symbol,
-                side,
-                open_time,
-                close_time,
-                size,
-                entry_price,
-                close_price,
-            ) = trade
-            # Hash más específico que incluye todos los campos clave
-            trade_hash = (
-                f"{exchange}_{symbol}_{side}_{open_time}_{close_time}_"
-                f"{round(size, 8)}_{round(entry_price, 8)}_{round(close_price, 8)}"
-            )
-            hashes.add(trade_hash)
-
-        return hashes
-    finally:
-        conn.close()
-
-
-def _position_hash(row: Dict[str, Any]) -> str:
-    """Genera hash único para una posición basado en campos clave"""
-    return (
-        f"{row.get('exchange', 'xt')}_{row.get('symbol', '')}_{row.get('side', '')}_"
-        f"{row.get('open_time', 0)}_{row.get('close_time', 0)}_"
-        f"{round(row.get('size', 0), 8)}_{round(row.get('entry_price', 0), 8)}_"
-        f"{round(row.get('close_price', 0), 8)}"
-    )
-
-
 def fetch_xt_spot_trades(
     days_back: int = 30,
     limit: int = 100,
@@ -357,99 +311,45 @@ def _process_trade_data(trade_data: List[Dict], existing_hashes: set) -> List[Fi
 def _insert_row(
     conn: sqlite3.Connection,
     row: Dict[str, Any],
-    existing_hashes: set,
     verbose: bool = False,
+    batch: Optional[List[Dict[str, Any]]] = None,
 ) -> bool:
     """
-    Inserta una fila en closed_positions solo si no existe
-    Returns: True si se insertó, False si ya existía
+    Inserta una fila en closed_positions (duplicados → índice UNIQUE dedupe_key).
+    Si se pasa `batch`, la fila se encola para un único
+    save_closed_positions_bulk al final en lugar de guardarse ya.
+    Returns: True si se encoló, o si se insertó (False si era duplicada)
     """
-    position_hash = _position_hash(row)
-
-    # Verificar si ya existe
-    if position_hash in existing_hashes:
-        if verbose:
-            print(f"🔍 [DEBUG] Posición ya existe, omitiendo: {position_hash}")
-        return False
-
-    try:
-        from db_manager import save_closed_position
-
-        # Adaptar el formato para db_manager
-        position_data = {
-            "exchange": row.get("exchange", "xt"),
-            "symbol": row.get("symbol", ""),
-            "side": row.get("side", "spotbuy"),
-            "size": row.get("size", 0),
-            "entry_price": row.get("entry_price", 0),
-            "close_price": row.get("close_price", 0),
-            "open_time": row.get("open_time", 0),
-            "close_time": row.get("close_time", 0),
-            "pnl": row.get("pnl", 0),
-            "realized_pnl": row.get("realized_pnl", 0),
-            "funding_total": 0.0,  # Spot no tiene funding
-            "fee_total": row.get("fee_total", 0),
-            "notional": row.get("notional", 0),
-            "leverage": 1.0,  # Spot siempre es leverage 1
-            "liquidation_price": 0.0,  # Spot no tiene liquidation
-            "initial_margin": row.get(
-                "notional", 0
-            ),  # Para spot, initial_margin = notional
-            "ignore_trade": row.get("ignore_trade", 0),
-        }
-        if verbose:
-            print(f"💾 [DEBUG] Guardando nueva posición: {position_hash}")
-        save_closed_position(position_data)
-        # Actualizar el set de hashes existentes
-        existing_hashes.add(position_hash)
+    label = f"{row.get('symbol', '')} {row.get('side', '')} {row.get('close_time', 0)}"
+
+    # Adaptar el formato para db_manager
+    position_data = {
+        "exchange": row.get("exchange", "xt"),
+        "symbol": row.get("symbol", ""),
+        "side": row.get("side", "spotbuy"),
+        "size": row.get("size", 0),
+        "entry_price": row.get("entry_price", 0),
+        "close_price": row.get("close_price", 0),
+        "open_time": row.get("open_time", 0),
+        "close_time": row.get("close_time", 0),
+        "pnl": row.get("pnl", 0),
+        "realized_pnl": row.get("realized_pnl", 0),
+        "funding_total": 0.0,  # Spot no tiene funding
+        "fee_total": row.get("fee_total", 0),
+        "notional": row.get("notional", 0),
+        "leverage": 1.0,  # Spot siempre es leverage 1
+        "liquidation_price": 0.0,  # Spot no tiene liquidation
+        "initial_margin": row.get(
+            "notional", 0
+        ),  # Para spot, initial_margin = notional
+        "ignore_trade": row.get("ignore_trade", 0),
+    }
+    if verbose:
+        print(f"💾 [DEBUG] Guardando nueva posición: {label}")
+    if batch is not None:
+        batch.append(position_data)
         return True
-
-    except ImportError:
-        # Fallback si db_manager no está disponible
-        cursor = conn.cursor()
-        try:
-            cursor.execute(
-                """
-INSERT INTO closed_positions (
-    exchange, symbol, side, size, entry_price, close_price,
-    pnl, realized_pnl, fee_total, open_time, close_time,
-    notional, ignore_trade, funding_total, leverage, liquidation_price, initial_margin
-) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-""",
-                (
-                    row.get("exchange"),
-                    row.get("symbol"),
-                    row.get("side"),
-                    row.get("size", 0),
-                    row.get("entry_price", 0),
-                    row.get("close_price", 0),
-                    row.get("pnl", 0),
-                    row.get("realized_pnl", 0),
-                    row.get("fee_total", 0),
-                    row.get("open_time", 0),
-                    row.get("close_time", 0),
-                    row.get("notional", 0),
-                    row.get("ignore_trade", 0),
-                    0.0,  # funding_total
-                    1.0,  # leverage
-                    0.0,  # liquidation_price
-                    row.get("notional", 0),  # initial_margin
-                ),
-            )
-            if verbose:
-                print(
-                    f"💾 [DEBUG] Guardando nueva posición (fallback): {position_hash}"
-                )
-            # Actualizar el set de hashes existentes
-            existing_hashes.add(position_hash)
-            return True
-        except sqlite3.IntegrityError:
-            # Si por alguna razón aún falla, ignorar silenciosamente
-            if verbose:
-                print(
-                    f"⚠️ [DEBUG] IntegrityError al insertar (ya existe): {position_hash}"
-                )
-            return False
+    return save_closed_positions_bulk([position_data], conn=conn) > 0
 
 
 def save_xt_spot_positions(
@@ -465,18 +365,9 @@ def save_xt_spot_positions(
     if not os.path.exists(db_path):
         raise FileNotFoundError(f"❌ DB no existe: {db_path}")
 
-    # 2) Obtener trades existentes - MEJORADO
-    existing_hashes = get_existing_trade_hashes(db_path)
-    if debug:
-        print(f"📊 Posiciones existentes en DB: {len(existing_hashes)}")
-
+    # 2) Sin precarga de existentes: los duplicados los descarta el índice UNIQUE (dedupe_key)
     # 3) Descargar nuevos trades
-    fills = fetch_xt_spot_trades(
-        days_back=days_back,
-        limit=100,
-        existing_hashes=existing_hashes,  # Pasar existing_hashes para evitar duplicados en fills
-        debug=debug,
-    )
+    fills = fetch_xt_spot_trades(days_back=days_back, limit=100, debug=debug)
     total_trades_found = len(fills)
 
     if total_trades_found == 0:
@@ -499,9 +390,10 @@ def save_xt_spot_positions(
         print(f"📊 Procesando {symbols_with_trades} símbolos diferentes")
 
     # 6) Procesar FIFO por símbolo
-    conn = sqlite3.connect(db_path)
+    conn = db_connect(db_path)
     saved = 0
     ignored = 0
+    batch: List[Dict[str, Any]] = []
 
     for symbol, trades in by_symbol.items():
         base, quote = _split_symbol(symbol)
@@ -537,8 +429,8 @@ def save_xt_spot_positions(
                     "ignore_trade": 0,
                 }
                 if _insert_row(
-                    conn, row, existing_hashes, verbose=debug
-                ):  # Pasar existing_hashes
+                    conn, row, verbose=debug, batch=batch
+                ):
                     saved += 1
             continue
 
@@ -566,8 +458,8 @@ def save_xt_spot_positions(
                 "ignore_trade": 1,
             }
             if _insert_row(
-                conn, row, existing_hashes, verbose=debug
-            ):  # Pasar existing_hashes
+                conn, row, verbose=debug, batch=batch
+            ):
                 ignored += 1
             idx += 1
 
@@ -603,8 +495,8 @@ def save_xt_spot_positions(
                 **data,
             }
             if _insert_row(
-                conn, row, existing_hashes, verbose=debug
-            ):  # Pasar existing_hashes
+                conn, row, verbose=debug, batch=batch
+            ):
                 saved += 1
 
             # reset
@@ -701,12 +593,21 @@ def save_xt_spot_positions(
                         "ignore_trade": 1,
                     }
                     if _insert_row(
-                        conn, row, existing_hashes, verbose=debug
-                    ):  # Pasar existing_hashes
+                        conn, row, verbose=debug, batch=batch
+                    ):
                         ignored += 1
 
-    conn.commit()
-    conn.close()
+    # Un solo lote (misma transacción); los contadores salen de lo que se
+    # insertó de verdad, no de lo encolado: los duplicados no cuentan
+    try:
+        saved = save_closed_positions_bulk(
+            [p for p in batch if not p.get("ignore_trade")], conn=conn, verbose=debug
+        )
+        ignored = save_closed_positions_bulk(
+            [p for p in batch if p.get("ignore_trade")], conn=conn, verbose=debug
+        )
+    finally:
+        conn.close()
 
     print(f"\n{'='*60}")
     print("✅ XT Spot FIFO COMPLETADO:")
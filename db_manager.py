@@ -1,10 +1,10 @@
 # db_manager.py  — versión con migración y nuevas columnas
 import sqlite3
+from utils.dbconn import db_connect
 from collections import defaultdict
 import statistics
 import math
 import time as _t
-import pandas as pd
 
 DB_PATH = "portfolio.db"
 
@@ -172,7 +172,7 @@ def _add_col_if_missing(conn, table, col, sql_type):
 
 
 def init_db():
-    conn = sqlite3.connect(DB_PATH)
+    conn = db_connect(DB_PATH)
     cur = conn.cursor()
     cur.execute(
         """
@@ -200,10 +200,186 @@ def init_db():
     _add_col_if_missing(
         conn, "closed_positions", "ignore_trade", "INTEGER DEFAULT 0"
     )  # ← NUEVO
+    ensure_closed_dedupe(conn)
+    ensure_closed_indexes(conn)
     conn.commit()
     conn.close()
 
 
+# Índices secundarios para las consultas calientes de closed_positions
+_CLOSED_INDEXES = (
+    # /api/closed_positions: ORDER BY open_time sin ordenar en memoria
+    "CREATE INDEX IF NOT EXISTS ix_closed_open_time ON closed_positions(open_time)",
+    # checks por fila de los adapters: exchange + symbol + close_time
+    "CREATE INDEX IF NOT EXISTS ix_closed_ex_sym_close "
+    "ON closed_positions(exchange, symbol, close_time)",
+    # kucoin: DISTINCT symbol WHERE exchange=? ORDER BY close_time (cubriente)
+    "CREATE INDEX IF NOT EXISTS ix_closed_ex_close_sym "
+    "ON closed_positions(exchange, close_time, symbol)",
+    # _exchanges_with_recent_closed: índice de expresión sobre COALESCE(close_time, open_time)
+    "CREATE INDEX IF NOT EXISTS ix_closed_recent "
+    "ON closed_positions(COALESCE(close_time, open_time, 0), exchange)",
+)
+
+# SQL de las consultas calientes: lo importan sus llamadores (portfolio,
+# kucoin) y CLOSED_HOT_QUERIES, así el EXPLAIN mira exactamente lo que se ejecuta
+CLOSED_POSITIONS_LIST_SQL = (
+    "SELECT id, exchange, symbol, side, size, entry_price, close_price, pnl, "
+    "realized_pnl, funding_total AS funding_fee, fee_total AS fees, pnl_percent, apr, "
+    "initial_margin, notional, open_time, close_time "
+    "FROM closed_positions ORDER BY open_time ASC"
+)
+RECENT_CLOSED_EXCHANGES_SQL = (
+    "SELECT DISTINCT LOWER(exchange) AS ex FROM closed_positions "
+    "WHERE COALESCE(close_time, open_time, 0) >= ?"
+)
+KUCOIN_CLOSED_SYMBOLS_SQL = (
+    "SELECT DISTINCT symbol FROM closed_positions "
+    "WHERE exchange='kucoin' AND symbol IS NOT NULL AND symbol <> '' "
+    "ORDER BY close_time DESC LIMIT ?"
+)
+# checks de duplicado por fila de los adapters (exchange + symbol + close_time);
+# se usan a través de closed_position_exists salvo el de binance
+CLOSED_EXISTS_SQL = (
+    "SELECT 1 FROM closed_positions "
+    "WHERE exchange = ? AND symbol = ? AND close_time = ? LIMIT 1"
+)
+CLOSED_EXISTS_SIDE_SQL = (
+    "SELECT 1 FROM closed_positions "
+    "WHERE exchange = ? AND symbol = ? AND close_time = ? AND side = ? LIMIT 1"
+)
+CLOSED_EXISTS_EXACT_SQL = (
+    "SELECT 1 FROM closed_positions "
+    "WHERE exchange = ? AND symbol = ? AND open_time = ? AND close_time = ? "
+    "AND ABS(size - ?) < 1e-8 LIMIT 1"
+)
+
+# Consultas calientes para EXPLAIN QUERY PLAN: {nombre: (sql, params de ejemplo)}
+CLOSED_HOT_QUERIES = {
+    "api_closed_positions": (CLOSED_POSITIONS_LIST_SQL, ()),
+    "exchanges_with_recent_closed": (RECENT_CLOSED_EXCHANGES_SQL, (0,)),
+    "kucoin_symbols_from_db": (KUCOIN_CLOSED_SYMBOLS_SQL, (200,)),
+    "exists_by_close_time": (CLOSED_EXISTS_SQL, ("x", "BTCUSDT", 0)),
+    "exists_by_close_time_side": (CLOSED_EXISTS_SIDE_SQL, ("x", "BTCUSDT", 0, "long")),
+    "exists_exact": (CLOSED_EXISTS_EXACT_SQL, ("x", "BTCUSDT", 0, 0, 1.0)),
+}
+
+
+def closed_position_exists(cur, exchange, symbol, close_time, side=None) -> bool:
+    """¿Ya hay una cerrada con ese exchange + symbol + close_time (y side, si se pasa)?"""
+    if side is None:
+        row = cur.execute(CLOSED_EXISTS_SQL, (exchange, symbol, close_time)).fetchone()
+    else:
+        row = cur.execute(CLOSED_EXISTS_SIDE_SQL, (exchange, symbol, close_time, side)).fetchone()
+    return row is not None
+
+
+def ensure_closed_indexes(conn):
+    """Crea (idempotente) los índices secundarios de closed_positions."""
+    for ddl in _CLOSED_INDEXES:
+        conn.execute(ddl)
+
+
+def explain_closed_queries(db_path=None) -> dict:
+    """EXPLAIN QUERY PLAN de CLOSED_HOT_QUERIES -> {nombre: [detalle, ...]}."""
+    conn = db_connect(db_path or DB_PATH)
+    try:
+        return {
+            name: [r[-1] for r in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+            for name, (sql, params) in CLOSED_HOT_QUERIES.items()
+        }
+    finally:
+        conn.close()
+
+
+def check_closed_query_plans(db_path=None) -> list:
+    """
+    Regresión de planes: devuelve [(nombre, detalle)] de las consultas calientes
+    que recorren closed_positions sin índice o que ordenan en memoria.
+    Lista vacía = todas van por índice.
+    """
+    bad = []
+    for name, details in explain_closed_queries(db_path).items():
+        for d in details:
+            full_scan = (
+                d.startswith(("SCAN closed_positions", "SCAN TABLE closed_positions"))
+                and "INDEX" not in d
+            )
+            if full_scan or "TEMP B-TREE FOR ORDER BY" in d:
+                bad.append((name, d))
+    return bad
+
+
+def optimize_db(db_path=None):
+    """
+    Pasada de arranque del planificador: ANALYZE si aún no hay estadísticas
+    (sqlite_stat1) y PRAGMA optimize siempre. Avisa si alguna consulta
+    caliente de closed_positions dejó de ir por índice.
+    """
+    conn = db_connect(db_path or DB_PATH)
+    try:
+        has_stats = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name='sqlite_stat1'"
+        ).fetchone()
+        if not has_stats:
+            conn.execute("ANALYZE")
+        conn.execute("PRAGMA optimize")
+        conn.commit()
+    finally:
+        conn.close()
+
+    for name, detail in check_closed_query_plans(db_path):
+        print(f"⚠️ closed_positions: '{name}' sin índice → {detail}")
+
+
+def closed_position_key(exchange, symbol, side, open_time, close_time, size) -> str:
+    """
+    Llave natural de una posición cerrada (columna dedupe_key, índice UNIQUE).
+    exchange|symbol|side|open_s|close_s|size redondeado a 6 decimales.
+    """
+    try:
+        size = round(abs(float(size or 0.0)), 6)
+    except (TypeError, ValueError):
+        size = 0.0
+    return (
+        f"{exchange}|{symbol}|{side}|{int(open_time or 0)}|{int(close_time or 0)}|{size:.6f}"
+    )
+
+
+def ensure_closed_dedupe(conn):
+    """
+    Asegura columna dedupe_key + índice UNIQUE y rellena las filas antiguas.
+    Si ya había duplicados, solo la primera fila (id menor) recibe la llave;
+    el resto queda con NULL (no se borra nada).
+
+    Las filas sin llave se buscan por un índice parcial (solo contiene las
+    NULL), así que el relleno corre en cada arranque y cuesta lo que haya
+    pendiente, no el tamaño de la tabla: también recoge filas que algún
+    escritor insertó sin dedupe_key después del primer relleno.
+    """
+    _add_col_if_missing(conn, "closed_positions", "dedupe_key", "TEXT")
+    # Índice antiguo de bitget_spot: sin size, colisionaba entre posiciones distintas
+    conn.execute("DROP INDEX IF EXISTS ux_closed_positions_no_dupes")
+    conn.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_closed_dedupe "
+        "ON closed_positions(dedupe_key) WHERE dedupe_key IS NOT NULL"
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS ix_closed_no_dedupe "
+        "ON closed_positions(id) WHERE dedupe_key IS NULL"
+    )
+    pending = conn.execute(
+        "SELECT id, exchange, symbol, side, open_time, close_time, size "
+        "FROM closed_positions WHERE dedupe_key IS NULL ORDER BY id"
+    ).fetchall()
+    if pending:
+        conn.executemany(
+            "UPDATE OR IGNORE closed_positions SET dedupe_key = ? WHERE id = ?",
+            [(closed_position_key(*r[1:]), r[0]) for r in pending],
+        )
+    conn.commit()
+
+
 # ========= Helpers de cálculo =========
 
 # =============CODIGO 1 para posiciones cerradas
@@ -238,13 +414,22 @@ def _apr(realized_pnl, notional, open_s, close_s):
         return 0.0
 
 
-def save_closed_position(position: dict):
-    import sqlite3
-    import traceback
+# INSERT OR IGNORE: los duplicados los descarta el índice UNIQUE de dedupe_key
+_CLOSED_INSERT_SQL = (
+    "INSERT OR IGNORE INTO closed_positions ("
+    "exchange, symbol, side, size, entry_price, close_price, "
+    "open_time, close_time, pnl, realized_pnl, funding_total, fee_total, "
+    "pnl_percent, apr, initial_margin, notional, leverage, liquidation_price, "
+    "ignore_trade, dedupe_key"
+    ") VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)"
+)
 
-    print(
-        f"🔍 [DEBUG save_closed_position] Iniciando guardado para: {position.get('exchange')} {position.get('symbol')}"
-    )
+# Leverage por defecto si la API no da ni leverage ni initial_margin
+DEFAULT_LEVERAGE = {"gate": 5}
+
+
+def _closed_position_row(position: dict) -> tuple:
+    """Resuelve los campos derivados de una posición cerrada -> tupla para _CLOSED_INSERT_SQL."""
 
     def _f(x, d=0.0):
         try:
@@ -308,8 +493,6 @@ def save_closed_position(position: dict):
     )
 
     # 5) Resolver leverage (si hay). Si no, usar default por exchange.
-    #    Puedes mover este mapping a config/toggles.py si prefieres.
-    DEFAULT_LEVERAGE = {"gate": 5}
     lev_raw = position.get("leverage")
     leverage = _f(lev_raw) if lev_raw is not None else 0.0
     if not _positive(leverage):
@@ -344,16 +527,7 @@ def save_closed_position(position: dict):
     days = max((close_s - open_s) / 86400.0, 1e-9) if (open_s and close_s) else 0.0
     apr = pnl_percent * (365.0 / days) if days > 0 else 0.0
 
-    # INSERT con columnas y placeholders 1:1
-    sql = (
-        "INSERT INTO closed_positions ("
-        "exchange, symbol, side, size, entry_price, close_price, "
-        "open_time, close_time, pnl, realized_pnl, funding_total, fee_total, "
-        "pnl_percent, apr, initial_margin, notional, leverage, liquidation_price"
-        ") VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)"
-    )
-
-    vals = (
+    return (
         exchange,
         symbol,
         side,
@@ -372,60 +546,60 @@ def save_closed_position(position: dict):
         notional,
         leverage,
         liq_price,
+        int(bool(position.get("ignore_trade", 0))),
+        closed_position_key(exchange, symbol, side, open_s, close_s, size),
     )
 
-    # DEBUG DETALLADO
-    print(f"📋 [DEBUG] Datos a insertar:")
-    print(f"  exchange: {exchange}")
-    print(f"  symbol: {symbol}")
-    print(f"  side: {side}")
-    print(f"  size: {size}")
-    print(f"  entry_price: {entry}")
-    print(f"  close_price: {close}")
-    print(
-        f"  open_time: {open_s} ({pd.to_datetime(open_s, unit='s') if open_s else 'N/A'})"
-    )
-    print(
-        f"  close_time: {close_s} ({pd.to_datetime(close_s, unit='s') if close_s else 'N/A'})"
-    )
-    print(f"  pnl: {pnl_price}")
-    print(f"  realized_pnl: {realized}")
-    print(f"  funding_total: {funding_total}")
-    print(f"  fee_total: {fee_total}")
-    print(f"  pnl_percent: {pnl_percent}")
-    print(f"  apr: {apr}")
-    print(f"  initial_margin (resuelto): {initial_margin}")
-    print(f"  notional: {notional}")
-    print(f"  leverage: {leverage}")
-    print(f"  liquidation_price: {liq_price}")
-
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
 
+def save_closed_positions_bulk(positions: list, db_path=None, verbose: bool = False, conn=None) -> int:
+    """
+    Guarda un lote de posiciones cerradas en una sola transacción (executemany).
+    Mismas reglas que save_closed_position (size, notional, leverage, margen,
+    pnl_percent, APR). Los duplicados (misma dedupe_key) se ignoran.
+    Devuelve cuántas filas se insertaron: len(lote) - devuelto son duplicados.
+
+    Con conn, el lote va en la transacción que el llamante tenga abierta en esa
+    conexión (p.ej. sus DELETE de filas a reemplazar) y el commit final lo cubre
+    todo; la conexión no se cierra. Si el lote falla se hace rollback (también
+    de lo del llamante) y se relanza la excepción: un error no es un duplicado.
+    """
+    rows = []
+    for p in positions or []:
+        try:
+            rows.append(_closed_position_row(p))
+        except Exception as e:
+            print(f"⚠️ closed_positions: fila descartada {p.get('exchange')} {p.get('symbol')}: {e}")
+
+    own = conn is None
+    if own:
+        if not rows:
+            return 0
+        conn = db_connect(db_path or DB_PATH)  # DB_PATH en tiempo de llamada (algunos adapters lo reasignan)
+    cur = conn.cursor()
     try:
-        print(f"🚀 [DEBUG] Ejecutando SQL...")
-        cur.execute(sql, vals)
+        before = conn.total_changes
+        if rows:
+            cur.executemany(_CLOSED_INSERT_SQL, rows)
         conn.commit()
-        print(f"✅ [DEBUG] POSICIÓN GUARDADA EXITOSAMENTE: {exchange} {symbol}")
-
-        # Verificación
-        cur.execute(
-            "SELECT COUNT(*) FROM closed_positions WHERE exchange = ? AND symbol = ? AND close_time = ?",
-            (exchange, symbol, close_s),
-        )
-        count = cur.fetchone()[0]
-        print(
-            f"🔍 [DEBUG] Verificación en DB: {count} registros encontrados para esta posición"
-        )
-
+        inserted = conn.total_changes - before
     except Exception as e:
-        print(f"❌ [DEBUG] ERROR al guardar posición {exchange} {symbol}: {e}")
-        print(f"🔍 [DEBUG] SQL: {sql}")
-        print(f"🔍 [DEBUG] Valores: {vals}")
-        traceback.print_exc()
         conn.rollback()
+        print(f"❌ closed_positions: error guardando lote de {len(rows)}: {e}")
+        raise
     finally:
-        conn.close()
+        if own:
+            conn.close()
+
+    if verbose:
+        for r in rows:
+            print(f"✅ Cerrada guardada: {r[0]} {r[1]} {r[2]} size={r[3]:.6g} realized={r[9]:.4f}")
+    return inserted
+
+
+def save_closed_position(position: dict):
+    """Guarda una sola posición cerrada (envoltorio de save_closed_positions_bulk)."""
+    if save_closed_positions_bulk([position]):
+        print(f"✅ Posición cerrada guardada: {position.get('exchange')} {position.get('symbol')}")
 
 
 # =============Codigo 1 fin==========
@@ -434,6 +608,10 @@ def save_closed_position(position: dict):
 
 # === db_manager.py ===
 import sqlite3, json, hashlib, time
+import queue
+import threading
+from concurrent.futures import Future
+from utils.jsonfast import dumps as json_dumps
 
 DB_PATH = "portfolio.db"
 
@@ -445,7 +623,7 @@ def migrate_spot_support():
 
 
 def init_funding_db(db_path=DB_PATH):
-    conn = sqlite3.connect(db_path)
+    conn = db_connect(db_path)
     cur = conn.cursor()
     cur.executescript(
         """
@@ -495,59 +673,181 @@ def _funding_hash(ev: dict) -> str:
     return hashlib.sha1(base.encode()).hexdigest()
 
 
-def upsert_funding_events(events: list, db_path=DB_PATH) -> int:
-    """Inserta sin duplicar (por external_id o por hash). Devuelve cuántos inserts entraron."""
-    if not events:
-        return 0
-    conn = sqlite3.connect(db_path)
-    cur = conn.cursor()
-    inserted = 0
+_FUNDING_INSERT_SQL = """
+    INSERT OR IGNORE INTO funding_events
+    (exchange,symbol,asset,income,funding_rate,period_hours,timestamp,external_id,type,estimated,ext_hash,raw_json)
+    VALUES (?,?,?,?,?,?,?,?,?,?,?,?)
+"""
+
+
+def _funding_rows(events: list) -> list:
+    """Prepara las tuplas de INSERT una sola vez (el hash solo si no hay external_id)."""
+    rows = []
     for e in events:
-        exchange = e.get("exchange") or ""
-        symbol = e.get("symbol") or ""
-        asset = e.get("asset") or "USDT"
-        income = float(e.get("income") or 0.0)
-        frate = e.get("funding_rate")
-        phours = e.get("period_hours")
-        ts_ms = _to_ms(e.get("timestamp"))
         ext_id = e.get("external_id")
-        typ = e.get("type")
-        est = int(bool(e.get("estimated")))  # 0/1
-        raw = json.dumps(e, separators=(",", ":"))
-
-        ext_hash = None if ext_id else _funding_hash(e)
-
-        cur.execute(
-            """
-            INSERT OR IGNORE INTO funding_events
-            (exchange,symbol,asset,income,funding_rate,period_hours,timestamp,external_id,type,estimated,ext_hash,raw_json)
-            VALUES (?,?,?,?,?,?,?,?,?,?,?,?)
-        """,
+        rows.append(
             (
-                exchange,
-                symbol,
-                asset,
-                income,
-                frate,
-                phours,
-                ts_ms,
+                e.get("exchange") or "",
+                e.get("symbol") or "",
+                e.get("asset") or "USDT",
+                float(e.get("income") or 0.0),
+                e.get("funding_rate"),
+                e.get("period_hours"),
+                _to_ms(e.get("timestamp")),
                 ext_id,
-                typ,
-                est,
-                ext_hash,
-                raw,
-            ),
+                e.get("type"),
+                int(bool(e.get("estimated"))),  # 0/1
+                None if ext_id else _funding_hash(e),
+                json_dumps(e, default=str),
+            )
         )
-        if cur.rowcount > 0:
-            inserted += 1
-    conn.commit()
-    conn.close()
+    return rows
+
+
+def _insert_funding_events(cur, events: list) -> int:
+    """
+    Inserta eventos con el cursor dado (sin commit) en un solo executemany.
+    Devuelve cuántos entraron: con OR IGNORE los duplicados no suman a total_changes.
+    """
+    if not events:
+        return 0
+    conn = cur.connection
+    before = conn.total_changes
+    cur.executemany(_FUNDING_INSERT_SQL, _funding_rows(events))
+    return conn.total_changes - before
+
+
+def upsert_funding_events(events: list, db_path=DB_PATH) -> int:
+    """Inserta sin duplicar (por external_id o por hash). Devuelve cuántos inserts entraron."""
+    if not events:
+        return 0
+    conn = db_connect(db_path)
+    cur = conn.cursor()
+    try:
+        inserted = _insert_funding_events(cur, events)
+        conn.commit()  # una sola transacción para todo el lote
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
     return inserted
 
 
+# ============ Escritor único de funding
+# Los pulls de funding corren en paralelo; TODAS las escrituras (eventos +
+# funding_sync_state) pasan por un solo hilo que agrupa lo que haya en cola en
+# una transacción. Sin escritores concurrentes no hay "database is locked".
+
+
+def _upsert_sync_state(cur, exchange: str, last_run_ms: int, last_ingested_ms):
+    cur.execute(
+        """
+    INSERT INTO funding_sync_state(exchange, last_run_ms, last_ingested_ms)
+    VALUES(?,?,?)
+    ON CONFLICT(exchange) DO UPDATE SET
+        last_run_ms=excluded.last_run_ms,
+        last_ingested_ms=COALESCE(excluded.last_ingested_ms, funding_sync_state.last_ingested_ms)
+    """,
+        (exchange, last_run_ms, last_ingested_ms),
+    )
+
+
+class FundingWriter:
+    def __init__(self, db_path=DB_PATH, max_batch: int = 64):
+        self.db_path = db_path
+        self.max_batch = max_batch
+        self._q = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="funding-writer", daemon=True
+                )
+                self._thread.start()
+
+    def submit(
+        self, exchange: str, events: list, last_run_ms: int, last_ingested_ms=None
+    ) -> Future:
+        """Encola eventos + estado de sync de un exchange. El Future devuelve los insertados."""
+        fut = Future()
+        self._q.put((exchange, events or [], last_run_ms, last_ingested_ms, fut))
+        self._ensure_started()
+        return fut
+
+    def _run(self):
+        while True:
+            batch = [self._q.get()]
+            # agrupa todo lo que ya esté esperando en la misma transacción
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._q.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write(batch)
+            except BaseException as e:  # el hilo escritor no debe morir nunca
+                print(f"❌ FundingWriter: fallo inesperado en lote de {len(batch)}: {e}")
+                self._fail(batch, e)
+
+    @staticmethod
+    def _fail(batch, exc):
+        for *_, fut in batch:
+            if not fut.done():
+                fut.set_exception(exc)
+
+    def _write(self, batch):
+        """
+        Un lote = una transacción (BEGIN explícito, un solo commit), con un
+        SAVEPOINT anidado por exchange: un evento malo solo deshace lo de su
+        exchange, no el resto del lote.
+        """
+        conn = None
+        try:
+            conn = db_connect(self.db_path)
+            cur = conn.cursor()
+            # sin BEGIN externo el primer SAVEPOINT abriría la transacción y su
+            # RELEASE la commitearía: un commit por exchange
+            cur.execute("BEGIN")
+            results = []
+            for exchange, events, last_run_ms, last_ingested_ms, fut in batch:
+                cur.execute("SAVEPOINT funding_ex")
+                try:
+                    inserted = _insert_funding_events(cur, events)
+                    _upsert_sync_state(cur, exchange, last_run_ms, last_ingested_ms)
+                except Exception as e:
+                    cur.execute("ROLLBACK TO SAVEPOINT funding_ex")
+                    cur.execute("RELEASE SAVEPOINT funding_ex")
+                    print(f"❌ FundingWriter: error escribiendo {exchange}: {e}")
+                    fut.set_exception(e)
+                    continue
+                cur.execute("RELEASE SAVEPOINT funding_ex")
+                results.append((fut, inserted))
+            conn.commit()
+            for fut, inserted in results:
+                fut.set_result(inserted)
+        except Exception as e:
+            if conn is not None:
+                try:
+                    conn.rollback()
+                except Exception:
+                    pass
+            print(f"❌ FundingWriter: error escribiendo lote de {len(batch)}: {e}")
+            self._fail(batch, e)
+        finally:
+            if conn is not None:
+                conn.close()
+
+
+FUNDING_WRITER = FundingWriter()
+
+
 def last_funding_ts(exchange: str, db_path=DB_PATH) -> int:
     """Devuelve el último timestamp (ms) guardado para un exchange, o 0 si no hay."""
-    conn = sqlite3.connect(db_path)
+    conn = db_connect(db_path)
     cur = conn.cursor()
     cur.execute(
         "SELECT COALESCE(MAX(timestamp),0) FROM funding_events WHERE exchange = ?",
@@ -568,7 +868,7 @@ def load_funding(
     exchanges: list | None = None,
 ) -> list:
     """Lee eventos de funding desde DB, con filtro opcional por lista de exchanges."""
-    conn = sqlite3.connect(db_path)
+    conn = db_connect(db_path)
     cur = conn.cursor()
     conds = []
     args = []
@@ -626,6 +926,48 @@ def load_funding(
     return out
 
 
+def sum_funding_day_buckets(
+    exchanges: list, bucket_starts_ms: list, db_path=DB_PATH
+) -> dict:
+    """
+    Suma de income por (exchange, symbol) en buckets consecutivos, en UNA consulta.
+    bucket_starts_ms = [t0, t1, ..., tn] -> buckets [t0,t1), [t1,t2), ..., [tn, ∞)
+    Devuelve {(exchange, symbol): (suma_bucket0, ..., suma_bucketn)}.
+    """
+    exchanges = [e for e in (exchanges or []) if e]
+    if not exchanges or not bucket_starts_ms:
+        return {}
+
+    bounds = list(bucket_starts_ms)
+    exprs = []
+    args = []
+    for i, start in enumerate(bounds):
+        if i + 1 < len(bounds):
+            exprs.append(
+                f"SUM(CASE WHEN timestamp >= ? AND timestamp < ? THEN income ELSE 0 END) AS b{i}"
+            )
+            args.extend([start, bounds[i + 1]])
+        else:
+            exprs.append(f"SUM(CASE WHEN timestamp >= ? THEN income ELSE 0 END) AS b{i}")
+            args.append(start)
+
+    placeholders = ",".join(["?"] * len(exchanges))
+    conn = db_connect(db_path)
+    cur = conn.cursor()
+    cur.execute(
+        f"""
+        SELECT exchange, symbol, {", ".join(exprs)}
+        FROM funding_events
+        WHERE timestamp >= ? AND exchange IN ({placeholders})
+        GROUP BY exchange, symbol
+    """,
+        (*args, bounds[0], *exchanges),
+    )
+    rows = cur.fetchall()
+    conn.close()
+    return {(r[0], r[1]): tuple(v or 0.0 for v in r[2:]) for r in rows}
+
+
 # ============================================================
 # POSITION OVERRIDES
 # ============================================================
@@ -635,7 +977,7 @@ def save_position_override_db(
     exchange: str, symbol: str, field_name: str, field_value, timestamp: int
 ):
     """Save a single position override field to database"""
-    conn = sqlite3.connect(DB_PATH)
+    conn = db_connect(DB_PATH)
     cur = conn.cursor()
 
     # Create table if it doesn't exist
@@ -657,7 +999,7 @@ def save_position_override_db(
 
 def get_position_overrides_db(exchange: str, symbol: str) -> dict:
     """Load position overrides from database"""
-    conn = sqlite3.connect(DB_PATH)
+    conn = db_connect(DB_PATH)
     cur = conn.cursor()
 
     # Create table if it doesn't exist
@@ -694,7 +1036,7 @@ def get_position_overrides_db(exchange: str, symbol: str) -> dict:
 
 def load_all_position_overrides_db() -> dict:
     """Load all position overrides from database into memory"""
-    conn = sqlite3.connect(DB_PATH)
+    conn = db_connect(DB_PATH)
     cur = conn.cursor()
 
     # Create table if it doesn't exist
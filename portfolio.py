@@ -1,4 +1,4 @@
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, render_template, jsonify, request, Response, stream_with_context
 import pandas as pd
 import requests
 import time
@@ -20,16 +20,39 @@ from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
 from requests import Request, Session
 from collections import defaultdict
 import sqlite3
+import queue
+import threading
+from concurrent.futures import TimeoutError as FuturesTimeout
+from utils.fanout import fan_out, iter_fan_out
+from utils.dbconn import db_connect
+from utils.jsonfast import install_flask_json, dumps as json_dumps
+from services.balances import (
+    aggregate,
+    collect_balances,
+    iter_balances,
+    normalize_balance,
+)
+from services.jobs import JobQueue, get_job, wait_for_port
+from services.positions import PositionSnapshotStore
+from services.stream import LivePoller, CLOSE as STREAM_CLOSE
+from adapters.base import WrappedAdapter, gather_adapters
+from utils.async_http import run_coro
+from utils.resilience import breaker_status
+from adapters.registry import register_async_adapter, get_async_adapters
 from db_manager import (
     init_db,
     save_closed_position,
     init_funding_db,
     upsert_funding_events,
+    FUNDING_WRITER,
     last_funding_ts,
     load_funding,
+    sum_funding_day_buckets,
     save_position_override_db,
     get_position_overrides_db,
     load_all_position_overrides_db,
+    CLOSED_POSITIONS_LIST_SQL,
+    RECENT_CLOSED_EXCHANGES_SQL,
 )
 
 # En portfoliov7.8.py
@@ -90,12 +113,11 @@ def smart_sync_closed_positions(
     # 1. Obtener posiciones abiertas actuales
     fetch_error = False
     try:
-        fetch_positions = POSITIONS_FUNCTIONS.get(exchange_name)
-        if not fetch_positions:
+        if exchange_name not in POSITIONS_FUNCTIONS:
             print(f"⚠️  No hay función de posiciones para {exchange_name}")
             return 0
 
-        current_positions = fetch_positions()
+        current_positions = POSITION_SNAPSHOTS.get(exchange_name)
 
     except Exception as e:
         print(f"⚠️  Error obteniendo posiciones abiertas de {exchange_name}: {e}")
@@ -225,15 +247,34 @@ CACHE_DB_PATH = "cache.db"
 # =========================
 SYNC_FUNDING_ON_START = False  # Sincroniza funding al arrancar el servidor
 SYNC_FUNDING_ON_EMPTY = True  # Si /api/funding no encuentra datos, fuerza una sync
+FUNDING_EMPTY_SYNC_COOLDOWN_SEC = 600  # auto-sync en vacío: como mucho 1 vez por exchanges/ventana
 FUNDING_DEFAULT_DAYS = None  # Días por defecto que devuelve /api/funding
 # =========================
 FUNDING_GRACE_HOURS = 36  # margen de seguridad desde la última ejecución
 FUNDING_GATE_ACTIVITY = True  # solo sincronizar exchanges “activos”
 FUNDING_ACTIVE_WINDOW_DAYS = 7  # si hubo cerradas en estos días, consideramos activo
 FUNDING_CACHE_TTL_SEC = 300  # cache de open positions (5 min)
+FUNDING_PULL_WORKERS = 8  # pulls de funding simultáneos (uno por exchange)
+FUNDING_PULL_TIMEOUT_SEC = 180  # deadline por exchange en sync_all_funding
+FUNDING_WRITE_TIMEOUT_SEC = 120  # espera máxima a que el escritor confirme un exchange
 
 UNIVERSAL_CACHE_TTL_DAYS = 7  # TOGGLE CONFIGURABLE
 
+# =========================
+# 🎛️ TOGGLES FAN-OUT (posiciones y balances en paralelo)
+# =========================
+POSITIONS_PARALLEL = True  # fan-out concurrente en /api/positions (?parallel=0 para desactivar)
+POSITIONS_MAX_WORKERS = 8  # hilos máximos para pedir posiciones
+POSITIONS_TIMEOUT_SEC = 20  # deadline por exchange (lo que no llegue se reporta como timeout)
+POSITIONS_TIMEOUTS = {  # deadlines específicos para los exchanges lentos
+    "binance": 35,
+    "aster": 35,
+}
+POSITIONS_SNAPSHOT_TTL_SEC = 15  # snapshot de posiciones "fresco": se sirve sin llamar al exchange
+POSITIONS_SNAPSHOT_STALE_SEC = 120  # hasta aquí se sirve el snapshot y se refresca en segundo plano
+BALANCES_MAX_WORKERS = 8  # hilos máximos para /api/balances
+BALANCES_TIMEOUT_SEC = 20  # deadline por exchange en /api/balances
+
 # =====================================================
 # 🎛️ CONFIGURACIÓN DE EXCHANGES A SINCRONIZAR
 # =====================================================
@@ -334,7 +375,7 @@ def _fmt_ms(ms) -> str:
 # ======= Nuevo sistema de funding , a partit de version 7.3
 # ===== Estado de sincronización funding (por exchange) =====
 def _init_funding_sync_state(db_path=DB_PATH):
-    conn = sqlite3.connect(db_path)
+    conn = db_connect(db_path)
     cur = conn.cursor()
     cur.execute(
         """
@@ -350,7 +391,7 @@ def _init_funding_sync_state(db_path=DB_PATH):
 
 
 def _get_sync_state(exchange: str, db_path=DB_PATH):
-    conn = sqlite3.connect(db_path)
+    conn = db_connect(db_path)
     conn.row_factory = sqlite3.Row
     cur = conn.cursor()
     cur.execute(
@@ -365,7 +406,7 @@ def _get_sync_state(exchange: str, db_path=DB_PATH):
 def _set_sync_state(
     exchange: str, last_run_ms: int, last_ingested_ms: int | None, db_path=DB_PATH
 ):
-    conn = sqlite3.connect(db_path)
+    conn = db_connect(db_path)
     cur = conn.cursor()
     try:
         cur.execute(
@@ -386,36 +427,19 @@ def _set_sync_state(
         conn.close()  # <- Asegurar que se cierra
 
 
-# ===== Cache de exchanges con posiciones abiertas (para gate de funding) =====
-_OPEN_POS_CACHE = {"ts": 0, "exchanges": set()}
-
-
-def _update_open_pos_cache(ex_list: set):
-    _OPEN_POS_CACHE["ts"] = int(time.time())
-    _OPEN_POS_CACHE["exchanges"] = set(e.lower() for e in ex_list)
-
-
+# ===== Exchanges con posiciones abiertas (para gate de funding) =====
 def _get_active_exchanges_from_cache():
-    now = int(time.time())
-    if now - _OPEN_POS_CACHE["ts"] <= FUNDING_CACHE_TTL_SEC:
-        return set(_OPEN_POS_CACHE["exchanges"])
-    return set()
+    # sale de los snapshots de posiciones (POSITION_SNAPSHOTS), sin llamar a nadie
+    return POSITION_SNAPSHOTS.active_exchanges(max_age=FUNDING_CACHE_TTL_SEC)
 
 
 def _exchanges_with_recent_closed(days=FUNDING_ACTIVE_WINDOW_DAYS, db_path=DB_PATH):
     try:
         cutoff = int(time.time()) - days * 24 * 3600
-        conn = sqlite3.connect(db_path)
+        conn = db_connect(db_path)
         conn.row_factory = sqlite3.Row
         cur = conn.cursor()
-        cur.execute(
-            """
-            SELECT DISTINCT LOWER(exchange) AS ex
-            FROM closed_positions
-            WHERE COALESCE(close_time, open_time, 0) >= ?
-        """,
-            (cutoff,),
-        )
+        cur.execute(RECENT_CLOSED_EXCHANGES_SQL, (cutoff,))
         rows = [r["ex"] for r in cur.fetchall()]
         conn.close()
         return set(rows)
@@ -773,6 +797,7 @@ def _trigger_spot_fifo_sync(exchange_name: str):
 
 
 app = Flask(__name__)
+install_flask_json(app)  # jsonify con orjson si está instalado
 
 from api_manual_import import bp_manual_import
 
@@ -869,7 +894,7 @@ def _init_manual_open_table(db_path: str = "cache.db"):
     """Create table for manual open positions if not exists"""
     import sqlite3
 
-    conn = sqlite3.connect(db_path)
+    conn = db_connect(db_path)
     cursor = conn.cursor()
     cursor.execute(
         """
@@ -902,7 +927,7 @@ def _save_manual_open_to_db(manual: dict, db_path: str = "cache.db"):
 
     _init_manual_open_table(db_path)
 
-    conn = sqlite3.connect(db_path)
+    conn = db_connect(db_path)
     cursor = conn.cursor()
 
     cursor.execute(
@@ -940,7 +965,7 @@ def _delete_manual_open_from_db(manual_id: str, db_path: str = "cache.db"):
 
     _init_manual_open_table(db_path)
 
-    conn = sqlite3.connect(db_path)
+    conn = db_connect(db_path)
     cursor = conn.cursor()
     cursor.execute(
         "DELETE FROM manual_open_positions WHERE manual_id = ?", (manual_id,)
@@ -955,7 +980,7 @@ def _load_manual_open_from_db(db_path: str = "cache.db") -> dict:
 
     _init_manual_open_table(db_path)
 
-    conn = sqlite3.connect(db_path)
+    conn = db_connect(db_path)
     conn.row_factory = sqlite3.Row
     cursor = conn.cursor()
 
@@ -1401,28 +1426,12 @@ def _std_event(exchange: str, ev: dict) -> dict:
     return out
 
 
-def db_operation_with_retry(operation_func, max_retries=3, base_delay=0.1):
-    """
-    Ejecuta una operación de BD con retry automático en caso de lock
-    """
-    for attempt in range(max_retries):
-        try:
-            return operation_func()
-        except sqlite3.OperationalError as e:
-            if "locked" in str(e) and attempt < max_retries - 1:
-                sleep_time = base_delay * (2**attempt)  # Exponential backoff
-                time.sleep(sleep_time)
-                continue
-            else:
-                raise e
-    return None
-
-
 def sync_all_funding(
     exchanges: list | None = None, force_days: int | None = None, verbose: bool = True
 ) -> dict:
     """
-    Sincroniza funding con mejor manejo de errores de base de datos
+    Sincroniza funding: los pulls de red corren en paralelo por exchange y un
+    único hilo escritor (FUNDING_WRITER) guarda eventos + sync_state en lotes.
     """
     now_ms = _ms_now()
     inserted_by_ex = {}
@@ -1449,73 +1458,128 @@ def sync_all_funding(
     if verbose:
         print(f"🔧 Funding sync mode: {mode}; exchanges={target_ex}")
 
+    # 2) since_ms por exchange y tareas de pull (solo red, sin tocar la DB)
+    since_by_ex = {}
+    pulls = {}
     for ex in target_ex:
-        try:
-            if ex not in FUNDING_PULLERS:
-                inserted_by_ex[ex] = 0
-                if verbose:
-                    print(f"   · {ex}: no hay puller definido")
-                continue
+        if ex not in FUNDING_PULLERS:
+            inserted_by_ex[ex] = 0
+            if verbose:
+                print(f"   · {ex}: no hay puller definido")
+            continue
 
-            # 2a) calcula since_ms por exchange
-            if since_ms_global is not None:
-                since_ms = since_ms_global
-            else:
-                state = _get_sync_state(ex)
-                since_ms = 0
-                if state["last_ingested_ms"]:
-                    since_ms = max(since_ms, int(state["last_ingested_ms"]))
-                if state["last_run_ms"]:
-                    since_ms = max(since_ms, int(state["last_run_ms"]))
-                since_ms = max(0, since_ms - grace_ms)
-
-            # 3) Llama al adapter
-            raw = _call_funding_with_since(FUNDING_PULLERS[ex], since_ms) or []
+        if since_ms_global is not None:
+            since_ms = since_ms_global
+        else:
+            state = _get_sync_state(ex)
+            since_ms = 0
+            if state["last_ingested_ms"]:
+                since_ms = max(since_ms, int(state["last_ingested_ms"]))
+            if state["last_run_ms"]:
+                since_ms = max(since_ms, int(state["last_run_ms"]))
+            since_ms = max(0, since_ms - grace_ms)
+        since_by_ex[ex] = since_ms
+        pulls[ex] = lambda ex=ex, since=since_ms: _call_funding_with_since(
+            FUNDING_PULLERS[ex], since
+        )
+
+    # 3) Pulls en paralelo; según llega cada exchange se normaliza y se entrega
+    #    al escritor único (eventos + sync_state en la misma transacción)
+    writes = {}
+    for ex, raw, st in iter_fan_out(
+        pulls,
+        max_workers=FUNDING_PULL_WORKERS,
+        timeout=FUNDING_PULL_TIMEOUT_SEC,
+        pool="funding_pull",
+        # un pull en vuelo solo se comparte con otro de la MISMA ventana: un
+        # forzado de N días no puede quedarse con el resultado de un incremental
+        variants=since_by_ex,
+    ):
+        since_ms = since_by_ex[ex]
+        if st["status"] == "timeout":
+            # pull abandonado: NO se marca last_run (el siguiente incremental
+            # volvería a empezar después de un histórico que nunca se bajó)
+            print(f"❌ Funding sync timeout {ex}: se reintentará desde el mismo punto")
+            inserted_by_ex[ex] = 0
+            continue
+        if st["status"] != "ok":
+            print(f"❌ Funding sync error {ex}: {st.get('error') or st['status']}")
+            # marcar last_run incluso en error
+            writes[ex] = (FUNDING_WRITER.submit(ex, [], now_ms, None), None)
+            continue
+        try:
+            raw = raw or []
             raw_ms = [_normalize_ms(r) for r in raw]
             norm = [_std_event(ex, r) for r in raw_ms]
             recent = [e for e in norm if int(e.get("timestamp") or 0) >= since_ms]
+        except Exception as e:
+            print(f"❌ Funding sync error {ex}: {e}")
+            writes[ex] = (FUNDING_WRITER.submit(ex, [], now_ms, None), None)
+            continue
+        max_ingested = max([e["timestamp"] for e in recent], default=None)
+        writes[ex] = (
+            FUNDING_WRITER.submit(ex, recent, now_ms, max_ingested),
+            (len(raw), len(norm)),
+        )
 
-            # 4) Inserta con retry en caso de lock
-            inserted = upsert_funding_events(recent)
-            inserted_by_ex[ex] = inserted
+    # 4) Espera a que el escritor confirme cada exchange
+    for ex, (fut, counts) in writes.items():
+        try:
+            inserted = fut.result(timeout=FUNDING_WRITE_TIMEOUT_SEC)
+        except FuturesTimeout:
+            print(f"❌ Funding sync error {ex}: escritor sin respuesta en {FUNDING_WRITE_TIMEOUT_SEC}s")
+            inserted = 0
+        except Exception as e:
+            print(f"❌ Funding sync error {ex}: {e}")
+            inserted = 0
+        inserted_by_ex[ex] = inserted if counts else 0
+        if verbose and counts:
+            since_hr = _fmt_ms(since_by_ex[ex])
+            print(
+                f"🔁 Funding {ex}: recibidos={counts[0]} norm={counts[1]} nuevos={inserted} (since={since_hr})"
+            )
 
-            # 5) Actualiza estado con manejo de errores
-            max_ingested = max([e["timestamp"] for e in recent], default=None)
+    return inserted_by_ex
 
-            # Intentar actualizar estado con retry
-            success = False
-            for attempt in range(3):  # 3 intentos
-                try:
-                    _set_sync_state(
-                        ex, last_run_ms=now_ms, last_ingested_ms=max_ingested
-                    )
-                    success = True
-                    break
-                except sqlite3.OperationalError as e:
-                    if "locked" in str(e) and attempt < 2:
-                        time.sleep(0.1 * (attempt + 1))  # Esperar progresivamente
-                        continue
-                    else:
-                        if verbose:
-                            print(f"⚠️ No se pudo actualizar sync_state para {ex}: {e}")
-                        break
 
-            if verbose:
-                since_hr = _fmt_ms(since_ms)
-                print(
-                    f"🔁 Funding {ex}: recibidos={len(raw)} norm={len(norm)} nuevos={inserted} (since={since_hr})"
-                )
+# ===== Jobs de funding: los handlers encolan y responden al momento =====
+FUNDING_JOB_WORKERS = 2  # syncs de funding simultáneas en segundo plano
+FUNDING_JOBS = JobQueue("funding", workers=FUNDING_JOB_WORKERS)
 
-        except Exception as e:
-            print(f"❌ Funding sync error {ex}: {e}")
-            inserted_by_ex[ex] = 0
-            # Intentar marcar last_run incluso en error
-            try:
-                _set_sync_state(ex, last_run_ms=now_ms, last_ingested_ms=None)
-            except Exception:
-                pass
 
-    return inserted_by_ex
+def enqueue_funding_sync(exchanges: list | None, force_days: int | None = None) -> dict:
+    """
+    Encola una sync de funding por exchange y devuelve {exchange: job_id}.
+    Si ya hay una sync idéntica (mismo exchange y misma ventana) en cola o
+    corriendo, se reutiliza ese job en vez de duplicar la llamada remota.
+    """
+    if exchanges:
+        targets = sorted({(e or "").strip().lower() for e in exchanges if (e or "").strip()})
+    else:
+        targets = _determine_exchanges_to_sync()
+
+    force = force_days if isinstance(force_days, int) and force_days > 0 else None
+    jobs = {}
+    for ex in targets:
+        if ex not in FUNDING_PULLERS:
+            continue
+        jobs[ex] = FUNDING_JOBS.submit(
+            f"funding:{ex}",
+            lambda ex=ex: sync_all_funding(
+                exchanges=[ex], force_days=force, verbose=False
+            ),
+            key=f"funding:{ex}:{force or 'inc'}",
+            group="funding",
+        )
+    return jobs
+
+
+@app.get("/api/jobs/<job_id>")
+def api_job_status(job_id):
+    job = get_job(job_id)
+    if not job:
+        return jsonify({"ok": False, "error": "job not found"}), 404
+    return jsonify({"ok": True, "job": job})
 
 
 # === Crear (Add manual open) ===
@@ -1643,14 +1707,16 @@ def api_funding_open_positions():
         # Limitar a los exchanges persistidos en cache (o todos si no hay preferencia)
         preferred_exchanges = _preferred_position_exchanges()
 
-        # Obtener posiciones abiertas actuales
+        # Símbolos abiertos desde los snapshots de posiciones (sin llamar al exchange;
+        # solo se pide si ese exchange aún no tiene snapshot)
         current_positions = {}
         for ex_name in preferred_exchanges:
-            fetch_func = POSITIONS_FUNCTIONS.get(ex_name)
-            if not fetch_func:
+            if ex_name not in POSITIONS_FUNCTIONS:
                 continue
             try:
-                positions = fetch_func()
+                positions, _ = POSITION_SNAPSHOTS.peek(ex_name)
+                if positions is None:
+                    positions = POSITION_SNAPSHOTS.get(ex_name)
                 for pos in positions:
                     exchange = pos.get("exchange", "").lower()
                     symbol = pos.get("symbol", "")
@@ -1661,85 +1727,61 @@ def api_funding_open_positions():
             except:
                 continue
 
-        # Calcular funding para cada posición
-        result = {}
+        # Buckets por día (UTC): d-2, d-1 y hoy
         now = datetime.now(timezone.utc)
-        d2_start = (now - timedelta(days=2)).replace(
-            hour=0, minute=0, second=0, microsecond=0
-        )
-        d2_end = (now - timedelta(days=1)).replace(
-            hour=0, minute=0, second=0, microsecond=0
+        today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        d1_start = today_start - timedelta(days=1)
+        d2_start = today_start - timedelta(days=2)
+
+        # Una sola consulta agrupada para todos los símbolos abiertos
+        sums = sum_funding_day_buckets(
+            list(current_positions.keys()),
+            [
+                int(d2_start.timestamp() * 1000),
+                int(d1_start.timestamp() * 1000),
+                int(today_start.timestamp() * 1000),
+            ],
         )
-        d1_start = d2_end
-        d1_end = now.replace(hour=0, minute=0, second=0, microsecond=0)
-        today_start = d1_end
-
-        conn = sqlite3.connect(DB_PATH)
-        cur = conn.cursor()
 
+        result = {}
         for exchange, symbols in current_positions.items():
             result[exchange] = {}
             for symbol in symbols:
-                # d-2
-                cur.execute(
-                    """
-                    SELECT SUM(income) FROM funding_events
-                    WHERE exchange=? AND symbol=? 
-                    AND timestamp >= ? AND timestamp < ?
-                """,
-                    (
-                        exchange,
-                        symbol,
-                        int(d2_start.timestamp() * 1000),
-                        int(d2_end.timestamp() * 1000),
-                    ),
-                )
-                d2 = cur.fetchone()[0] or 0
-
-                # d-1
-                cur.execute(
-                    """
-                    SELECT SUM(income) FROM funding_events
-                    WHERE exchange=? AND symbol=? 
-                    AND timestamp >= ? AND timestamp < ?
-                """,
-                    (
-                        exchange,
-                        symbol,
-                        int(d1_start.timestamp() * 1000),
-                        int(d1_end.timestamp() * 1000),
-                    ),
-                )
-                d1 = cur.fetchone()[0] or 0
-
-                # hoy
-                cur.execute(
-                    """
-                    SELECT SUM(income) FROM funding_events
-                    WHERE exchange=? AND symbol=? 
-                    AND timestamp >= ?
-                """,
-                    (exchange, symbol, int(today_start.timestamp() * 1000)),
-                )
-                today = cur.fetchone()[0] or 0
-
+                d2, d1, today = sums.get((exchange, symbol), (0.0, 0.0, 0.0))
                 result[exchange][symbol] = {
                     "d2": float(d2),
                     "d1": float(d1),
                     "today": float(today),
                 }
 
-        conn.close()
         return jsonify(result)
     except Exception as e:
         print(f"❌ Error in funding_open_positions: {e}")
         return jsonify({})
 
 
+# (exchanges, days) -> time.time() del último auto-sync en vacío
+_FUNDING_EMPTY_SYNC_AT = {}
+_FUNDING_EMPTY_SYNC_LOCK = threading.Lock()
+
+
+def _claim_empty_funding_sync(exchanges, days) -> bool:
+    """True si toca auto-sync en vacío para (exchanges, days); marca el momento."""
+    key = (",".join(sorted(exchanges or [])), days)
+    now = time.time()
+    with _FUNDING_EMPTY_SYNC_LOCK:
+        last = _FUNDING_EMPTY_SYNC_AT.get(key)
+        if last is not None and now - last < FUNDING_EMPTY_SYNC_COOLDOWN_SEC:
+            return False
+        _FUNDING_EMPTY_SYNC_AT[key] = now
+        return True
+
+
 @app.route("/api/funding")
 def api_funding():
-    """Lee funding desde SQLite; si ?refresh=1, sincroniza antes.
-    Si la tabla está vacía y SYNC_FUNDING_ON_EMPTY=True, sincroniza una vez."""
+    """Lee funding desde SQLite; si ?refresh=1, encola una sync (ver "jobs" y /api/jobs/<id>).
+    Si la tabla está vacía y SYNC_FUNDING_ON_EMPTY=True, encola una sync (una vez por
+    exchanges/ventana cada FUNDING_EMPTY_SYNC_COOLDOWN_SEC; nunca con ?after_jobs=1)."""
     try:
         # 1) Forzar sync si se pide (?refresh=1) y, opcionalmente, con días forzados
         force_days_q = request.args.get("days", default=None, type=int)
@@ -1757,11 +1799,10 @@ def api_funding():
                 ex.strip().lower() for ex in exchanges_param.split(",") if ex.strip()
             ]
 
+        jobs = {}
         if request.args.get("refresh") == "1":
-            sync_all_funding(
-                exchanges=requested_exchanges or preferred_exchanges,
-                force_days=force_days_q,
-                verbose=False,
+            jobs = enqueue_funding_sync(
+                requested_exchanges or preferred_exchanges, force_days=force_days_q
             )
 
         # 2) Parse robusto de 'days' (puede venir None/''/'none'/'null' o un número)
@@ -1798,23 +1839,21 @@ def api_funding():
             exchanges=None if exchange else exchange_filter_list,
         )
 
-        # Si la tabla está vacía y está activado el auto-sync en vacío, dispara una vez
-        if not data and SYNC_FUNDING_ON_EMPTY:
-            sync_all_funding(
-                exchanges=requested_exchanges or preferred_exchanges,
-                force_days=force_days_q,
-                verbose=False,
-            )
-            data = load_funding(
-                days=days,
-                exchange=exchange,
-                symbol=symbol,
-                include_estimates=include_estimates,
-                limit=10000,
-                exchanges=None if exchange else exchange_filter_list,
-            )
+        # Si la tabla está vacía y está activado el auto-sync en vacío, encola una sync
+        # (el front vuelve a pedir /api/funding con ?after_jobs=1 cuando los jobs
+        # terminan: esa recarga no re-encola aunque siga vacío)
+        after_jobs = request.args.get("after_jobs") == "1"
+        sync_exchanges = requested_exchanges or preferred_exchanges
+        if (
+            not data
+            and SYNC_FUNDING_ON_EMPTY
+            and not jobs
+            and not after_jobs
+            and _claim_empty_funding_sync(sync_exchanges, days)
+        ):
+            jobs = enqueue_funding_sync(sync_exchanges, force_days=force_days_q)
 
-        return jsonify({"funding": data})
+        return jsonify({"funding": data, "jobs": jobs})
     except Exception as e:
         print(f"❌ /api/funding error: {e}")
         return jsonify({"funding": []})
@@ -1853,19 +1892,10 @@ def api_closed_positions():
         WINDOW_SEC = 15 * 60  # 15 minutos
         SIZE_EPS_REL = 0.001  # 0.1%
 
-        conn = sqlite3.connect("portfolio.db")
+        conn = db_connect("portfolio.db")
         conn.row_factory = sqlite3.Row
         cur = conn.cursor()
-        cur.execute(
-            """
-             SELECT id, exchange, symbol, side, size, entry_price, close_price, pnl,
-                    realized_pnl, funding_total AS funding_fee,
-                    fee_total AS fees, pnl_percent, apr, initial_margin, notional, 
-                    open_time, close_time
-             FROM closed_positions
-             ORDER BY open_time ASC
-        """
-        )
+        cur.execute(CLOSED_POSITIONS_LIST_SQL)  # mismo SQL que vigila check_closed_query_plans
         rows = [dict(r) for r in cur.fetchall()]
         conn.close()
 
@@ -2263,206 +2293,51 @@ def index():
 
 @app.route("/api/balances")
 def get_balances():
-    balances = []
-
-    # Aden
-    aden_data = _send_request("GET", "/v1/positions")
-    aden_account = fetch_account_aden(aden_data)
-    aden_positions = fetch_positions_aden(aden_data)
-    if aden_account:
-        aden_account["positions"] = aden_positions
-        # Asegurar claves estándar
-        aden_account.setdefault("spot", 0)
-        aden_account.setdefault("margin", 0)
-        aden_account.setdefault("futures", aden_account.get("equity", 0))
-        balances.append(aden_account)
-
-    # Binance - combina spot + futures
-    binance_data = fetch_account_binance()
-    if binance_data:
-        # En fetch_account_binance ya separa spot y futures internamente
-        # Asumiendo que balance incluye spot y futures_wallet_balance es solo futuros
-        spot_balance = binance_data.get("balance", 0) - binance_data.get(
-            "initial_margin", 0
-        )
-        binance_data.update(
-            {
-                "spot": max(spot_balance, 0),  # Asegurar no negativo
-                "margin": 0,
-                "futures": binance_data.get("initial_margin", 0),
-            }
-        )
-        balances.append(binance_data)
-
-    # Aster
-    aster_data = fetch_account_aster()
-    if aster_data:
-        aster_data.setdefault("spot", 0)
-        aster_data.setdefault("margin", 0)
-        aster_data.setdefault("futures", aster_data.get("equity", 0))
-        balances.append(aster_data)
-
-    # Extended
-    extended_data = fetch_account_extended()
-    if extended_data:
-        extended_data.setdefault("spot", 0)
-        extended_data.setdefault("margin", 0)
-        extended_data.setdefault("futures", extended_data.get("equity", 0))
-        balances.append(extended_data)
-
-    # BingX
-    bingx_data = fetch_bingx_all_balances()
-    if bingx_data:
-        bingx_data.setdefault("spot", 0)
-        bingx_data.setdefault("margin", 0)
-        bingx_data.setdefault("futures", bingx_data.get("equity", 0))
-        balances.append(bingx_data)
-
-    # Bybit
-    bybit_data = fetch_bybit_all_balances()
-    if bybit_data:
-        bybit_data.setdefault("spot", 0)
-        bybit_data.setdefault("margin", bybit_data.get("margin_balance", 0))
-        bybit_data.setdefault("futures", 0)
-        balances.append(bybit_data)
-
-    # Backpack
-    backpack_data = fetch_account_backpack()
-    if backpack_data:
-        backpack_data.setdefault("spot", backpack_data.get("balance", 0))
-        backpack_data.setdefault("margin", 0)
-        backpack_data.setdefault("futures", 0)
-        balances.append(backpack_data)
-
-    # KuCoin
-    try:
-        ku = fetch_kucoin_all_balances() or {}
-        if ku:
-            # El adapter ya entrega la forma final (floats), no hay nested dicts
-            ku_obj = {
-                "exchange": "kucoin",
-                "equity": float(ku.get("equity", 0.0)),
-                "balance": float(ku.get("balance", 0.0)),
-                "unrealized_pnl": float(ku.get("unrealized_pnl", 0.0)),
-                "spot": float(ku.get("spot", 0.0)),
-                "margin": float(ku.get("margin", 0.0)),
-                "futures": float(ku.get("futures", 0.0)),
-            }
-            balances.append(ku_obj)
-    except Exception as e:
-        print(f"❌ KuCoin balances error in route: {e}")
-
-    # Gate.io
-    gate_data = fetch_gate_all_balances(settles=("usdt",))
-    if gate_data:
-        gate_spot = sum(
-            bal["available"] + bal["locked"] for bal in gate_data.get("spot", [])
-        )
-        gate_futures = sum(fut["balance"] for fut in gate_data.get("futures", []))
-
-        gate_data.update(
-            {
-                "exchange": "gate",
-                "equity": gate_spot + gate_futures,
-                "balance": gate_spot + gate_futures,
-                "unrealized_pnl": sum(
-                    fut["unrealized_pnl"] for fut in gate_data.get("futures", [])
-                ),
-                "spot": gate_spot,
-                "margin": 0,
-                "futures": gate_futures,
-            }
-        )
-        balances.append(gate_data)
-        print(f"✅ Gate.io balances: spot={gate_spot:.2f}, futures={gate_futures:.2f}")
-
-    # MEXC
-    try:
-        mexc_data = fetch_mexc_all_balances()  # ← SIN settles, sin settle
-        if mexc_data:
-            balances.append(mexc_data)
-        print("✅ MEXC balances OK")
-    except Exception as e:
-        print(f"❌ MEXC balances error: {e}")
-
-    # Bitget
-    try:
-        bitget_data = fetch_bitget_all_balances()
-        if bitget_data:
-            balances.append(bitget_data)
-        print("✅ Bitget balances OK")
-    except Exception as e:
-        print(f"❌ Bitget balances error: {e}")
-
-    # OKX
-    try:
-        okx_data = fetch_okx_all_balances()
-        if okx_data:
-            balances.append(okx_data)
-        print("✅ OKX balances OK")
-    except Exception as e:
-        print(f"❌ OKX balances error: {e}")
+    balances, status = collect_balances(
+        BALANCE_FUNCTIONS,
+        max_workers=BALANCES_MAX_WORKERS,
+        timeout=BALANCES_TIMEOUT_SEC,
+    )
+    for ex, st in status.items():
+        if st.get("status") != "ok":
+            print(f"❌ {_ex_disp(ex)} balances {st.get('status')}: {st.get('error', '')}")
 
-    # Paradex
-    try:
-        paradex_data = fetch_paradex_all_balances()
-        if paradex_data:
-            balances.append(paradex_data)
-        print("✅ Paradex balances OK")
-    except Exception as e:
-        print(f"❌ Paradex balances error: {e}")
+    return jsonify(
+        {
+            "totals": aggregate(balances),
+            "exchanges": balances,
+            "status": status,
+        }
+    )
 
-    # Pacifica
-    try:
-        pacifica_data = fetch_pacifica_all_balances()
-        if pacifica_data:
-            balances.append(pacifica_data)
-        print("✅ Pacifica balances OK")
-    except Exception as e:
-        print(f"❌ Pacifica balances error: {e}")
 
-    # Hyperliquid
-    try:
-        hyper_data = fetch_hyperliquid_all_balances()
-        if hyper_data:
-            balances.append(hyper_data)
-        print("✅ Hyperliquid balances OK")
-    except Exception as e:
-        print(f"❌ Hyperliquid balances error: {e}")
+@app.route("/api/balances/stream")
+def stream_balances():
+    """
+    Igual que /api/balances pero en NDJSON: una línea por exchange según va llegando,
+    con los totales parciales acumulados. La última línea trae {"done": true, ...}.
+    """
 
-        # Whitebit
-    try:
-        whitebit_data = fetch_whitebit_all_balances()
-        if whitebit_data:
-            balances.append(whitebit_data)
-        print("✅ whitebit balances OK")
-    except Exception as e:
-        print(f"❌ whitebit balances error: {e}")
+    def _gen():
+        status = {}
+        totals = aggregate([])
+        for ev in iter_balances(
+            BALANCE_FUNCTIONS,
+            max_workers=BALANCES_MAX_WORKERS,
+            timeout=BALANCES_TIMEOUT_SEC,
+        ):
+            status[ev["exchange"]] = ev["status"]
+            totals = ev["totals"]
+            yield json_dumps(ev, default=str) + "\n"
+        yield json_dumps({"done": True, "totals": totals, "status": status}) + "\n"
 
-        # XT
-    try:
-        xt_bal = fetch_xt_all_balances()
-        if xt_bal:
-            balances.append(xt_bal)
-        print("✅ XT balances OK")
-    except Exception as e:
-        print(f"❌ XT balances error: {e}")
+    return Response(stream_with_context(_gen()), mimetype="application/x-ndjson")
 
-    # Totales
-    total_equity = sum(b.get("equity", 0) for b in balances)
-    total_balance = sum(b.get("balance", 0) for b in balances)
-    total_unreal = sum(b.get("unrealized_pnl", 0) for b in balances)
 
-    return jsonify(
-        {
-            "totals": {
-                "equity": total_equity,
-                "balance": total_balance,
-                "unrealized_pnl": total_unreal,
-            },
-            "exchanges": balances,
-        }
-    )
+@app.route("/api/health/breakers")
+def get_breakers():
+    """Estado de los circuit breakers por exchange (utils.resilience)."""
+    return jsonify(breaker_status())
 
 
 @app.route("/api/positions", methods=["GET", "POST"])
@@ -2504,20 +2379,78 @@ def get_positions():
 
     print(f"📡 Solicitando posiciones de: {selected_exchanges}")
     all_positions = []
-
-    for exchange_name in selected_exchanges:
-        if exchange_name not in POSITIONS_FUNCTIONS:
-            continue
-        try:
-            fetch_func = POSITIONS_FUNCTIONS[exchange_name]
-            positions = fetch_func()
-            all_positions.extend(positions)
-            # Actualizar cache sin spamear logs para llamadas de UI
-            update_cache_from_positions(
-                exchange_name, positions, CACHE_DB_PATH, log_summary=False
+    exchange_status = {}
+
+    parallel = POSITIONS_PARALLEL and request.args.get("parallel") != "0"
+    use_async = parallel and request.args.get("mode") == "async"
+    fresh = request.args.get("fresh") == "1"  # salta el snapshot (stale-while-revalidate)
+    if parallel:
+        tasks = {
+            ex: (lambda ex=ex: POSITION_SNAPSHOTS.get(ex, force=fresh))
+            for ex in selected_exchanges
+            if ex in POSITIONS_FUNCTIONS
+        }
+        if use_async:
+            # ?mode=async: mismo fan-out pero sobre los adapters async, en el event
+            # loop compartido (una sola ClientSession para todas las requests)
+            results, exchange_status = run_coro(
+                gather_adapters(
+                    get_async_adapters(list(tasks)),
+                    "fetch_open_positions",
+                    timeout=POSITIONS_TIMEOUT_SEC,
+                    timeouts=POSITIONS_TIMEOUTS,
+                )
             )
-        except Exception as e:
-            print(f"❌ {exchange_name} error: {e}")
+        else:
+            results, exchange_status = fan_out(
+                tasks,
+                max_workers=POSITIONS_MAX_WORKERS,
+                timeout=POSITIONS_TIMEOUT_SEC,
+                timeouts=POSITIONS_TIMEOUTS,
+                pool="positions",
+                variants={ex: "fresh" for ex in tasks} if fresh else None,
+            )
+        # orden estable (el de la selección), y escrituras a cache en este hilo
+        for exchange_name in tasks:
+            st = exchange_status.get(exchange_name) or {}
+            if st.get("status") != "ok":
+                print(
+                    f"❌ {exchange_name} {st.get('status')}: {st.get('error', '')} ({st.get('latency_ms')} ms)"
+                )
+                continue
+            positions = results.get(exchange_name) or []
+            st["count"] = len(positions)
+            all_positions.extend(positions)
+            try:
+                update_cache_from_positions(
+                    exchange_name, positions, CACHE_DB_PATH, log_summary=False
+                )
+            except Exception as e:
+                print(f"⚠️ {exchange_name} cache error: {e}")
+    else:
+        for exchange_name in selected_exchanges:
+            if exchange_name not in POSITIONS_FUNCTIONS:
+                continue
+            t0 = time.monotonic()
+            try:
+                positions = POSITION_SNAPSHOTS.get(exchange_name, force=fresh)
+                all_positions.extend(positions)
+                exchange_status[exchange_name] = {
+                    "status": "ok",
+                    "latency_ms": int((time.monotonic() - t0) * 1000),
+                    "count": len(positions),
+                }
+                # Actualizar cache sin spamear logs para llamadas de UI
+                update_cache_from_positions(
+                    exchange_name, positions, CACHE_DB_PATH, log_summary=False
+                )
+            except Exception as e:
+                print(f"❌ {exchange_name} error: {e}")
+                exchange_status[exchange_name] = {
+                    "status": "error",
+                    "latency_ms": int((time.monotonic() - t0) * 1000),
+                    "error": str(e),
+                }
 
     if MANUAL_OPEN_POS:
         ref_index = _build_manual_reference_index(all_positions)
@@ -2540,14 +2473,21 @@ def get_positions():
             continue
         seen_active.add(ex_name)
         active_exchanges.append(ex_name)
+    funding_jobs = {}
     if active_exchanges:
         try:
-            sync_all_funding(exchanges=active_exchanges, verbose=False)
+            funding_jobs = enqueue_funding_sync(active_exchanges)
         except Exception as e:
-            print(f"⚠️ Error syncing funding: {e}")
+            print(f"⚠️ Error encolando funding sync: {e}")
 
     print(f"📊 Total posiciones: {len(all_positions)}")
-    return jsonify({"positions": all_positions})
+    return jsonify(
+        {
+            "positions": all_positions,
+            "status": exchange_status,
+            "funding_jobs": funding_jobs,
+        }
+    )
 
 
 @app.get("/api/positions/exchanges")
@@ -2615,6 +2555,35 @@ SPOT_SYNC_FUNCTIONS = {
     "mexc": lambda: save_mexc_spot_positions(db_path="portfolio.db", days_back=40),
 }
 
+def _fetch_balance_aden():
+    aden_data = _send_request("GET", "/v1/positions")
+    aden_account = fetch_account_aden(aden_data)
+    if aden_account:
+        aden_account["positions"] = fetch_positions_aden(aden_data)
+    return aden_account
+
+
+# Funciones de balance para /api/balances (la normalización vive en services/balances.py)
+BALANCE_FUNCTIONS = {
+    "aden": _fetch_balance_aden,
+    "binance": lambda: fetch_account_binance(),
+    "aster": lambda: fetch_account_aster(),
+    "extended": lambda: fetch_account_extended(),
+    "bingx": lambda: fetch_bingx_all_balances(),
+    "bybit": lambda: fetch_bybit_all_balances(),
+    "backpack": lambda: fetch_account_backpack(),
+    "kucoin": lambda: fetch_kucoin_all_balances(),
+    "gate": lambda: fetch_gate_all_balances(settles=("usdt",)),
+    "mexc": lambda: fetch_mexc_all_balances(),
+    "bitget": lambda: fetch_bitget_all_balances(),
+    "okx": lambda: fetch_okx_all_balances(),
+    "paradex": lambda: fetch_paradex_all_balances(),
+    "pacifica": lambda: fetch_pacifica_all_balances(),
+    "hyperliquid": lambda: fetch_hyperliquid_all_balances(),
+    "whitebit": lambda: fetch_whitebit_all_balances(),
+    "xt": lambda: fetch_xt_all_balances(),
+}
+
 # Diccionario de funciones para obtener posiciones abiertas
 POSITIONS_FUNCTIONS = {
     "backpack": lambda: fetch_positions_backpack(),
@@ -2637,6 +2606,18 @@ POSITIONS_FUNCTIONS = {
 }
 
 
+# Snapshot compartido: todos los consumidores leen de aquí (como mucho una
+# llamada en vuelo por exchange; ver services/positions.PositionSnapshotStore)
+POSITION_SNAPSHOTS = PositionSnapshotStore(
+    POSITIONS_FUNCTIONS,
+    ttl=POSITIONS_SNAPSHOT_TTL_SEC,
+    stale_ttl=POSITIONS_SNAPSHOT_STALE_SEC,
+    # quien se engancha a una llamada en vuelo espera lo mismo que el fan-out
+    wait_timeout=POSITIONS_TIMEOUT_SEC,
+    wait_timeouts=POSITIONS_TIMEOUTS,
+)
+
+
 def _preferred_position_exchanges() -> list[str]:
     saved = get_selected_open_exchanges(CACHE_DB_PATH)
     if saved:
@@ -2644,6 +2625,163 @@ def _preferred_position_exchanges() -> list[str]:
     return list(POSITIONS_FUNCTIONS.keys())
 
 
+# =====================================================
+# 📡 STREAM (SSE): un solo poller compartido por todas las pestañas
+# =====================================================
+# cada cuánto el poller revisa posiciones y balances; nunca por debajo del TTL del
+# snapshot, así cada tick reutiliza lo que /api/positions ya haya refrescado
+LIVE_POLL_INTERVAL_SEC = max(15, POSITIONS_SNAPSHOT_TTL_SEC)
+
+
+def _live_positions_tasks() -> dict:
+    def _fetch(ex):
+        return [apply_position_overrides(p) for p in POSITION_SNAPSHOTS.get(ex)]
+
+    tasks = {
+        ex: (lambda ex=ex: _fetch(ex))
+        for ex in _preferred_position_exchanges()
+        if ex in POSITIONS_FUNCTIONS
+    }
+    if MANUAL_OPEN_POS:
+        tasks["manual"] = _live_manual_positions
+    return tasks
+
+
+def _live_balances_tasks() -> dict:
+    # solo los exchanges seleccionados por el usuario (no los 17 en cada tick)
+    return {
+        ex: BALANCE_FUNCTIONS[ex]
+        for ex in _preferred_position_exchanges()
+        if ex in BALANCE_FUNCTIONS
+    }
+
+
+def _live_manual_positions() -> list:
+    # marks heredados de los snapshots ya cargados (no dispara llamadas)
+    api_positions = []
+    for ex in _preferred_position_exchanges():
+        positions, _ = POSITION_SNAPSHOTS.peek(ex)
+        api_positions.extend(positions or [])
+    ref_index = _build_manual_reference_index(api_positions)
+    return [
+        apply_position_overrides(_enrich_manual_position(pos, ref_index))
+        for pos in MANUAL_OPEN_POS.values()
+    ]
+
+
+LIVE_POLLER = LivePoller(
+    positions_tasks=_live_positions_tasks,
+    balances_tasks=_live_balances_tasks,
+    normalize_balance=normalize_balance,
+    interval=LIVE_POLL_INTERVAL_SEC,
+    timeout=BALANCES_TIMEOUT_SEC,
+)
+
+
+@app.route("/api/stream")
+def api_stream():
+    """
+    Server-Sent Events con deltas por exchange:
+      event: positions|balances  data: {"type", "exchange", "data"}
+      event: status              data: {"type", "kind", "exchange", "status"}  (timeout/error)
+    Al conectar se envía el estado actual completo.
+    """
+    q = LIVE_POLLER.subscribe()
+
+    def _gen():
+        try:
+            while True:
+                try:
+                    ev = q.get(timeout=15)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                if ev is STREAM_CLOSE:
+                    return  # desconectado por lento: EventSource reconecta con estado completo
+                yield f"event: {ev['type']}\ndata: {json_dumps(ev, default=str)}\n\n"
+        finally:
+            LIVE_POLLER.unsubscribe(q)
+
+    return Response(
+        stream_with_context(_gen()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# Adapters async (contrato AsyncExchangeAdapter) sobre los dicts de funciones:
+# un solo event loop puede pedir posiciones/balances/funding a todos a la vez.
+for _ex in sorted(
+    set(POSITIONS_FUNCTIONS)
+    | set(BALANCE_FUNCTIONS)
+    | set(FUNDING_PULLERS)
+    | set(SYNC_FUNCTIONS)
+):
+    register_async_adapter(
+        WrappedAdapter(
+            _ex,
+            positions=(
+                (lambda ex=_ex: POSITION_SNAPSHOTS.get(ex))
+                if _ex in POSITIONS_FUNCTIONS
+                else None
+            ),
+            balances=BALANCE_FUNCTIONS.get(_ex),
+            funding=(
+                (lambda since=0, ex=_ex: _call_funding_with_since(FUNDING_PULLERS[ex], since))
+                if _ex in FUNDING_PULLERS
+                else None
+            ),
+            closed=SYNC_FUNCTIONS.get(_ex),
+            # mismos pools (y claves de coalescencia) que el camino síncrono
+            pools={
+                "positions": ("positions", POSITIONS_MAX_WORKERS),
+                "balances": ("balances", BALANCES_MAX_WORKERS),
+                "funding": ("funding_pull", FUNDING_PULL_WORKERS),
+            },
+        )
+    )
+
+
+def _refresh_positions_cache(ex_name: str) -> int:
+    """Pide posiciones abiertas de un exchange y las vuelca al cache universal."""
+    if ex_name not in POSITIONS_FUNCTIONS:
+        print(f"   ⚠️ {ex_name}: no hay adapter de posiciones definidas")
+        return 0
+    positions = POSITION_SNAPSHOTS.get(ex_name)
+    update_cache_from_positions(ex_name, positions, CACHE_DB_PATH)
+    print(f"   ✅ {ex_name.capitalize()}: {len(positions)} posiciones en cache")
+    return len(positions)
+
+
+def _sync_bingx_legacy():
+    # Función especial para BingX que necesita preparación (igual que tu código)
+    try:
+        debug_cache_status()
+        force_cache_update()
+        debug_cache_status()
+    except Exception:
+        pass
+
+    save_bingx_closed_positions(
+        db_path="portfolio.db",
+        symbols=None,
+        days=30,
+        include_funding=True,
+        debug=True,
+    )
+
+
+def _legacy_sync_closed(exchange_name: str):
+    print(f"⏳ Sincronizando fills cerrados de {exchange_name.capitalize()}.")
+    if exchange_name == "bingx":
+        _sync_bingx_legacy()
+    else:
+        SYNC_FUNCTIONS[exchange_name]()
+    print(
+        f"✅ Posiciones cerradas de {exchange_name.capitalize()} actualizadas correctamente."
+    )
+
+
 # borrar despues
 def main():
     print("🚀 Iniciando actualización de portfolio.")
@@ -2665,14 +2803,8 @@ def main():
         print("🔄 Actualizando cache universal para todos los exchanges...")
 
     for ex_name in target_exchanges:
-        fetch_positions_func = POSITIONS_FUNCTIONS.get(ex_name)
-        if not fetch_positions_func:
-            print(f"   ⚠️ {ex_name}: no hay adapter de posiciones definidas")
-            continue
         try:
-            positions = fetch_positions_func()
-            update_cache_from_positions(ex_name, positions, CACHE_DB_PATH)
-            print(f"   ✅ {ex_name.capitalize()}: {len(positions)} posiciones en cache")
+            _refresh_positions_cache(ex_name)
         except Exception as e:
             print(f"   ⚠️ {ex_name.capitalize()}: error - {e}")
 
@@ -2716,43 +2848,141 @@ def main():
         # ===========================
         print("📋 Modo Legacy Sync")
 
-        # Función especial para BingX que necesita preparación (igual que tu código)
-        def sync_bingx():
-            try:
-                debug_cache_status()
-                force_cache_update()
-                debug_cache_status()
-            except Exception:
-                pass
-
-            save_bingx_closed_positions(
-                db_path="portfolio.db",
-                symbols=None,
-                days=30,
-                include_funding=True,
-                debug=True,
-            )
-
         # Ejecutar sincronización para cada exchange configurado
-        for exchange_name, sync_function in SYNC_FUNCTIONS.items():
+        for exchange_name in SYNC_FUNCTIONS.keys():
             if should_sync(exchange_name):
-                print(
-                    f"⏳ Sincronizando fills cerrados de {exchange_name.capitalize()}."
-                )
                 try:
-                    if exchange_name == "bingx":
-                        sync_bingx()
-                    else:
-                        sync_function()
-                    print(
-                        f"✅ Posiciones cerradas de {exchange_name.capitalize()} actualizadas correctamente."
-                    )
+                    _legacy_sync_closed(exchange_name)
                 except Exception as e:
                     print(f"❌ Error en {exchange_name}: {e}")
             else:
                 print(f"⏭️  Saltando {exchange_name.capitalize()}")
 
 
+# =====================================================
+# 🧵 SUPERVISOR DE SYNC EN SEGUNDO PLANO
+#   El servidor arranca primero; la sync inicial corre como jobs priorizados
+#   (posiciones -> funding -> cerradas) y se consulta en /api/ready.
+# =====================================================
+STARTUP_SYNC_IN_BACKGROUND = True  # False = comportamiento antiguo (main() antes de app.run)
+STARTUP_SYNC_WORKERS = 2  # jobs de sync simultáneos
+
+PRIORITY_POSITIONS = 10
+PRIORITY_FUNDING = 20
+PRIORITY_CLOSED = 50
+
+SYNC_JOBS = JobQueue("sync", workers=STARTUP_SYNC_WORKERS)
+_STARTUP_STATE = {"launched_at": None, "scheduled_at": None, "error": None}
+
+
+def _startup_funding_force_days():
+    try:
+        if isinstance(FUNDING_DEFAULT_DAYS, int) and FUNDING_DEFAULT_DAYS > 0:
+            return int(FUNDING_DEFAULT_DAYS)
+    except Exception:
+        pass
+    return None
+
+
+def schedule_startup_sync():
+    """Encola el trabajo que antes hacía main() como jobs del grupo 'startup'."""
+    init_universal_cache_db(CACHE_DB_PATH)
+    init_selected_open_exchanges_table(CACHE_DB_PATH)
+
+    preferred_exchanges = get_selected_open_exchanges(CACHE_DB_PATH)
+    target_exchanges = preferred_exchanges or list(POSITIONS_FUNCTIONS.keys())
+    active_selection = set(target_exchanges)
+
+    for ex_name in target_exchanges:
+        SYNC_JOBS.submit(
+            f"positions:{ex_name}",
+            lambda ex=ex_name: _refresh_positions_cache(ex),
+            priority=PRIORITY_POSITIONS,
+            group="startup",
+        )
+
+    if SYNC_FUNDING_ON_START:
+        force = _startup_funding_force_days()
+        SYNC_JOBS.submit(
+            "funding:startup",
+            lambda: sync_all_funding(
+                exchanges=target_exchanges, force_days=force, verbose=True
+            ),
+            priority=PRIORITY_FUNDING,
+            group="startup",
+        )
+
+    for exchange_name in SYNC_FUNCTIONS.keys():
+        if SMART_SYNC_ENABLED:
+            if active_selection and exchange_name not in active_selection:
+                continue
+            fn = lambda ex=exchange_name: smart_sync_closed_positions(
+                ex, force_full_sync=False, debug=PRINT_CLOSED_SYNC
+            )
+        else:
+            if not should_sync(exchange_name):
+                continue
+            fn = lambda ex=exchange_name: _legacy_sync_closed(ex)
+        SYNC_JOBS.submit(
+            f"closed:{exchange_name}",
+            fn,
+            priority=PRIORITY_CLOSED,
+            group="startup",
+        )
+
+    _STARTUP_STATE["scheduled_at"] = time.time()
+    print(f"🧵 Sync inicial encolada: {SYNC_JOBS.progress('startup')['total']} jobs")
+
+
+def start_sync_supervisor(host: str = "127.0.0.1", port: int = 5000):
+    """Lanza un hilo que espera a que el servidor escuche y entonces encola la sync inicial."""
+    _STARTUP_STATE["launched_at"] = time.time()
+
+    def _run():
+        if not wait_for_port(host, port, timeout=60):
+            print("⚠️ El servidor no respondió a tiempo; se lanza la sync igualmente")
+        SYNC_JOBS.start()
+        try:
+            schedule_startup_sync()
+        except Exception as e:
+            _STARTUP_STATE["error"] = str(e)
+            print(f"❌ No se pudo encolar la sync inicial: {e}")
+
+    threading.Thread(target=_run, name="sync-supervisor", daemon=True).start()
+
+
+@app.get("/api/ready")
+def api_ready():
+    """
+    Readiness + progreso de la sync inicial (el servidor ya responde aunque siga
+    sincronizando). ready = todos los jobs de arranque (posiciones, funding,
+    cerradas) terminaron, bien o con error; con la sync antigua (antes de
+    app.run) ya lo estaban al aceptar la primera request.
+    """
+    progress = SYNC_JOBS.progress("startup")
+    scheduled = _STARTUP_STATE["scheduled_at"] is not None
+    pending = progress["queued"] + progress["running"]
+    startup_done = scheduled and pending == 0
+    jobs = [
+        {
+            "id": j["id"],
+            "name": j["name"],
+            "status": j["status"],
+            "error": j["error"],
+        }
+        for j in SYNC_JOBS.list("startup")
+    ]
+    return jsonify(
+        {
+            "ready": startup_done or not STARTUP_SYNC_IN_BACKGROUND,
+            "startup_sync_done": startup_done,
+            "schedule_error": _STARTUP_STATE["error"],
+            "progress": progress,
+            "jobs": jobs,
+        }
+    )
+
+
 # def main():
 #     print("🚀 Iniciando actualización de portfolio...")
 #     # Inicializar cache universal
@@ -2899,9 +3129,8 @@ def save_closed_positions_generic(
         pass
 
     try:
-        fetch_positions = POSITIONS_FUNCTIONS.get(exchange)
-        if fetch_positions:
-            current_positions = fetch_positions()
+        if exchange in POSITIONS_FUNCTIONS:
+            current_positions = POSITION_SNAPSHOTS.get(exchange)
             update_cache_from_positions(exchange, current_positions, "cache.db")
     except Exception:
         pass
@@ -3020,9 +3249,8 @@ def api_closed_load():
         )
 
         try:
-            fetch_positions = POSITIONS_FUNCTIONS.get(exchange)
-            if fetch_positions:
-                current_positions = fetch_positions()
+            if exchange in POSITIONS_FUNCTIONS:
+                current_positions = POSITION_SNAPSHOTS.get(exchange)
                 update_cache_from_positions(exchange, current_positions, "cache.db")
         except Exception:
             pass
@@ -3093,7 +3321,7 @@ def api_closed_delete():
         if not ids:
             return jsonify({"error": "No se proporcionaron IDs válidos"}), 400
 
-        conn = sqlite3.connect("portfolio.db")
+        conn = db_connect("portfolio.db")
         cur = conn.cursor()
 
         # Borrar posiciones
@@ -3138,9 +3366,8 @@ def api_closed_sync():
                 total_saved += int(saved)
 
                 try:
-                    fetch_positions = POSITIONS_FUNCTIONS.get(ex)
-                    if fetch_positions:
-                        current_positions = fetch_positions()
+                    if ex in POSITIONS_FUNCTIONS:
+                        current_positions = POSITION_SNAPSHOTS.get(ex)
                         update_cache_from_positions(ex, current_positions, "cache.db")
                 except Exception:
                     pass
@@ -3307,7 +3534,7 @@ def api_manual_closed():
 
         import sqlite3
 
-        conn = sqlite3.connect(DB_PATH)
+        conn = db_connect(DB_PATH)
         cur = conn.cursor()
         cur.execute(
             """
@@ -3512,9 +3739,11 @@ if __name__ == "__main__":
     init_funding_db()
     _init_funding_sync_state()
 
-    from db_manager import migrate_spot_support
+    from db_manager import migrate_spot_support, optimize_db
 
     migrate_spot_support()
+    # ANALYZE / PRAGMA optimize + aviso si alguna consulta caliente pierde su índice
+    optimize_db()
 
     # Cargar overrides de posiciones desde la base de datos
     print("📥 Cargando position overrides desde base de datos...")
@@ -3525,24 +3754,23 @@ if __name__ == "__main__":
 
     init_sync_timestamps_table()
 
-    if SYNC_FUNDING_ON_START:
-        force = None
-        try:
-            if isinstance(FUNDING_DEFAULT_DAYS, int) and FUNDING_DEFAULT_DAYS > 0:
-                force = int(FUNDING_DEFAULT_DAYS)
-        except Exception:
-            force = None
+    if STARTUP_SYNC_IN_BACKGROUND:
+        print("✅ Base de datos lista. La sincronización inicial correrá en segundo plano.")
+        start_sync_supervisor(port=5000)
+    else:
+        if SYNC_FUNDING_ON_START:
+            force = _startup_funding_force_days()
 
-        print(
-            "🔄 Sincronizando funding al arranque..."
-            + (f" (forzado {force} días)" if force else " (incremental)")
-        )
+            print(
+                "🔄 Sincronizando funding al arranque..."
+                + (f" (forzado {force} días)" if force else " (incremental)")
+            )
 
-        preferred = _preferred_position_exchanges()
-        sync_all_funding(exchanges=preferred, force_days=force, verbose=True)
+            preferred = _preferred_position_exchanges()
+            sync_all_funding(exchanges=preferred, force_days=force, verbose=True)
 
-    print("✅ Base de datos lista. Ejecutando sincronización inicial...")
-    main()
+        print("✅ Base de datos lista. Ejecutando sincronización inicial...")
+        main()
 
     print("🌐 Lanzando servidor Flask...")
     app.run(host="0.0.0.0", port=5000, debug=False, use_reloader=False)
@@ -1,3 +1,6 @@
+from utils.fanout import iter_fan_out
+
+
 def aggregate(balances):
     totals = {"equity":0.0, "balance":0.0, "unrealized_pnl":0.0}
     for b in balances:
@@ -6,3 +9,136 @@ def aggregate(balances):
         totals["unrealized_pnl"] += b.get("unrealized_pnl",0.0)
     return totals
 
+
+# ===== Normalización de spot/margin/futures (un solo sitio para todos los exchanges) =====
+def _f(x, default=0.0):
+    try:
+        return float(x)
+    except Exception:
+        return default
+
+
+def _norm_futures_equity(data):
+    data.setdefault("spot", 0)
+    data.setdefault("margin", 0)
+    data.setdefault("futures", data.get("equity", 0))
+    return data
+
+
+def _norm_binance(data):
+    # balance incluye spot + futuros; initial_margin es lo que está en futuros
+    spot_balance = data.get("balance", 0) - data.get("initial_margin", 0)
+    data.update(
+        {
+            "spot": max(spot_balance, 0),  # Asegurar no negativo
+            "margin": 0,
+            "futures": data.get("initial_margin", 0),
+        }
+    )
+    return data
+
+
+def _norm_bybit(data):
+    data.setdefault("spot", 0)
+    data.setdefault("margin", data.get("margin_balance", 0))
+    data.setdefault("futures", 0)
+    return data
+
+
+def _norm_backpack(data):
+    data.setdefault("spot", data.get("balance", 0))
+    data.setdefault("margin", 0)
+    data.setdefault("futures", 0)
+    return data
+
+
+def _norm_kucoin(data):
+    # El adapter ya entrega la forma final (floats), no hay nested dicts
+    return {
+        "exchange": "kucoin",
+        "equity": _f(data.get("equity")),
+        "balance": _f(data.get("balance")),
+        "unrealized_pnl": _f(data.get("unrealized_pnl")),
+        "spot": _f(data.get("spot")),
+        "margin": _f(data.get("margin")),
+        "futures": _f(data.get("futures")),
+    }
+
+
+def _norm_gate(data):
+    gate_spot = sum(bal["available"] + bal["locked"] for bal in data.get("spot", []))
+    gate_futures = sum(fut["balance"] for fut in data.get("futures", []))
+    data.update(
+        {
+            "exchange": "gate",
+            "equity": gate_spot + gate_futures,
+            "balance": gate_spot + gate_futures,
+            "unrealized_pnl": sum(
+                fut["unrealized_pnl"] for fut in data.get("futures", [])
+            ),
+            "spot": gate_spot,
+            "margin": 0,
+            "futures": gate_futures,
+        }
+    )
+    return data
+
+
+BALANCE_NORMALIZERS = {
+    "aden": _norm_futures_equity,
+    "binance": _norm_binance,
+    "aster": _norm_futures_equity,
+    "extended": _norm_futures_equity,
+    "bingx": _norm_futures_equity,
+    "bybit": _norm_bybit,
+    "backpack": _norm_backpack,
+    "kucoin": _norm_kucoin,
+    "gate": _norm_gate,
+}
+
+
+def normalize_balance(exchange, data):
+    """Aplica la normalización del exchange (si tiene) y devuelve el dict o None si vino vacío."""
+    if not data:
+        return None
+    norm = BALANCE_NORMALIZERS.get(exchange)
+    return norm(data) if norm else data
+
+
+def iter_balances(fetchers, max_workers=8, timeout=20.0, timeouts=None):
+    """
+    Pide balances a todos los exchanges en paralelo. Por cada exchange que termina
+    entrega un evento con su balance normalizado y los totales parciales acumulados:
+      {"exchange", "status", "balance", "totals"}
+    Un exchange que falla o vence su deadline no rompe al resto.
+    """
+    balances = []
+    for name, data, st in iter_fan_out(
+        fetchers, max_workers=max_workers, timeout=timeout, timeouts=timeouts, pool="balances"
+    ):
+        balance = None
+        if st["status"] == "ok":
+            try:
+                balance = normalize_balance(name, data)
+            except Exception as e:
+                st = {**st, "status": "error", "error": f"normalize: {e}"}
+            if balance:
+                balances.append(balance)
+        yield {
+            "exchange": name,
+            "status": st,
+            "balance": balance,
+            "totals": aggregate(balances),
+        }
+
+
+def collect_balances(fetchers, max_workers=8, timeout=20.0, timeouts=None):
+    """Versión no-streaming: devuelve (balances, status) en el orden de 'fetchers'."""
+    by_ex = {}
+    status = {}
+    for ev in iter_balances(fetchers, max_workers, timeout, timeouts):
+        status[ev["exchange"]] = ev["status"]
+        if ev["balance"]:
+            by_ex[ev["exchange"]] = ev["balance"]
+    balances = [by_ex[ex] for ex in fetchers if ex in by_ex]
+    return balances, status
@@ -0,0 +1,170 @@
+# services/jobs.py
+"""
+Cola de jobs en segundo plano con prioridades.
+
+- submit(name, fn, priority) -> job_id  (prioridad menor = antes)
+- get(job_id) -> estado del job (queued / running / done / error)
+- progress(group) -> contadores para endpoints de readiness/progreso
+- key=... deduplica: si ya hay un job con esa key en cola o corriendo, se reutiliza
+
+Los jobs son dicts (igual que el resto del repo), no objetos.
+"""
+import itertools
+import queue
+import threading
+import time
+import traceback
+from typing import Any, Callable, Dict, List, Optional
+
+JOB_HISTORY_MAX = 500  # jobs terminados que se recuerdan para /api/jobs
+
+_QUEUES: Dict[str, "JobQueue"] = {}
+
+
+class JobQueue:
+    def __init__(self, name: str = "jobs", workers: int = 2):
+        self.name = name
+        self.workers = max(1, int(workers))
+        self._q: "queue.PriorityQueue" = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._order: List[str] = []
+        self._lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+        self._inflight: Dict[str, str] = {}  # key -> job_id (queued/running)
+        _QUEUES[name] = self
+
+    # ---------- ciclo de vida ----------
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                t = threading.Thread(
+                    target=self._worker, name=f"{self.name}-{i}", daemon=True
+                )
+                t.start()
+                self._threads.append(t)
+
+    def _worker(self):
+        while True:
+            _, _, job_id, fn = self._q.get()
+            job = self._jobs.get(job_id)
+            if job is None:
+                continue
+            job["status"] = "running"
+            job["started_at"] = time.time()
+            try:
+                job["result"] = fn()
+                job["status"] = "done"
+            except Exception as e:
+                job["status"] = "error"
+                job["error"] = str(e)
+                print(f"❌ Job {job['name']} ({job_id}) falló: {e}")
+                traceback.print_exc()
+            finally:
+                job["finished_at"] = time.time()
+                key = job.get("key")
+                if key is not None:
+                    with self._lock:
+                        if self._inflight.get(key) == job_id:
+                            del self._inflight[key]
+                self._q.task_done()
+
+    # ---------- API ----------
+    def submit(
+        self,
+        name: str,
+        fn: Callable[[], Any],
+        priority: int = 50,
+        group: Optional[str] = None,
+        key: Optional[str] = None,
+    ) -> str:
+        """
+        Encola fn y devuelve el id del job. Si se pasa key y ya hay un job idéntico
+        en cola o corriendo, no se encola otro: se devuelve el id del existente.
+        Arranca los workers si todavía no estaban en marcha.
+        """
+        job_id = f"{self.name}-{next(self._seq)}"
+        job = {
+            "id": job_id,
+            "name": name,
+            "key": key,
+            "group": group,
+            "priority": priority,
+            "status": "queued",
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "result": None,
+            "error": None,
+        }
+        with self._lock:
+            if key is not None and key in self._inflight:
+                return self._inflight[key]
+            if key is not None:
+                self._inflight[key] = job_id
+            self._jobs[job_id] = job
+            self._order.append(job_id)
+            self._trim_history()
+        self._q.put((priority, next(self._seq), job_id, fn))
+        self.start()
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self._jobs.get(job_id)
+        return dict(job) if job else None
+
+    def list(self, group: Optional[str] = None) -> List[Dict[str, Any]]:
+        with self._lock:
+            ids = list(self._order)
+        return [
+            dict(self._jobs[j])
+            for j in ids
+            if j in self._jobs and (group is None or self._jobs[j]["group"] == group)
+        ]
+
+    def progress(self, group: Optional[str] = None) -> Dict[str, int]:
+        counts = {"total": 0, "queued": 0, "running": 0, "done": 0, "error": 0}
+        for job in self.list(group):
+            counts["total"] += 1
+            counts[job["status"]] = counts.get(job["status"], 0) + 1
+        return counts
+
+    def _trim_history(self):
+        # Solo se olvidan jobs ya terminados, y de los más viejos a los más nuevos
+        excess = len(self._order) - JOB_HISTORY_MAX
+        if excess <= 0:
+            return
+        keep = []
+        for job_id in self._order:
+            job = self._jobs.get(job_id)
+            if excess > 0 and job and job["status"] in ("done", "error"):
+                del self._jobs[job_id]
+                excess -= 1
+                continue
+            keep.append(job_id)
+        self._order = keep
+
+
+def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    """Busca un job por id en todas las colas (el id lleva el nombre de la cola como prefijo)."""
+    for q in list(_QUEUES.values()):
+        job = q.get(job_id)
+        if job:
+            return job
+    return None
+
+
+def wait_for_port(host: str, port: int, timeout: float = 30.0, interval: float = 0.1) -> bool:
+    """Espera a que algo acepte conexiones en host:port (p.ej. el servidor Flask)."""
+    import socket
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=interval):
+                return True
+        except OSError:
+            time.sleep(interval)
+    return False
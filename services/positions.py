@@ -1,4 +1,129 @@
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+from utils.fanout import get_executor
+
 # aquí pones reconstrucción de cerradas desde trades y matching delta-neutral
 def match_delta_neutral(positions):
     # TODO: emparejar por (symbol_clean, abs(size)) FIFO
     return positions
+
+
+# ===== Snapshot compartido de posiciones abiertas por exchange =====
+
+
+def _copy(positions):
+    # los consumidores mutan las posiciones (overrides, enriquecido): nunca el snapshot
+    return [dict(p) if isinstance(p, dict) else p for p in positions or []]
+
+
+class PositionSnapshotStore:
+    """
+    Cache por exchange de la última respuesta de posiciones abiertas.
+
+    - edad <= ttl          -> se sirve el snapshot tal cual
+    - edad <= stale_ttl    -> se sirve el snapshot y se refresca en segundo plano
+    - más viejo / sin dato -> se pide al exchange (bloquea)
+    En todos los casos hay como mucho UNA llamada en vuelo por exchange
+    (single-flight): los demás consumidores esperan a esa misma llamada, pero
+    como mucho wait_timeout (wait_timeouts[exchange]); pasado ese tiempo se les
+    sirve el último snapshot aunque sea viejo o, si no hay, TimeoutError.
+    """
+
+    def __init__(
+        self,
+        fetchers: dict,
+        ttl: float = 10.0,
+        stale_ttl: float = 120.0,
+        wait_timeout: float = 20.0,
+        wait_timeouts: dict = None,
+    ):
+        self.fetchers = fetchers  # {exchange: callable} (se consulta en cada llamada)
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.wait_timeout = wait_timeout
+        self.wait_timeouts = wait_timeouts or {}
+        self._snaps = {}  # exchange -> {"positions": list, "ts": float}
+        self._inflight = {}  # exchange -> Future
+        self._lock = threading.Lock()
+
+    def get(self, exchange: str, force: bool = False) -> list:
+        exchange = (exchange or "").lower()
+        snap = self._snaps.get(exchange)
+        if snap is not None and not force:
+            age = time.time() - snap["ts"]
+            if age <= self.ttl:
+                return _copy(snap["positions"])
+            if age <= self.stale_ttl:
+                self._refresh_async(exchange)
+                return _copy(snap["positions"])
+        return _copy(self.refresh(exchange))
+
+    def refresh(self, exchange: str) -> list:
+        """Pide posiciones al exchange (o espera a la petición que ya esté en vuelo)."""
+        fut, owner = self._claim(exchange)
+        if owner:
+            self._run(exchange, fut)
+            return fut.result()
+        timeout = self.wait_timeouts.get(exchange, self.wait_timeout)
+        try:
+            return fut.result(timeout=timeout)
+        except FutureTimeout:
+            # la llamada en vuelo está colgada: no se bloquea a este consumidor con ella
+            snap = self._snaps.get(exchange)
+            if snap is not None:
+                return snap["positions"]
+            raise TimeoutError(f"{exchange}: posiciones en vuelo sin respuesta tras {timeout}s")
+
+    def _refresh_async(self, exchange: str):
+        fut, owner = self._claim(exchange)
+        if owner:
+            get_executor("snapshots", 4).submit(self._run, exchange, fut)
+
+    def _claim(self, exchange: str):
+        with self._lock:
+            fut = self._inflight.get(exchange)
+            if fut is not None:
+                return fut, False
+            fut = Future()
+            self._inflight[exchange] = fut
+            return fut, True
+
+    def _run(self, exchange: str, fut: Future):
+        try:
+            fetch = self.fetchers.get(exchange)
+            if not fetch:
+                raise KeyError(f"No hay función de posiciones para {exchange}")
+            positions = fetch() or []
+            self._snaps[exchange] = {"positions": list(positions), "ts": time.time()}
+            fut.set_result(positions)
+        except Exception as e:
+            # un refresh fallido no borra el snapshot anterior
+            fut.set_exception(e)
+        finally:
+            with self._lock:
+                if self._inflight.get(exchange) is fut:
+                    del self._inflight[exchange]
+
+    def peek(self, exchange: str):
+        """Snapshot sin pedir nada: (positions, ts) o (None, None)."""
+        snap = self._snaps.get((exchange or "").lower())
+        if not snap:
+            return None, None
+        return _copy(snap["positions"]), snap["ts"]
+
+    def invalidate(self, exchange: str = None):
+        if exchange is None:
+            self._snaps.clear()
+        else:
+            self._snaps.pop((exchange or "").lower(), None)
+
+    def active_exchanges(self, max_age: float) -> set:
+        """Exchanges con posiciones abiertas según snapshots no más viejos que max_age."""
+        now = time.time()
+        return {
+            ex
+            for ex, snap in list(self._snaps.items())
+            if snap["positions"] and now - snap["ts"] <= max_age
+        }
@@ -0,0 +1,138 @@
+# services/stream.py
+"""
+Poller compartido para /api/stream (SSE).
+
+Un solo bucle en segundo plano pide posiciones y balances por exchange y publica
+SOLO lo que cambió a todos los suscriptores (pestañas abiertas). Con N pestañas
+la carga sobre los exchanges es la misma que con una.
+"""
+import queue
+import threading
+import time
+from typing import Callable, Dict
+
+from utils.fanout import iter_fan_out
+from utils.jsonfast import dumps
+
+SUBSCRIBER_QUEUE_MAX = 200  # eventos pendientes por pestaña antes de desconectarla
+
+# Último evento de una pestaña desconectada por lenta: quien lee la cola debe
+# terminar la respuesta (EventSource reconecta y recibe el estado completo)
+CLOSE = {"type": "close"}
+
+
+def _fingerprint(data) -> str:
+    return dumps(data, default=str, sort_keys=True)
+
+
+class LivePoller:
+    def __init__(
+        self,
+        positions_tasks: Callable[[], Dict[str, Callable]],
+        balances_tasks: Callable[[], Dict[str, Callable]],
+        normalize_balance: Callable = None,
+        interval: float = 15.0,
+        timeout: float = 20.0,
+        max_workers: int = 8,
+    ):
+        self.positions_tasks = positions_tasks  # () -> {exchange: fn}
+        self.balances_tasks = balances_tasks  # () -> {exchange: fn}
+        self.normalize_balance = normalize_balance
+        self.interval = interval
+        self.timeout = timeout
+        self.max_workers = max_workers
+        self._subs = []
+        self._lock = threading.Lock()
+        self._state = {"positions": {}, "balances": {}}
+        self._prints = {}
+        self._thread = None
+
+    # ---------- suscriptores ----------
+    def subscribe(self) -> "queue.Queue":
+        q = queue.Queue(maxsize=SUBSCRIBER_QUEUE_MAX)
+        # estado actual completo para que la pestaña pinte al conectar
+        with self._lock:
+            for kind in ("positions", "balances"):
+                for ex, data in self._state[kind].items():
+                    q.put_nowait({"type": kind, "exchange": ex, "data": data})
+            self._subs.append(q)
+        self._ensure_started()
+        return q
+
+    def unsubscribe(self, q):
+        with self._lock:
+            if q in self._subs:
+                self._subs.remove(q)
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len(self._subs)
+
+    def _publish(self, event: dict):
+        with self._lock:
+            subs = list(self._subs)
+        for q in subs:
+            try:
+                q.put_nowait(event)
+            except queue.Full:
+                # pestaña que no consume: se desconecta y se le avisa con CLOSE
+                # para que cierre el stream (y EventSource reconecte)
+                self.unsubscribe(q)
+                self._close(q)
+
+    @staticmethod
+    def _close(q: "queue.Queue"):
+        while True:
+            try:
+                q.get_nowait()
+            except queue.Empty:
+                break
+        try:
+            q.put_nowait(CLOSE)
+        except queue.Full:
+            pass
+
+    # ---------- bucle ----------
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="live-poller", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            if self.subscriber_count() == 0:
+                time.sleep(1.0)
+                continue
+            t0 = time.monotonic()
+            try:
+                self.poll_once()
+            except Exception as e:
+                print(f"⚠️ LivePoller error: {e}")
+            time.sleep(max(0.0, self.interval - (time.monotonic() - t0)))
+
+    def poll_once(self):
+        self._poll_kind("positions", self.positions_tasks())
+        self._poll_kind("balances", self.balances_tasks())
+
+    def _poll_kind(self, kind: str, tasks: Dict[str, Callable]):
+        for ex, data, st in iter_fan_out(
+            tasks,
+            max_workers=self.max_workers,
+            timeout=self.timeout,
+            pool=f"stream_{kind}",
+        ):
+            if st["status"] != "ok":
+                self._publish({"type": "status", "kind": kind, "exchange": ex, "status": st})
+                continue
+            if kind == "balances" and self.normalize_balance:
+                data = self.normalize_balance(ex, data)
+            fp = _fingerprint(data)
+            if self._prints.get((kind, ex)) == fp:
+                continue  # sin cambios -> no se envía nada
+            self._prints[(kind, ex)] = fp
+            with self._lock:
+                self._state[kind][ex] = data
+            self._publish({"type": kind, "exchange": ex, "data": data})
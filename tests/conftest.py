@@ -0,0 +1,6 @@
+# tests/conftest.py
+import os
+import sys
+
+# la raíz del repo (db_manager, utils, adapters) importable desde los tests
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,71 @@
+# tests/test_async_adapters.py
+import asyncio
+import threading
+import time
+
+from adapters.base import WrappedAdapter, gather_adapters
+from utils.async_http import run_coro
+from utils.fanout import fan_out
+
+
+def test_gather_timeout_does_not_stack_threads():
+    calls = []
+    release = threading.Event()
+
+    def hang():
+        calls.append(1)
+        release.wait(5)
+        return [{"symbol": "BTC"}]
+
+    adapter = WrappedAdapter("ex", positions=hang, pools={"positions": ("t_async_hang", 4)})
+    for _ in range(3):
+        _, status = run_coro(gather_adapters([adapter], "fetch_open_positions", timeout=0.1))
+        assert status["ex"]["status"] == "timeout"
+    # los tres refrescos esperaron a la misma llamada colgada
+    assert len(calls) == 1
+    release.set()
+
+
+def test_async_and_sync_paths_share_the_inflight_call():
+    calls = []
+    release = threading.Event()
+
+    def slow():
+        calls.append(1)
+        release.wait(5)
+        return ["pos"]
+
+    adapter = WrappedAdapter("ex", positions=slow, pools={"positions": ("t_async_shared", 4)})
+    out = {}
+    t = threading.Thread(
+        target=lambda: out.update(
+            sync=fan_out({"ex": slow}, timeout=5, pool="t_async_shared")[0]
+        )
+    )
+    t.start()
+    time.sleep(0.05)
+    threading.Timer(0.1, release.set).start()
+    results, status = run_coro(gather_adapters([adapter], "fetch_open_positions", timeout=5))
+    t.join()
+    assert results == {"ex": ["pos"]}
+    assert out["sync"] == {"ex": ["pos"]}
+    assert len(calls) == 1
+
+
+def test_funding_windows_are_not_shared():
+    release = threading.Event()
+    seen = []
+
+    def pull(since):
+        seen.append(since)
+        release.wait(5)
+        return [since]
+
+    adapter = WrappedAdapter("ex", funding=pull, pools={"funding": ("t_async_fund", 4)})
+
+    async def both():
+        return await asyncio.gather(adapter.fetch_funding(1), adapter.fetch_funding(2))
+
+    threading.Timer(0.1, release.set).start()
+    assert run_coro(both(), timeout=5) == [[1], [2]]
+    assert sorted(seen) == [1, 2]
@@ -0,0 +1,73 @@
+# tests/test_clock.py
+import pytest
+
+from utils import clock
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    for name in ("_SOURCES", "_OFFSETS", "_MEASURED_AT"):
+        monkeypatch.setattr(clock, name, {})
+    monkeypatch.setattr(clock, "_REFRESHING", set())
+    monkeypatch.setattr(clock, "_local_ms", lambda: 1_000_000)
+
+
+def test_offset_is_measured_once_and_cached():
+    calls = []
+    clock.register_time_source("ex", lambda: calls.append(1) or 1_000_250)
+    assert clock.offset_ms("ex") == 250
+    assert clock.server_now_ms("ex") == 1_000_250
+    assert len(calls) == 1  # la segunda llamada sale de la caché
+
+
+def test_failed_measure_keeps_previous_offset_and_is_not_retried_inline():
+    clock.register_time_source("ex", lambda: 1_000_100)
+    assert clock.offset_ms("ex") == 100
+    clock.register_time_source("ex", lambda: 1 / 0)
+    clock._MEASURED_AT["ex"] = 0  # fuerza el re-medido
+    assert clock.measure("ex") == 100
+
+    calls = []
+    clock.register_time_source("nuevo", lambda: calls.append(1) or 1 / 0)
+    assert clock.offset_ms("nuevo") == 0
+    assert clock.offset_ms("nuevo") == 0
+    assert len(calls) == 1  # el fallo también cuenta como medido
+
+
+def test_resync_is_rate_limited():
+    offsets = iter([10, 20, 30])
+    clock.register_time_source("ex", lambda: 1_000_000 + next(offsets))
+    assert clock.offset_ms("ex") == 10
+    assert clock.resync("ex") == 10  # recién medido: no se vuelve a pedir
+    clock._MEASURED_AT["ex"] -= clock.CLOCK_MIN_RESYNC_SEC + 1
+    assert clock.resync("ex") == 20
+
+
+class Resp:
+    def __init__(self, status, text):
+        self.status_code, self.text = status, text
+
+
+def test_with_clock_retry_resyncs_and_resends_once():
+    offsets = iter([0, 500])
+    clock.register_time_source("ex", lambda: 1_000_000 + next(offsets))
+    clock.offset_ms("ex")
+    clock._MEASURED_AT["ex"] -= clock.CLOCK_MIN_RESYNC_SEC + 1
+    sent = []
+
+    def send():
+        sent.append(clock.offset_ms("ex"))
+        if len(sent) == 1:
+            return Resp(400, '{"code":-1021,"msg":"Timestamp for this request is outside of the recvWindow."}')
+        return Resp(200, "ok")
+
+    assert clock.with_clock_retry("ex", send).status_code == 200
+    assert sent == [0, 500]  # el reenvío firma con el offset nuevo
+
+
+def test_is_timestamp_error():
+    assert clock.is_timestamp_error(Resp(400, "KC-API-TIMESTAMP invalid"))
+    assert not clock.is_timestamp_error(Resp(200, "recvWindow"))
+    assert not clock.is_timestamp_error(Resp(500, "internal error"))
+    assert clock.is_timestamp_error("Server Timestamp out of range")
+    assert not clock.is_timestamp_error(None)
@@ -0,0 +1,90 @@
+# tests/test_closed_dedupe.py
+import pytest
+
+import db_manager
+from utils.dbconn import close_pooled_connections, db_connect
+
+
+@pytest.fixture
+def closed_db(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "portfolio.db")
+    monkeypatch.setattr(db_manager, "DB_PATH", db_path)
+    db_manager.init_db()
+    yield db_path
+    close_pooled_connections()
+
+
+def _pos(symbol="BTCUSDT", close_time=2000, size=1.0):
+    return {
+        "exchange": "okx", "symbol": symbol, "side": "long", "size": size,
+        "entry_price": 100.0, "close_price": 110.0,
+        "open_time": 1000, "close_time": close_time, "realized_pnl": 10.0,
+    }
+
+
+def test_bulk_save_ignores_duplicates(closed_db):
+    assert db_manager.save_closed_positions_bulk([_pos(), _pos(close_time=3000)]) == 2
+    # la misma posición otra vez (size con ruido de redondeo) no se inserta
+    assert db_manager.save_closed_positions_bulk([_pos(size=1.0000001), _pos("ETHUSDT")]) == 1
+    conn = db_connect(closed_db)
+    assert conn.execute("SELECT COUNT(*) FROM closed_positions").fetchone()[0] == 3
+    conn.close()
+
+
+def test_bulk_save_raises_and_rolls_back_caller_work(closed_db):
+    db_manager.save_closed_positions_bulk([_pos()])
+    conn = db_connect(closed_db)
+    conn.execute(
+        "CREATE TRIGGER boom BEFORE INSERT ON closed_positions "
+        "BEGIN SELECT RAISE(ABORT, 'boom'); END"
+    )
+    conn.commit()
+    conn.execute("DELETE FROM closed_positions")  # trabajo del llamante en la misma transacción
+    with pytest.raises(Exception, match="boom"):
+        db_manager.save_closed_positions_bulk([_pos("ETHUSDT")], conn=conn)
+    conn.close()
+    conn = db_connect(closed_db)
+    assert conn.execute("SELECT COUNT(*) FROM closed_positions").fetchone()[0] == 1
+    conn.close()
+
+
+def test_rows_without_key_are_backfilled_on_every_startup(closed_db):
+    conn = db_connect(closed_db)
+    insert = (
+        "INSERT INTO closed_positions (exchange, symbol, side, size, open_time, close_time) "
+        "VALUES ('okx', 'BTCUSDT', 'long', 1.0, 1000, ?)"
+    )
+    conn.execute(insert, (2000,))
+    conn.execute(insert, (2000,))  # duplicado: se queda sin llave
+    conn.execute(insert, (3000,))
+    conn.commit()
+    conn.close()
+
+    db_manager.init_db()  # segundo arranque sobre una BD ya migrada
+
+    conn = db_connect(closed_db)
+    keys = [r[0] for r in conn.execute("SELECT dedupe_key FROM closed_positions ORDER BY id")]
+    assert keys == [
+        db_manager.closed_position_key("okx", "BTCUSDT", "long", 1000, 2000, 1.0),
+        None,
+        db_manager.closed_position_key("okx", "BTCUSDT", "long", 1000, 3000, 1.0),
+    ]
+    plan = " ".join(
+        r[-1]
+        for r in conn.execute(
+            "EXPLAIN QUERY PLAN SELECT id FROM closed_positions WHERE dedupe_key IS NULL"
+        )
+    )
+    assert "ix_closed_no_dedupe" in plan
+    conn.close()
+
+
+def test_closed_position_exists(closed_db):
+    db_manager.save_closed_positions_bulk([_pos()])
+    conn = db_connect(closed_db)
+    cur = conn.cursor()
+    assert db_manager.closed_position_exists(cur, "okx", "BTCUSDT", 2000)
+    assert db_manager.closed_position_exists(cur, "okx", "BTCUSDT", 2000, side="long")
+    assert not db_manager.closed_position_exists(cur, "okx", "BTCUSDT", 2000, side="short")
+    assert not db_manager.closed_position_exists(cur, "okx", "BTCUSDT", 2001)
+    conn.close()
@@ -0,0 +1,60 @@
+# tests/test_closed_query_plans.py
+"""
+Regresión de planes: las consultas calientes de closed_positions tienen que ir
+por índice sobre una BD creada con init_db(), y sus llamadores tienen que usar
+las constantes de db_manager (no una copia del SQL que el EXPLAIN no ve).
+"""
+import pathlib
+import re
+
+import db_manager
+from utils.dbconn import close_pooled_connections
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+CALLERS = [ROOT / "portfolio.py", *sorted((ROOT / "adapters").glob("*.py"))]
+
+# constante -> cómo aparece su uso en los llamadores (regex)
+HOT_SQL_USERS = {
+    "CLOSED_POSITIONS_LIST_SQL": r"execute\(CLOSED_POSITIONS_LIST_SQL\b",
+    "RECENT_CLOSED_EXCHANGES_SQL": r"execute\(RECENT_CLOSED_EXCHANGES_SQL\b",
+    "KUCOIN_CLOSED_SYMBOLS_SQL": r"execute\(KUCOIN_CLOSED_SYMBOLS_SQL\b",
+    "CLOSED_EXISTS_SQL": r"closed_position_exists\((?![^)]*side=)",
+    "CLOSED_EXISTS_SIDE_SQL": r"closed_position_exists\([^)]*side=",
+    "CLOSED_EXISTS_EXACT_SQL": r"execute\(CLOSED_EXISTS_EXACT_SQL\b",
+}
+
+# un check de existencia escrito a mano en un llamador
+HAND_WRITTEN_EXISTS = re.compile(
+    r"SELECT\s+(COUNT\(\*\)|1)\s+FROM\s+closed_positions\s+WHERE\s+exchange", re.I
+)
+
+
+def _code(path):
+    # sin líneas comentadas (kucoin conserva versiones antiguas comentadas)
+    return "\n".join(
+        line for line in path.read_text(encoding="utf-8").splitlines()
+        if not line.lstrip().startswith("#")
+    )
+
+
+def test_closed_hot_queries_use_indexes(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "portfolio.db")
+    monkeypatch.setattr(db_manager, "DB_PATH", db_path)
+    try:
+        db_manager.init_db()
+        assert db_manager.check_closed_query_plans(db_path) == []
+    finally:
+        close_pooled_connections()
+
+
+def test_every_hot_query_is_a_constant_used_by_callers():
+    hot = {sql for sql, _params in db_manager.CLOSED_HOT_QUERIES.values()}
+    assert hot == {getattr(db_manager, name) for name in HOT_SQL_USERS}
+    code = "\n".join(_code(p) for p in CALLERS)
+    for name, use in HOT_SQL_USERS.items():
+        assert re.search(use, code), f"{name} sin llamadores"
+
+
+def test_callers_do_not_hand_write_the_exists_check():
+    offenders = [p.name for p in CALLERS if HAND_WRITTEN_EXISTS.search(_code(p))]
+    assert offenders == []
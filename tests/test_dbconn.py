@@ -0,0 +1,103 @@
+# tests/test_dbconn.py
+import os
+import sqlite3
+import threading
+
+import pytest
+
+from utils import dbconn
+from utils.dbconn import close_pooled_connections, db_connect
+
+
+@pytest.fixture
+def db(tmp_path):
+    path = str(tmp_path / "t.db")
+    conn = db_connect(path)
+    conn.execute("CREATE TABLE t (x INTEGER)")
+    conn.commit()
+    conn.close()
+    yield path
+    close_pooled_connections()
+
+
+def test_connections_are_tuned_and_reused(db):
+    conn = db_connect(db)
+    raw = conn._conn
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert conn.execute("PRAGMA busy_timeout").fetchone()[0] == dbconn.SQLITE_BUSY_TIMEOUT_MS
+    conn.close()
+    again = db_connect(db)
+    assert again._conn is raw  # LIFO: la misma conexión, ya configurada
+    again.close()
+
+
+def test_nested_checkouts_never_share_a_connection(db):
+    outer = db_connect(db)
+    outer.execute("INSERT INTO t VALUES (1)")  # transacción abierta en la de fuera
+    inner = db_connect(db)
+    assert inner._conn is not outer._conn
+    inner.execute("SELECT COUNT(*) FROM t").fetchone()
+    inner.rollback()  # no toca la transacción de fuera
+    inner.close()
+    outer.commit()
+    outer.close()
+    check = db_connect(db)
+    assert check.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 1
+    check.close()
+
+
+def test_close_rolls_back_and_resets_connection_state(db):
+    conn = db_connect(db)
+    conn.row_factory = sqlite3.Row
+    conn.execute("INSERT INTO t VALUES (2)")
+    conn.close()  # sin commit: como cerrar una conexión de verdad
+    conn.close()  # idempotente
+    again = db_connect(db)
+    assert again.row_factory is None
+    assert again.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 0
+    again.close()
+
+
+def test_with_block_commits_without_closing(db):
+    conn = db_connect(db)
+    with conn:
+        conn.execute("INSERT INTO t VALUES (3)")
+    with pytest.raises(ZeroDivisionError):
+        with conn:
+            conn.execute("INSERT INTO t VALUES (4)")
+            1 / 0
+    assert conn.execute("SELECT x FROM t").fetchall() == [(3,)]
+    conn.close()
+
+
+def test_pool_is_shared_across_threads_and_bounded(db, monkeypatch):
+    monkeypatch.setattr(dbconn, "SQLITE_POOL_IDLE", 2)
+    conn = db_connect(db)
+    raw = conn._conn
+    conn.close()
+    seen = []
+
+    def other_thread():
+        c = db_connect(db)
+        seen.append(c._conn)
+        c.execute("SELECT 1").fetchone()  # check_same_thread=False
+        c.close()
+
+    t = threading.Thread(target=other_thread)
+    t.start()
+    t.join()
+    assert seen == [raw]
+
+    conns = [db_connect(db) for _ in range(4)]
+    for c in conns:
+        c.close()
+    assert len(dbconn._POOLS[os.path.abspath(db)]) == 2
+
+
+def test_memory_databases_are_not_pooled():
+    a, b = db_connect(":memory:"), db_connect(":memory:")
+    assert isinstance(a, sqlite3.Connection)
+    a.execute("CREATE TABLE only_a (x)")
+    assert b.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()[0] == 0
+    a.close()
+    b.close()
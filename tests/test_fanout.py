@@ -0,0 +1,114 @@
+# tests/test_fanout.py
+import threading
+import time
+
+import pytest
+
+from utils.fanout import fan_out, gather_ordered, get_executor
+
+
+def test_results_and_errors_per_task():
+    results, status = fan_out(
+        {"a": lambda: 1, "b": lambda: 1 / 0}, timeout=5, pool="t_basic"
+    )
+    assert results == {"a": 1}
+    assert status["a"]["status"] == "ok"
+    assert status["b"]["status"] == "error"
+    assert "division" in status["b"]["error"]
+
+
+def test_timeout_counts_from_start_not_submit():
+    gate = threading.Event()
+    busy = get_executor("t_queue", 1).submit(gate.wait, 5)  # ocupa el único hilo
+    started = time.monotonic()
+    threading.Timer(0.3, gate.set).start()
+    results, status = fan_out(
+        {"slow": lambda: time.sleep(0.2) or "ok"}, max_workers=1, timeout=0.5, pool="t_queue"
+    )
+    busy.result()
+    # 0.3 s en cola + 0.2 s corriendo > 0.5 s desde el envío, pero < 0.5 s desde que empezó
+    assert time.monotonic() - started >= 0.5
+    assert results == {"slow": "ok"}
+    assert status["slow"]["status"] == "ok"
+
+
+def test_hung_task_is_joined_not_resubmitted():
+    calls = []
+    release = threading.Event()
+
+    def hang():
+        calls.append(1)
+        release.wait(5)
+        return len(calls)
+
+    _, st1 = fan_out({"ex": hang}, timeout=0.1, pool="t_hang")
+    _, st2 = fan_out({"ex": hang}, timeout=0.1, pool="t_hang")
+    assert st1["ex"]["status"] == st2["ex"]["status"] == "timeout"
+    assert len(calls) == 1
+    release.set()
+    time.sleep(0.05)
+    # la tarea colgada ya terminó: la siguiente llamada sale de nuevo
+    results, _ = fan_out({"ex": hang}, timeout=1, pool="t_hang")
+    assert results["ex"] == 2
+
+
+def test_variants_do_not_share_inflight_tasks():
+    release = threading.Event()
+    t = threading.Thread(
+        target=fan_out,
+        args=({"ex": lambda: release.wait(5) and "old"},),
+        kwargs={"timeout": 5, "pool": "t_var"},
+    )
+    t.start()
+    time.sleep(0.05)
+    results, _ = fan_out(
+        {"ex": lambda: "new"}, timeout=5, pool="t_var", variants={"ex": "fresh"}
+    )
+    release.set()
+    t.join()
+    assert results == {"ex": "new"}
+
+
+def test_gather_ordered_keeps_order_and_bounds_concurrency():
+    lock = threading.Lock()
+    cur, peak = [0], [0]
+
+    def fn(i):
+        with lock:
+            cur[0] += 1
+            peak[0] = max(peak[0], cur[0])
+        time.sleep(0.02 * (5 - i % 5))
+        with lock:
+            cur[0] -= 1
+        return i * 10
+
+    out = gather_ordered(fn, list(range(10)), 3, pool="t_gather", pool_size=8)
+    assert out == [i * 10 for i in range(10)]
+    assert peak[0] <= 3
+
+
+def test_gather_ordered_raises_first_error_after_all_finish():
+    done = []
+
+    def fn(i):
+        time.sleep(0.01)
+        done.append(i)
+        if i in (2, 4):
+            raise ValueError(i)
+        return i
+
+    with pytest.raises(ValueError) as err:
+        gather_ordered(fn, list(range(6)), 3, pool="t_err", pool_size=4)
+    assert err.value.args == (2,)
+    assert sorted(done) == list(range(6))
+
+
+def test_gather_ordered_runs_inline_when_nested():
+    def outer(i):
+        inner = gather_ordered(
+            lambda j: threading.current_thread().name, [0, 1], 2, pool="t_nest", pool_size=1
+        )
+        return inner
+
+    out = gather_ordered(outer, [0, 1], 2, pool="t_nest", pool_size=1)
+    assert all(name.startswith("t_nest") for names in out for name in names)
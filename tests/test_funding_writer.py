@@ -0,0 +1,81 @@
+# tests/test_funding_writer.py
+from concurrent.futures import Future
+
+import pytest
+
+import db_manager
+from utils.dbconn import close_pooled_connections, db_connect
+
+
+@pytest.fixture
+def funding_db(tmp_path):
+    db_path = str(tmp_path / "portfolio.db")
+    db_manager.init_funding_db(db_path)
+    conn = db_connect(db_path)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS funding_sync_state ("
+        "exchange TEXT PRIMARY KEY, last_run_ms INTEGER, last_ingested_ms INTEGER)"
+    )
+    conn.commit()
+    conn.close()
+    yield db_path
+    close_pooled_connections()
+
+
+def _ev(ex, ts, ext_id):
+    return {"exchange": ex, "symbol": "BTC", "income": 1.5, "timestamp": ts, "external_id": ext_id}
+
+
+def _traced_connect(statements):
+    def _connect(path):
+        conn = db_connect(path)
+        conn.set_trace_callback(statements.append)
+        return conn
+
+    return _connect
+
+
+def test_batch_is_one_transaction_and_bad_exchange_is_isolated(funding_db, monkeypatch):
+    statements = []
+    monkeypatch.setattr(db_manager, "db_connect", _traced_connect(statements))
+    writer = db_manager.FundingWriter(db_path=funding_db)
+    batch = [
+        ("okx", [_ev("okx", 1_700_000_000_000, "a"), _ev("okx", 1_700_000_000_001, "b")], 10, 20, Future()),
+        ("bad", [None], 10, None, Future()),  # evento inválido -> falla solo este exchange
+        ("bybit", [_ev("bybit", 1_700_000_000_002, "c")], 10, None, Future()),
+    ]
+    writer._write(batch)
+
+    assert batch[0][-1].result() == 2
+    assert batch[2][-1].result() == 1
+    with pytest.raises(Exception):
+        batch[1][-1].result()
+
+    upper = [s.strip().upper() for s in statements]
+    assert upper.count("BEGIN") == 1
+    assert upper.count("COMMIT") == 1
+
+    conn = db_connect(funding_db)
+    assert conn.execute("SELECT COUNT(*) FROM funding_events").fetchone()[0] == 3
+    state = dict(conn.execute("SELECT exchange, last_ingested_ms FROM funding_sync_state"))
+    conn.close()
+    assert state == {"okx": 20, "bybit": None}
+
+
+def test_duplicates_are_not_counted(funding_db):
+    writer = db_manager.FundingWriter(db_path=funding_db)
+    first, second = Future(), Future()
+    events = [_ev("okx", 1_700_000_000_000, "a")]
+    writer._write([("okx", events, 1, None, first)])
+    writer._write([("okx", events, 2, None, second)])
+    assert first.result() == 1
+    assert second.result() == 0
+
+
+def test_unexpected_failure_resolves_every_future(tmp_path):
+    writer = db_manager.FundingWriter(db_path=str(tmp_path / "missing" / "x.db"))
+    fut = writer.submit("okx", [_ev("okx", 1, "a")], 1, None)
+    with pytest.raises(Exception):
+        fut.result(timeout=5)
+    # el hilo escritor sigue vivo para el siguiente lote
+    assert writer._thread.is_alive()
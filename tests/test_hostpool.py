@@ -0,0 +1,70 @@
+# tests/test_hostpool.py
+from utils import hostpool
+from utils.hostpool import HostPool
+
+A, B, C = "fapi.a.com", "fapi.b.com", "fapi.c.com"
+
+
+def _pool(latencies=None):
+    pool = HostPool("aster", [A, B, C, A], interval=0)  # sin hilo de sondeo
+    for host, lat in (latencies or {}).items():
+        pool.record_success(host, lat)
+    return pool
+
+
+def test_unmeasured_hosts_keep_configured_order():
+    pool = _pool()
+    assert pool.hosts == [A, B, C]  # duplicados fuera
+    assert pool.ordered() == [A, B, C]
+
+
+def test_sticky_until_another_host_is_clearly_faster():
+    pool = _pool({A: 0.100, B: 0.080, C: 0.300})
+    assert pool.current() == B
+    pool.record_success(A, 0.070)  # EWMA: A ≈ 0.091, no mejora lo bastante a B
+    assert pool.current() == B
+    for _ in range(10):
+        pool.record_success(A, 0.010)
+    assert pool.current() == A  # ahora sí: < 60 % de la latencia de B
+
+
+def test_failure_fails_over_and_does_not_bounce_back():
+    pool = _pool({A: 0.050, B: 0.100, C: 0.300})
+    assert pool.current() == A
+    pool.record_failure(A, "timeout")
+    # A sigue sano (1 fallo) y su puntuación puede seguir siendo la mejor,
+    # pero la siguiente request no vuelve justo al host que acaba de fallar
+    assert pool.current() == B
+    assert pool.current() == B
+
+
+def test_down_hosts_go_last_until_retry_window(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(hostpool.time, "monotonic", lambda: now[0])
+    pool = _pool({A: 0.050, B: 0.100, C: 1.000})
+    for _ in range(hostpool.HOST_FAIL_THRESHOLD):
+        pool.record_failure(A, "502")
+    assert pool.ordered() == [B, C, A]  # caído: detrás incluso del lento
+    assert pool.status()[A]["healthy"] is False
+    now[0] += hostpool.HOST_RETRY_AFTER_SEC + 1
+    # vuelve a considerarse, penalizado por su tasa de error (0.05 s -> ~0.38 s)
+    assert pool.ordered() == [B, A, C]
+    assert pool.status()[A]["healthy"] is True
+
+
+def test_real_requests_do_not_move_latency():
+    pool = _pool({A: 0.050})
+    pool.record_success(A)  # request real: solo éxito, sin latencia
+    assert pool.status()[A]["latency_ms"] == 50
+
+
+def test_probe_host_records_latency_and_failures():
+    def probe(host):
+        if host == C:
+            raise ConnectionError("refused")
+
+    pool = HostPool("aster", [A, C], probe=probe, interval=0)
+    assert pool.probe_all() == {A: True, C: False}
+    st = pool.status()
+    assert st[A]["latency_ms"] is not None
+    assert st[C]["consecutive_failures"] == 1 and "refused" in st[C]["last_error"]
@@ -0,0 +1,76 @@
+# tests/test_jobs.py
+import threading
+import time
+
+from services import jobs
+from services.jobs import JobQueue, get_job
+
+
+def _wait_idle(q, group=None, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        p = q.progress(group)
+        if p["queued"] == p["running"] == 0:
+            return p
+        time.sleep(0.01)
+    raise AssertionError(f"la cola {q.name} no terminó: {q.progress(group)}")
+
+
+def test_same_key_is_deduplicated_while_inflight():
+    q = JobQueue("t_dedupe", workers=1)
+    release = threading.Event()
+    first = q.submit("sync:okx", lambda: release.wait(5), key="okx")
+    again = q.submit("sync:okx", lambda: "otro", key="okx")
+    other = q.submit("sync:gate", lambda: "gate", key="gate")
+    assert again == first and other != first
+    release.set()
+    _wait_idle(q)
+    # ya terminó: la misma key vuelve a encolar
+    assert q.submit("sync:okx", lambda: "nuevo", key="okx") != first
+    _wait_idle(q)
+
+
+def test_lower_priority_value_runs_first():
+    q = JobQueue("t_priority", workers=1)
+    release = threading.Event()
+    order = []
+    q.submit("blocker", lambda: release.wait(5), priority=0)  # ocupa el único worker
+    time.sleep(0.05)
+    q.submit("closed", lambda: order.append("closed"), priority=50)
+    q.submit("funding", lambda: order.append("funding"), priority=20)
+    q.submit("positions", lambda: order.append("positions"), priority=10)
+    q.submit("positions2", lambda: order.append("positions2"), priority=10)
+    release.set()
+    _wait_idle(q)
+    # misma prioridad: orden de llegada
+    assert order == ["positions", "positions2", "funding", "closed"]
+
+
+def test_get_job_status_result_and_error():
+    q = JobQueue("t_get", workers=2)
+    ok = q.submit("ok", lambda: 42, group="startup")
+    bad = q.submit("bad", lambda: 1 / 0, group="startup")
+    q.submit("other", lambda: None, group="manual")
+    _wait_idle(q)
+    assert get_job(ok)["status"] == "done" and get_job(ok)["result"] == 42
+    assert get_job(bad)["status"] == "error" and "division" in get_job(bad)["error"]
+    assert get_job("t_get-999999") is None
+    assert q.progress("startup") == {"total": 2, "queued": 0, "running": 0, "done": 1, "error": 1}
+    # get devuelve una copia
+    get_job(ok)["status"] = "queued"
+    assert get_job(ok)["status"] == "done"
+
+
+def test_history_only_forgets_finished_jobs(monkeypatch):
+    monkeypatch.setattr(jobs, "JOB_HISTORY_MAX", 3)
+    q = JobQueue("t_trim", workers=1)
+    release = threading.Event()
+    blocker = q.submit("blocker", lambda: release.wait(5))
+    done = [q.submit(f"j{i}", lambda: None) for i in range(2)]
+    release.set()
+    _wait_idle(q)
+    newest = [q.submit(f"n{i}", lambda: None) for i in range(2)]
+    _wait_idle(q)
+    kept = [j["id"] for j in q.list()]
+    assert len(kept) == 3
+    assert kept == done[1:] + newest and blocker not in kept
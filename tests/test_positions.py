@@ -0,0 +1,79 @@
+# tests/test_positions.py
+import threading
+import time
+
+import pytest
+
+from services.positions import PositionSnapshotStore
+
+
+def test_fresh_snapshot_is_served_and_copied():
+    calls = []
+    store = PositionSnapshotStore({"ex": lambda: calls.append(1) or [{"size": 1}]}, ttl=60)
+    first = store.get("EX")
+    first[0]["size"] = 99  # un consumidor muta su copia
+    assert store.get("ex") == [{"size": 1}]
+    assert len(calls) == 1
+
+
+def test_concurrent_refreshes_share_one_call():
+    calls = []
+    release = threading.Event()
+
+    def fetch():
+        calls.append(1)
+        release.wait(5)
+        return ["p"]
+
+    store = PositionSnapshotStore({"ex": fetch}, wait_timeout=5)
+    out = []
+    threads = [threading.Thread(target=lambda: out.append(store.refresh("ex"))) for _ in range(3)]
+    for t in threads:
+        t.start()
+    time.sleep(0.05)
+    release.set()
+    for t in threads:
+        t.join()
+    assert out == [["p"]] * 3
+    assert len(calls) == 1
+
+
+def _hung_store(release):
+    def fetch():
+        release.wait(5)
+        return ["new"]
+
+    store = PositionSnapshotStore({"ex": fetch}, wait_timeout=0.1)
+    owner = threading.Thread(target=store.refresh, args=("ex",))
+    owner.start()
+    time.sleep(0.05)
+    return store, owner
+
+
+def test_waiter_times_out_without_snapshot():
+    release = threading.Event()
+    store, owner = _hung_store(release)
+    with pytest.raises(TimeoutError):
+        store.refresh("ex")
+    release.set()
+    owner.join()
+
+
+def test_waiter_falls_back_to_stale_snapshot():
+    release = threading.Event()
+    store, owner = _hung_store(release)
+    store._snaps["ex"] = {"positions": ["old"], "ts": 0}
+    started = time.monotonic()
+    assert store.get("ex", force=True) == ["old"]
+    assert time.monotonic() - started < 1
+    release.set()
+    owner.join()
+    assert store.peek("ex")[0] == ["new"]
+
+
+def test_failed_refresh_keeps_previous_snapshot():
+    store = PositionSnapshotStore({"ex": lambda: 1 / 0})
+    store._snaps["ex"] = {"positions": ["old"], "ts": time.time()}
+    with pytest.raises(ZeroDivisionError):
+        store.refresh("ex")
+    assert store.peek("ex")[0] == ["old"]
@@ -0,0 +1,69 @@
+# tests/test_procpool.py
+import os
+import subprocess
+import sys
+import textwrap
+
+from utils import procpool
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def fifo_by_symbol(fills, tag=""):
+    """FIFO de juguete: una posición por símbolo con el close_time del último fill."""
+    last = {}
+    for f in fills:
+        last[f["symbol"]] = max(last.get(f["symbol"], 0), f["ts"])
+    return [{"symbol": s, "close_time": ts, "tag": tag} for s, ts in last.items()]
+
+
+def _fills():
+    # símbolos de tamaños distintos para que _partition los reparta por tamaño
+    fills = []
+    for i, sym in enumerate(["ETH", "BTC", "SOL", "XRP"]):
+        fills += [{"symbol": sym, "ts": 100 - i * 10 + k} for k in range(i + 1)]
+    return fills
+
+
+def test_inline_output_is_sorted_by_close_time_then_symbol(monkeypatch):
+    monkeypatch.setattr(procpool, "RECONSTRUCT_MODE", "inline")
+    out = procpool.reconstruct_in_pool(fifo_by_symbol, _fills(), lambda f: f["symbol"], tag="x")
+    assert [(r["close_time"], r["symbol"]) for r in out] == sorted(
+        (r["close_time"], r["symbol"]) for r in out
+    )
+    assert {r["tag"] for r in out} == {"x"}
+
+
+def test_pool_output_matches_inline_and_does_not_import_main(tmp_path):
+    marker = tmp_path / "main_imports.txt"
+    script = tmp_path / "fake_portfolio.py"
+    script.write_text(
+        textwrap.dedent(
+            f"""
+            import os, sys
+            sys.path[:0] = [{ROOT!r}, {os.path.join(ROOT, "tests")!r}]
+            with open({str(marker)!r}, "a") as fh:  # efecto secundario de importar __main__
+                fh.write(str(os.getpid()) + "\\n")
+            from utils import procpool
+            from test_procpool import fifo_by_symbol, _fills
+
+            if __name__ == "__main__":
+                procpool.RECONSTRUCT_MIN_ITEMS = 1
+                procpool.RECONSTRUCT_WORKERS = 3
+                key = lambda f: f["symbol"]
+                pooled = procpool.reconstruct_in_pool(fifo_by_symbol, _fills(), key, tag="p")
+                procpool.RECONSTRUCT_MODE = "inline"
+                inline = procpool.reconstruct_in_pool(fifo_by_symbol, _fills(), key, tag="p")
+                assert procpool._POOL is not None, "no se usó el pool"
+                assert pooled == inline, (pooled, inline)
+                print("OK")
+            """
+        )
+    )
+    res = subprocess.run(
+        [sys.executable, str(script)], capture_output=True, text=True, timeout=120
+    )
+    assert res.returncode == 0, res.stderr
+    assert "OK" in res.stdout and "no disponible" not in res.stdout
+    # solo el proceso padre ejecutó el __main__
+    assert len(marker.read_text().split()) == 1
@@ -0,0 +1,71 @@
+# tests/test_ratelimit.py
+import pytest
+
+from utils import ratelimit
+
+
+class FakeClock:
+    """time.monotonic/time.sleep deterministas: sleep avanza el reloj."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, s):
+        self.slept.append(s)
+        self.now += s
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    c = FakeClock()
+    monkeypatch.setattr(ratelimit, "time", c)
+    return c
+
+
+def test_burst_is_free_then_waits_for_refill(clock):
+    b = ratelimit.TokenBucket(rate=10, capacity=5)
+    assert [b.acquire() for _ in range(5)] == [0.0] * 5
+    assert b.acquire(2) == pytest.approx(0.2)  # 2 tokens a 10/s
+    clock.now += 1.0  # se rellena hasta la capacidad, no más
+    assert b.acquire(5) == 0.0
+    assert b.acquire(1) == pytest.approx(0.1)
+
+
+def test_weight_is_capped_at_capacity(clock):
+    b = ratelimit.TokenBucket(rate=1, capacity=3)
+    assert b.acquire(3) == 0.0
+    # un endpoint que pesa más que la ráfaga no puede esperar para siempre
+    assert b.acquire(30) == pytest.approx(3.0)
+
+
+def test_penalize_blocks_for_the_retry_after(clock):
+    b = ratelimit.TokenBucket(rate=10, capacity=10)
+    b.penalize(2.0)
+    # bucket vaciado por debajo de cero: 2 s para volver a 0 + 0.1 s para 1 token
+    assert b.acquire() == pytest.approx(2.1)
+    clock.now += 0.5
+    b.penalize(0.1)  # una penalización más corta no regala tokens
+    assert b.acquire() == pytest.approx(0.2)
+
+
+def test_module_level_acquire_uses_endpoint_weights(clock, monkeypatch):
+    monkeypatch.setattr(ratelimit, "_BUCKETS", {})
+    monkeypatch.setenv("RATE_LIMIT_BINANCE", "10:30")
+    assert ratelimit.endpoint_weight("binance", "/fapi/v1/income?limit=1000") == 30
+    assert ratelimit.endpoint_weight("binance", "/otro") == 1
+    assert ratelimit.acquire("binance", path="/fapi/v1/income") == 0.0
+    assert ratelimit.acquire("binance", path="/fapi/v1/userTrades") == pytest.approx(0.5)
+    ratelimit.penalize("binance", 1.0)
+    assert ratelimit.acquire("binance") == pytest.approx(1.1)
+
+
+def test_disabled_never_waits(clock, monkeypatch):
+    monkeypatch.setattr(ratelimit, "_BUCKETS", {})
+    monkeypatch.setattr(ratelimit, "_ENABLED", False)
+    ratelimit.penalize("gate", 60)
+    assert ratelimit.acquire("gate", weight=1000) == 0.0
+    assert clock.slept == []
@@ -0,0 +1,128 @@
+# tests/test_resilience.py
+import pytest
+import requests
+
+from utils import resilience
+from utils.resilience import CircuitBreaker, CircuitOpenError, call_with_retry
+
+
+class FakeTime:
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return 1_700_000_000.0
+
+    def sleep(self, s):
+        self.slept.append(s)
+        self.now += s
+
+
+class Resp:
+    def __init__(self, status=200, headers=None):
+        self.status_code = status
+        self.headers = headers or {}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    t = FakeTime()
+    monkeypatch.setattr(resilience, "time", t)
+    monkeypatch.setattr(resilience, "_BREAKERS", {})
+    return t
+
+
+def _sender(*outcomes):
+    calls = []
+
+    def send():
+        out = outcomes[len(calls)]
+        calls.append(out)
+        if isinstance(out, Exception):
+            raise out
+        return out
+
+    return send, calls
+
+
+def test_breaker_opens_then_lets_one_probe_through(clock):
+    cb = CircuitBreaker("ex", threshold=2, cooldown=60)
+    cb.record_failure()
+    cb.check()  # un fallo no abre
+    cb.record_failure()
+    with pytest.raises(CircuitOpenError):
+        cb.check()
+    assert cb.status()["state"] == "open"
+
+    clock.now += 61
+    assert cb.status()["state"] == "half_open"
+    cb.check()  # la llamada de prueba pasa...
+    with pytest.raises(CircuitOpenError):
+        cb.check()  # ...y mientras corre, nadie más
+    cb.record_failure()  # la prueba falla: otro cooldown entero
+    clock.now += 30
+    with pytest.raises(CircuitOpenError):
+        cb.check()
+
+    clock.now += 31
+    cb.check()
+    cb.record_success()
+    assert cb.status() == {"state": "closed", "fails": 0, "cooldown_left": 0.0}
+    cb.check()
+
+
+def test_probe_without_verdict_releases_the_half_open_slot(clock):
+    cb = CircuitBreaker("ex", threshold=1, cooldown=10)
+    cb.record_failure()
+    clock.now += 11
+    cb.check()
+    cb.release()  # p.ej. un 4xx: ni éxito ni fallo de red
+    cb.check()
+
+
+def test_network_errors_are_retried_then_trip_the_breaker(clock):
+    err = requests.exceptions.ConnectionError("reset")
+    for _ in range(resilience.BREAKER_FAIL_THRESHOLD):
+        send, calls = _sender(err, err)
+        with pytest.raises(requests.exceptions.ConnectionError):
+            call_with_retry("ex", send, retries=2, rate_limit=False)
+        assert len(calls) == 2
+    send, calls = _sender(Resp(200))
+    with pytest.raises(CircuitOpenError):
+        call_with_retry("ex", send, rate_limit=False)
+    assert calls == []  # abierto: ni siquiera se intenta
+
+
+def test_retry_after_penalizes_the_bucket_instead_of_sleeping(clock, monkeypatch):
+    penalties, acquired = [], []
+    monkeypatch.setattr(resilience, "penalize", lambda ex, s: penalties.append((ex, s)))
+    monkeypatch.setattr(resilience, "acquire", lambda ex, path=None: acquired.append(path))
+    send, calls = _sender(Resp(429, {"Retry-After": "7"}), Resp(200))
+    resp = call_with_retry("ex", send, retries=3, path="/v1/x")
+    assert resp.status_code == 200 and len(calls) == 2
+    assert penalties == [("ex", 7.0)]
+    assert acquired == ["/v1/x", "/v1/x"]  # la espera la hace acquire() con el bucket frenado
+    assert clock.slept == []
+
+
+def test_5xx_backs_off_and_returns_last_response(clock, monkeypatch):
+    monkeypatch.setattr(resilience.random, "uniform", lambda a, b: b)
+    send, calls = _sender(Resp(503), Resp(503), Resp(503))
+    resp = call_with_retry("ex", send, retries=3, base=0.5, rate_limit=False)
+    assert resp.status_code == 503 and len(calls) == 3
+    assert clock.slept == [0.5, 1.0]  # backoff exponencial (tope = jitter máximo)
+    assert resilience.get_breaker("ex").status()["fails"] == 1
+
+
+def test_retry_after_header_formats(clock):
+    assert resilience.retry_after_seconds({"Retry-After": "3"}) == 3.0
+    # reset en epoch ms (bybit) y en epoch s, relativos a time.time()
+    assert resilience.retry_after_seconds(
+        {"X-Bapi-Limit-Reset-Timestamp": str(int((1_700_000_000 + 5) * 1000))}
+    ) == pytest.approx(5.0)
+    assert resilience.retry_after_seconds({"X-RateLimit-Reset": "1700000002"}) == pytest.approx(2.0)
+    assert resilience.retry_after_seconds({}) is None
@@ -0,0 +1,73 @@
+# tests/test_singleflight.py
+import threading
+
+from utils.singleflight import SingleFlight, coalesce, single_flight
+
+
+def _run_concurrently(n, fn):
+    out, errors = [], []
+
+    def _one():
+        try:
+            out.append(fn())
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=_one) for _ in range(n)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return out, errors
+
+
+def test_concurrent_callers_share_one_call_and_get_their_own_copy():
+    calls = []
+    gate = threading.Event()
+
+    def fetch():
+        calls.append(1)
+        gate.wait(5)
+        return {"positions": [{"size": 1}]}
+
+    threading.Timer(0.1, gate.set).start()
+    out, errors = _run_concurrently(4, lambda: coalesce("aden", "get", "/v1/positions", {"a": 1}, fetch))
+    assert errors == [] and len(calls) == 1
+    assert out == [{"positions": [{"size": 1}]}] * 4
+    out[0]["positions"][0]["size"] = 99  # mutar el resultado propio no afecta a los demás
+    assert all(o["positions"][0]["size"] == 1 for o in out[1:])
+    assert len({id(o) for o in out}) == 4
+
+
+def test_errors_are_shared_and_nothing_is_cached():
+    sf = SingleFlight()
+    gate = threading.Event()
+    calls = []
+
+    def boom():
+        calls.append(1)
+        gate.wait(5)
+        raise ValueError("502")
+
+    threading.Timer(0.1, gate.set).start()
+    out, errors = _run_concurrently(3, lambda: sf.do("k", boom))
+    assert out == [] and len(errors) == 3 and len(calls) == 1
+    assert sf.inflight() == 0
+    assert sf.do("k", lambda: "de nuevo") == "de nuevo"
+
+
+def test_decorator_skips_coalescing_when_key_is_none():
+    calls = []
+    gate = threading.Event()
+
+    @single_flight(lambda method, path, params=None: ("ex", method, path, params) if method == "GET" else None)
+    def send(method, path, params=None):
+        calls.append(method)
+        gate.wait(5)
+        return method
+
+    threading.Timer(0.1, gate.set).start()
+    _run_concurrently(3, lambda: send("GET", "/x", {"b": [1, 2]}))
+    _run_concurrently(2, lambda: send("POST", "/x"))
+    assert calls.count("GET") == 1
+    assert calls.count("POST") == 2
@@ -0,0 +1,47 @@
+# tests/test_stream.py
+import queue
+
+from services import stream
+from services.stream import LivePoller
+
+
+def _poller(**kw):
+    return LivePoller(lambda: {}, lambda: {}, **kw)
+
+
+def test_subscribe_gets_current_state():
+    p = _poller()
+    p._state["positions"]["bybit"] = [1]
+    p._ensure_started = lambda: None
+    q = p.subscribe()
+    assert q.get_nowait() == {"type": "positions", "exchange": "bybit", "data": [1]}
+
+
+def test_full_queue_is_closed_and_unsubscribed(monkeypatch):
+    monkeypatch.setattr(stream, "SUBSCRIBER_QUEUE_MAX", 2)
+    p = _poller()
+    p._ensure_started = lambda: None
+    q = p.subscribe()
+    for i in range(3):
+        p._publish({"type": "positions", "exchange": "x", "data": i})
+    assert p.subscriber_count() == 0
+    assert q.get_nowait() is stream.CLOSE
+    try:
+        q.get_nowait()
+        assert False, "la cola debía quedar solo con CLOSE"
+    except queue.Empty:
+        pass
+
+
+def test_poll_publishes_only_changes():
+    data = {"v": 1}
+    p = LivePoller(lambda: {"okx": lambda: dict(data)}, lambda: {}, timeout=5)
+    p._ensure_started = lambda: None
+    q = p.subscribe()
+    p.poll_once()
+    p.poll_once()
+    assert q.get_nowait()["data"] == {"v": 1}
+    assert q.empty()
+    data["v"] = 2
+    p.poll_once()
+    assert q.get_nowait()["data"] == {"v": 2}
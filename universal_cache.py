@@ -1,5 +1,6 @@
 # universal_cache.py
 import sqlite3
+from utils.dbconn import db_connect
 import time
 import os
 from datetime import datetime, timedelta
@@ -29,7 +30,7 @@ def _base_symbol(sym: str) -> str:
 
 def init_universal_cache_db(db_path: str = CACHE_DB_PATH):
     """Inicializa la base de datos para el cache universal"""
-    conn = sqlite3.connect(db_path, timeout=30.0)
+    conn = db_connect(db_path)
     cur = conn.cursor()
     cur.execute(
         """
@@ -61,7 +62,7 @@ def init_universal_cache_db(db_path: str = CACHE_DB_PATH):
 
 def migrate_add_last_seen(db_path: str = CACHE_DB_PATH):
     """Agrega columna last_seen si no existe"""
-    conn = sqlite3.connect(db_path, timeout=30.0)
+    conn = db_connect(db_path)
     cur = conn.cursor()
 
     try:
@@ -91,7 +92,7 @@ def migrate_add_last_seen(db_path: str = CACHE_DB_PATH):
 
 def cleanup_old_cache(db_path: str = CACHE_DB_PATH):
     """Limpia cache antiguo según CACHE_TTL_DAYS"""
-    conn = sqlite3.connect(db_path, timeout=30.0)
+    conn = db_connect(db_path)
     cur = conn.cursor()
     cutoff_date = datetime.now() - timedelta(days=CACHE_TTL_DAYS)
     cur.execute("DELETE FROM universal_cache WHERE last_used < ?", (cutoff_date,))
@@ -173,7 +174,7 @@ def add_to_universal_cache(
     if not currency_pair:
         currency_pair = symbol_to_currency_pair(symbol, exchange)
 
-    conn = sqlite3.connect(db_path, timeout=30.0)
+    conn = db_connect(db_path)
     cur = conn.cursor()
 
     try:
@@ -202,7 +203,7 @@ def remove_from_universal_cache(
     if not cleaned:
         return 0
 
-    conn = sqlite3.connect(db_path, timeout=30.0)
+    conn = db_connect(db_path)
     cur = conn.cursor()
     try:
         placeholders = ",".join(["?"] * len(cleaned))
@@ -225,7 +226,7 @@ def get_cached_currency_pairs(
     exchange: str = None, db_path: str = CACHE_DB_PATH
 ) -> List[str]:
     """Obtiene todos los currency pairs del cache"""
-    conn = sqlite3.connect(db_path, timeout=30.0)
+    conn = db_connect(db_path)
     cur = conn.cursor()
 
     try:
@@ -267,7 +268,7 @@ def get_cached_symbols(
     exchange: str = None, db_path: str = CACHE_DB_PATH
 ) -> List[Dict[str, Any]]:
     """Obtiene todos los símbolos del cache con información completa"""
-    conn = sqlite3.connect(db_path, timeout=30.0)
+    conn = db_connect(db_path)
     conn.row_factory = sqlite3.Row
     cur = conn.cursor()
 
@@ -298,7 +299,7 @@ def get_currency_pair_for_symbol(
     exchange: str, symbol: str, db_path: str = CACHE_DB_PATH
 ) -> Optional[str]:
     """Obtiene el currency pair para un símbolo específico de un exchange"""
-    conn = sqlite3.connect(db_path, timeout=30.0)
+    conn = db_connect(db_path)
     cur = conn.cursor()
 
     cur.execute(
@@ -325,7 +326,7 @@ def search_symbols_by_base(
     base_currency: str, exchange: str = None, db_path: str = CACHE_DB_PATH
 ) -> List[Dict[str, Any]]:
     """Busca símbolos por currency base (ej: 'BTC' para BTCUSDT, BTC_USDT, etc.)"""
-    conn = sqlite3.connect(db_path, timeout=30.0)
+    conn = db_connect(db_path)
     conn.row_factory = sqlite3.Row
     cur = conn.cursor()
 
@@ -379,7 +380,7 @@ def add_manual_pair(
 # Función para obtener estadísticas del cache
 def get_cache_stats(db_path: str = CACHE_DB_PATH) -> Dict[str, Any]:
     """Obtiene estadísticas del cache universal"""
-    conn = sqlite3.connect(db_path, timeout=30.0)
+    conn = db_connect(db_path)
     cur = conn.cursor()
 
     # Total por exchange
@@ -412,7 +413,7 @@ def get_cache_stats(db_path: str = CACHE_DB_PATH) -> Dict[str, Any]:
 # ===========================
 def init_selected_open_exchanges_table(db_path: str = CACHE_DB_PATH):
     """Crea la tabla que almacena los exchanges seleccionados en la UI."""
-    conn = sqlite3.connect(db_path, timeout=30.0)
+    conn = db_connect(db_path)
     cur = conn.cursor()
     cur.execute(
         """
@@ -439,7 +440,7 @@ def set_selected_open_exchanges(exchanges: List[str], db_path: str = CACHE_DB_PA
         normalized.append(key)
 
     init_selected_open_exchanges_table(db_path)
-    conn = sqlite3.connect(db_path, timeout=30.0)
+    conn = db_connect(db_path)
     cur = conn.cursor()
     try:
         conn.execute("BEGIN IMMEDIATE")
@@ -462,7 +463,7 @@ def set_selected_open_exchanges(exchanges: List[str], db_path: str = CACHE_DB_PA
 def get_selected_open_exchanges(db_path: str = CACHE_DB_PATH) -> List[str]:
     """Recupera los exchanges seleccionados; devuelve lista vacía si no hay preferencia."""
     init_selected_open_exchanges_table(db_path)
-    conn = sqlite3.connect(db_path, timeout=30.0)
+    conn = db_connect(db_path)
     cur = conn.cursor()
     try:
         cur.execute(
@@ -478,7 +479,7 @@ def get_selected_open_exchanges(db_path: str = CACHE_DB_PATH) -> List[str]:
 
 def init_sync_timestamps_table(db_path: str = DB_PATH):
     """Inicializa la tabla de timestamps de sincronización"""
-    conn = sqlite3.connect(db_path, timeout=30.0)
+    conn = db_connect(db_path)
     cur = conn.cursor()
 
     cur.execute(
@@ -499,7 +500,7 @@ def init_sync_timestamps_table(db_path: str = DB_PATH):
 
 def update_sync_timestamp(exchange: str, db_path: str = DB_PATH):
     """Registra el timestamp de la última sincronización de cerradas"""
-    conn = sqlite3.connect(db_path, timeout=30.0)
+    conn = db_connect(db_path)
     cur = conn.cursor()
 
     # Crear tabla si no existe
@@ -529,7 +530,7 @@ def update_sync_timestamp(exchange: str, db_path: str = DB_PATH):
 
 def get_last_sync_timestamp(exchange: str, db_path: str = DB_PATH) -> Optional[int]:
     """Obtiene el timestamp de la última sincronización de cerradas"""
-    conn = sqlite3.connect(db_path, timeout=30.0)
+    conn = db_connect(db_path)
     cur = conn.cursor()
 
     # Crear tabla si no existe (defensivo)
@@ -567,7 +568,7 @@ def detect_closed_positions(
     Detecta símbolos que estaban en caché pero ya no están en posiciones actuales
     (posiblemente cerrados)
     """
-    conn = sqlite3.connect(db_path, timeout=30.0)
+    conn = db_connect(db_path)
     cur = conn.cursor()
 
     current_symbols = set()
@@ -0,0 +1,173 @@
+# utils/async_http.py
+"""
+Cliente HTTP async compartido para adapters nativos async.
+
+- Un único event loop de larga vida en un hilo daemon (run_coro): los handlers
+  síncronos le mandan corutinas en vez de crear un loop por request con
+  asyncio.run, así la ClientSession y su pool de conexiones se reutilizan.
+- Con aiohttp instalado: una ClientSession por event loop con pool de conexiones
+  (limit total y por host), así un solo loop maneja todas las llamadas a la vez.
+- Sin aiohttp: cae a requests ejecutado en un pool de hilos acotado (mismo API).
+"""
+import asyncio
+import threading
+import weakref
+from typing import Any, Dict, Optional
+
+try:
+    import aiohttp
+except ImportError:  # dependencia opcional
+    aiohttp = None
+
+from utils.fanout import get_executor, shared_task
+
+ASYNC_HTTP_LIMIT = 64  # conexiones totales
+ASYNC_HTTP_LIMIT_PER_HOST = 8  # conexiones simultáneas por host
+ASYNC_HTTP_TIMEOUT = 20  # segundos
+BLOCKING_POOL_WORKERS = 16  # hilos para el fallback y para adapters síncronos envueltos
+
+_LOOP: Optional[asyncio.AbstractEventLoop] = None
+_LOOP_LOCK = threading.Lock()
+
+
+def _shared_loop() -> asyncio.AbstractEventLoop:
+    """Event loop compartido, vivo mientras viva el proceso (hilo daemon)."""
+    global _LOOP
+    with _LOOP_LOCK:
+        if _LOOP is None or _LOOP.is_closed():
+            loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=loop.run_forever, name="async-http-loop", daemon=True
+            ).start()
+            _LOOP = loop
+        return _LOOP
+
+
+def run_coro(coro, timeout: Optional[float] = None):
+    """Ejecuta una corutina en el loop compartido desde código síncrono y espera el resultado."""
+    fut = asyncio.run_coroutine_threadsafe(coro, _shared_loop())
+    return fut.result(timeout=timeout)
+
+
+async def run_blocking(fn, *args, **kwargs):
+    """Ejecuta una función bloqueante en el pool acotado compartido sin bloquear el loop."""
+    loop = asyncio.get_running_loop()
+    executor = get_executor("async_blocking", BLOCKING_POOL_WORKERS)
+    return await loop.run_in_executor(executor, lambda: fn(*args, **kwargs))
+
+
+async def run_shared(
+    pool: str, name: str, fn, max_workers: int = BLOCKING_POOL_WORKERS, variant=None
+):
+    """
+    Como run_blocking pero compartiendo la tarea en vuelo con utils.fanout
+    (clave pool, nombre, variante): si la llamada síncrona equivalente ya está
+    corriendo se espera a esa, y un timeout del llamante no deja otro hilo
+    colgado en cada reintento.
+    """
+    with shared_task(pool, name, fn, max_workers, variant) as fut:
+        # shield: cancelar esta espera (wait_for) no debe cancelar la tarea compartida
+        return await asyncio.shield(asyncio.wrap_future(fut))
+
+
+class AsyncHTTPClient:
+    def __init__(self):
+        # clave = el propio loop (débil): un id() reciclado no puede devolver una
+        # sesión ligada a un loop ya cerrado
+        self._sessions: "weakref.WeakKeyDictionary[Any, Any]" = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self._sync_session = None
+
+    def _get_session(self):
+        key = asyncio.get_running_loop()
+        with self._lock:
+            sess = self._sessions.get(key)
+            if sess is None or sess.closed:
+                connector = aiohttp.TCPConnector(
+                    limit=ASYNC_HTTP_LIMIT, limit_per_host=ASYNC_HTTP_LIMIT_PER_HOST
+                )
+                sess = aiohttp.ClientSession(
+                    connector=connector,
+                    timeout=aiohttp.ClientTimeout(total=ASYNC_HTTP_TIMEOUT),
+                )
+                self._sessions[key] = sess
+            return sess
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        params: Optional[Dict[str, Any]] = None,
+        json: Any = None,
+        data: Any = None,
+        headers: Optional[Dict[str, str]] = None,
+        timeout: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        """
+        Devuelve {"status": int, "headers": dict, "data": json|texto}.
+        No lanza por status HTTP: cada adapter decide qué es error.
+        """
+        if aiohttp is not None:
+            sess = self._get_session()
+            kw = {}
+            if timeout is not None:
+                kw["timeout"] = aiohttp.ClientTimeout(total=timeout)
+            async with sess.request(
+                method, url, params=params, json=json, data=data, headers=headers, **kw
+            ) as resp:
+                text = await resp.text()
+                return {
+                    "status": resp.status,
+                    "headers": dict(resp.headers),
+                    "data": _maybe_json(text),
+                }
+
+        import requests
+
+        if self._sync_session is None:
+            self._sync_session = requests.Session()
+        r = await run_blocking(
+            self._sync_session.request,
+            method,
+            url,
+            params=params,
+            json=json,
+            data=data,
+            headers=headers,
+            timeout=timeout or ASYNC_HTTP_TIMEOUT,
+        )
+        return {
+            "status": r.status_code,
+            "headers": dict(r.headers),
+            "data": _maybe_json(r.text),
+        }
+
+    async def get(self, url: str, **kw) -> Dict[str, Any]:
+        return await self.request("GET", url, **kw)
+
+    async def post(self, url: str, **kw) -> Dict[str, Any]:
+        return await self.request("POST", url, **kw)
+
+    async def close(self):
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for sess in sessions:
+            if not sess.closed:
+                await sess.close()
+
+
+def _maybe_json(text: str):
+    import json as _json
+
+    try:
+        return _json.loads(text) if text else None
+    except ValueError:
+        return text
+
+
+_CLIENT = AsyncHTTPClient()
+
+
+def get_async_client() -> AsyncHTTPClient:
+    return _CLIENT
@@ -0,0 +1,130 @@
+# utils/clock.py
+"""
+Offset de reloj por exchange para las firmas con timestamp.
+
+Cada adapter registra cómo leer la hora de su servidor (register_time_source).
+El offset (servidor - local, medido en el punto medio del round trip) se mide
+una vez, se cachea y se refresca en segundo plano cada CLOCK_REFRESH_SEC;
+las firmas usan server_now_ms(exchange) sin pagar otra llamada. Si un exchange
+rechaza un timestamp (recvWindow / -1021 / ...), resync() lo vuelve a medir y
+with_clock_retry repite la llamada una vez.
+"""
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+CLOCK_REFRESH_SEC = 600  # re-medición en segundo plano
+CLOCK_MIN_RESYNC_SEC = 5  # no re-medir más de una vez cada N s aunque lleguen varios errores
+
+# Fragmentos de error de timestamp/recvWindow (en respuestas HTTP >= 400)
+TIMESTAMP_ERROR_MARKERS = (
+    "-1021",  # binance/aster: Timestamp for this request is outside of the recvWindow
+    "recvwindow",
+    "timestamp for this request",  # binance/aster/mexc spot (700003)
+    "kc-api-timestamp",  # kucoin 400002
+    "request-time",  # mexc futuros
+    "server timestamp",  # bybit 10002
+    "invalid timestamp",
+)
+
+_SOURCES: Dict[str, Callable[[], int]] = {}
+_OFFSETS: Dict[str, int] = {}
+_MEASURED_AT: Dict[str, float] = {}
+_REFRESHING = set()
+_LOCK = threading.Lock()
+
+
+def _local_ms() -> int:
+    return int(time.time() * 1000)
+
+
+def register_time_source(exchange: str, fetch_server_ms: Callable[[], int]):
+    """fetch_server_ms() -> hora del servidor en ms (sin firma, endpoint público)."""
+    _SOURCES[exchange] = fetch_server_ms
+
+
+def measure(exchange: str) -> int:
+    """Mide el offset ahora (bloqueante) y lo cachea. Sin fuente o si falla se queda el anterior (o 0)."""
+    src = _SOURCES.get(exchange)
+    if src is None:
+        return _OFFSETS.get(exchange, 0)
+    try:
+        t0 = _local_ms()
+        server = int(src())
+        t1 = _local_ms()
+        off = server - ((t0 + t1) // 2)
+    except Exception as e:
+        print(f"⚠️ Clock {exchange}: no se pudo medir la hora del servidor ({e})")
+        with _LOCK:
+            _MEASURED_AT.setdefault(exchange, time.monotonic())
+            return _OFFSETS.get(exchange, 0)
+    with _LOCK:
+        _OFFSETS[exchange] = off
+        _MEASURED_AT[exchange] = time.monotonic()
+    return off
+
+
+def _refresh_async(exchange: str):
+    with _LOCK:
+        if exchange in _REFRESHING:
+            return
+        _REFRESHING.add(exchange)
+
+    def _run():
+        try:
+            measure(exchange)
+        finally:
+            with _LOCK:
+                _REFRESHING.discard(exchange)
+
+    threading.Thread(target=_run, name=f"clock-{exchange}", daemon=True).start()
+
+
+def offset_ms(exchange: str) -> int:
+    """Offset cacheado; la primera vez se mide en línea, después se refresca en segundo plano."""
+    with _LOCK:
+        measured = _MEASURED_AT.get(exchange)
+        off = _OFFSETS.get(exchange, 0)
+    if measured is None:
+        return measure(exchange)
+    if time.monotonic() - measured > CLOCK_REFRESH_SEC:
+        _refresh_async(exchange)
+    return off
+
+
+def server_now_ms(exchange: str) -> int:
+    return _local_ms() + offset_ms(exchange)
+
+
+def resync(exchange: str) -> int:
+    """Tras un rechazo por timestamp: re-mide (salvo que se acabe de medir)."""
+    with _LOCK:
+        measured = _MEASURED_AT.get(exchange)
+    if measured is not None and time.monotonic() - measured < CLOCK_MIN_RESYNC_SEC:
+        return _OFFSETS.get(exchange, 0)
+    return measure(exchange)
+
+
+def is_timestamp_error(resp) -> bool:
+    """¿Es un rechazo por timestamp/recvWindow? (Response con status >= 400 o texto de error)."""
+    if resp is None:
+        return False
+    if not isinstance(resp, str):
+        if getattr(resp, "status_code", 200) < 400:
+            return False
+        resp = getattr(resp, "text", "") or ""
+    text = resp.lower()
+    return any(m in text for m in TIMESTAMP_ERROR_MARKERS)
+
+
+def with_clock_retry(exchange: str, send: Callable[[], "object"], check: Optional[Callable] = None):
+    """
+    send() firma y envía. Si la respuesta es un error de timestamp se re-mide el
+    offset y se repite una vez (send() vuelve a firmar con la hora corregida).
+    """
+    resp = send()
+    if (check or is_timestamp_error)(resp):
+        print(f"⏱️ {exchange}: timestamp rechazado, re-sincronizando reloj")
+        resync(exchange)
+        resp = send()
+    return resp
@@ -0,0 +1,135 @@
+# utils/dbconn.py
+"""
+Conexiones SQLite gestionadas (portfolio.db, cache.db, ...).
+
+  conn = db_connect(db_path)   # en vez de sqlite3.connect(db_path)
+  ...
+  conn.close()                 # devuelve la conexión al pool
+
+Un pool por fichero, compartido por todos los hilos (Flask crea un hilo por
+request, así que un pool por hilo reabría la conexión en cada request). Las
+conexiones se abren con check_same_thread=False y se configuran una sola vez:
+  - journal_mode=WAL      -> los lectores no se bloquean detrás del escritor
+  - synchronous=NORMAL    -> con WAL es seguro ante caídas del proceso
+  - busy_timeout          -> los escritores concurrentes esperan en vez de "database is locked"
+  - cache_size / mmap_size / temp_store=MEMORY
+
+Cada db_connect() saca SU conexión del pool: dos usuarios nunca comparten una,
+ni siquiera llamadas anidadas en el mismo hilo, así un commit/rollback/
+executescript interno no toca la transacción del de fuera. Lo que se devuelve es
+un proxy: close() no cierra, hace rollback de lo que quedara sin commit (igual
+que al cerrar una conexión de verdad), restaura row_factory/isolation_level y
+la devuelve al pool. ":memory:" no se agrupa (cada conexión es otra BD).
+
+  SQLITE_BUSY_TIMEOUT_MS=30000  SQLITE_CACHE_MB=64  SQLITE_MMAP_MB=256
+  SQLITE_POOL_IDLE=8            conexiones libres que se guardan por fichero
+"""
+import os
+import sqlite3
+import threading
+from typing import Dict, List
+
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "30000"))
+SQLITE_CACHE_MB = int(os.getenv("SQLITE_CACHE_MB", "64"))
+SQLITE_MMAP_MB = int(os.getenv("SQLITE_MMAP_MB", "256"))
+SQLITE_POOL_IDLE = int(os.getenv("SQLITE_POOL_IDLE", "8"))
+
+_POOLS: Dict[str, List[sqlite3.Connection]] = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def _open(db_path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(
+        db_path, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000.0, check_same_thread=False
+    )
+    conn.execute("PRAGMA journal_mode=WAL").fetchone()  # persistente en el fichero
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    conn.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_MB * 1024}")  # negativo = KiB
+    conn.execute(f"PRAGMA mmap_size={SQLITE_MMAP_MB * 1024 * 1024}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    return conn
+
+
+def _checkout(key: str, db_path: str) -> sqlite3.Connection:
+    with _POOLS_LOCK:
+        idle = _POOLS.get(key)
+        if idle:
+            return idle.pop()  # LIFO: la más reciente, con la caché caliente
+    return _open(db_path)
+
+
+def _checkin(key: str, conn: sqlite3.Connection):
+    try:
+        if conn.in_transaction:
+            conn.rollback()  # lo que no se commiteó, como al cerrar
+        conn.row_factory = None
+        conn.isolation_level = ""  # valor por defecto de sqlite3.connect
+    except sqlite3.Error:
+        conn.close()  # conexión rota: no vuelve al pool
+        return
+    with _POOLS_LOCK:
+        idle = _POOLS.setdefault(key, [])
+        if len(idle) < SQLITE_POOL_IDLE:
+            idle.append(conn)
+            return
+    conn.close()
+
+
+class PooledConnection:
+    """Proxy de sqlite3.Connection cuyo close() devuelve la conexión al pool."""
+
+    __slots__ = ("_conn", "_key", "_closed")
+
+    def __init__(self, key: str, conn: sqlite3.Connection):
+        object.__setattr__(self, "_conn", conn)
+        object.__setattr__(self, "_key", key)
+        object.__setattr__(self, "_closed", False)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._conn, name, value)  # row_factory, isolation_level...
+
+    def close(self):
+        if not self._closed:
+            object.__setattr__(self, "_closed", True)
+            _checkin(self._key, self._conn)
+
+    # mismo contrato que sqlite3.Connection: `with conn:` hace commit/rollback, no cierra
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self._conn.commit()
+        else:
+            self._conn.rollback()
+        return False
+
+    def __del__(self):
+        try:
+            self.close()  # conexión "olvidada" sin close(): se devuelve igual
+        except Exception:
+            pass
+
+
+def db_connect(db_path: str = "portfolio.db"):
+    """Conexión propia para db_path sacada del pool (se abre y configura solo si no hay libre)."""
+    if db_path == ":memory:" or db_path.startswith("file:"):
+        return sqlite3.connect(db_path)
+    key = os.path.abspath(db_path)
+    return PooledConnection(key, _checkout(key, db_path))
+
+
+def close_pooled_connections():
+    """Cierra de verdad las conexiones libres de todos los pools (tests, apagado)."""
+    with _POOLS_LOCK:
+        conns = [c for idle in _POOLS.values() for c in idle]
+        _POOLS.clear()
+    for conn in conns:
+        try:
+            conn.close()
+        except Exception:
+            pass
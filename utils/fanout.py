@@ -0,0 +1,267 @@
+# utils/fanout.py
+"""
+Fan-out concurrente con deadline por tarea.
+
+Ejecuta un dict {nombre: callable} en un pool de hilos acotado y devuelve lo que
+haya terminado a tiempo + un estado por tarea (ok / timeout / error / latency_ms).
+Las tareas que se pasan de su deadline NO se matan (Python no puede), simplemente
+se abandonan: siguen en el pool y su resultado se descarta.
+
+El deadline cuenta desde que la tarea EMPIEZA a correr (no desde el envío): una
+tarea en cola espera como mucho otro `timeout` a que haya hilo libre. Mientras
+una tarea (pool, nombre, variante) siga en vuelo no se envía otra igual: la
+nueva llamada se engancha a la existente, así un exchange colgado ocupa un solo
+hilo aunque se refresque muchas veces. El callable NO forma parte de la clave:
+si dos llamantes usan el mismo nombre con parámetros distintos (ventana de
+tiempo, forzar refresco...) tienen que distinguirlos con `variants`.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Callable, Dict, Hashable, Iterator, List, Optional, Tuple
+
+_EXECUTORS: Dict[str, ThreadPoolExecutor] = {}
+_EXECUTORS_LOCK = threading.Lock()
+
+
+def get_executor(name: str = "fanout", max_workers: int = 8) -> ThreadPoolExecutor:
+    """Pool persistente por nombre (no se cierra en cada request para no esperar a los lentos)."""
+    with _EXECUTORS_LOCK:
+        ex = _EXECUTORS.get(name)
+        if ex is None:
+            ex = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+            _EXECUTORS[name] = ex
+        return ex
+
+
+class _Task:
+    """Tarea en vuelo de un (pool, nombre): future + cuándo se envió / empezó."""
+
+    __slots__ = ("future", "submitted", "started", "waiters")
+
+    def __init__(self):
+        self.future = None
+        self.submitted = time.monotonic()
+        self.started: Optional[float] = None
+        self.waiters = 0
+
+    def deadline(self, timeout: float) -> float:
+        if self.started is not None:
+            return self.started + timeout
+        return self.submitted + timeout  # todavía en cola
+
+    def elapsed_ms(self, now: float) -> int:
+        return int((now - (self.started or self.submitted)) * 1000)
+
+
+_INFLIGHT: Dict[Tuple[str, str, Hashable], _Task] = {}
+_INFLIGHT_LOCK = threading.RLock()
+
+
+def _run(task: _Task, fn: Callable[[], Any]) -> Any:
+    task.started = time.monotonic()
+    return fn()
+
+
+def _acquire_task(
+    pool: str, name: str, fn: Callable[[], Any], executor, variant: Hashable = None
+) -> _Task:
+    """Devuelve la tarea en vuelo de (pool, nombre, variante) o envía una nueva."""
+    key = (pool, name, variant)
+    with _INFLIGHT_LOCK:
+        task = _INFLIGHT.get(key)
+        if task is None or task.future.done():
+            task = _Task()
+            task.future = executor.submit(_run, task, fn)
+            _INFLIGHT[key] = task
+
+            def _release(_fut, key=key, task=task):
+                with _INFLIGHT_LOCK:
+                    if _INFLIGHT.get(key) is task:
+                        del _INFLIGHT[key]
+
+            task.future.add_done_callback(_release)
+        task.waiters += 1
+        return task
+
+
+def _drop_waiter(task: _Task, cancel: bool = False):
+    with _INFLIGHT_LOCK:
+        task.waiters -= 1
+        # solo se cancela (si sigue en cola) cuando nadie más la espera
+        if cancel and task.waiters <= 0:
+            task.future.cancel()
+
+
+@contextmanager
+def shared_task(
+    pool: str,
+    name: str,
+    fn: Callable[[], Any],
+    max_workers: int = 8,
+    variant: Hashable = None,
+):
+    """
+    La misma coalescencia que fan_out para quien espera por su cuenta (p. ej.
+    un event loop): entrega el Future de la tarea en vuelo de (pool, nombre,
+    variante), enviándola solo si no hay ninguna. Quien abandona la espera no
+    la cancela: otro llamante puede seguir enganchado a ella.
+    """
+    task = _acquire_task(pool, name, fn, get_executor(pool, max_workers), variant)
+    try:
+        yield task.future
+    finally:
+        _drop_waiter(task)
+
+
+def iter_fan_out(
+    tasks: Dict[str, Callable[[], Any]],
+    max_workers: int = 8,
+    timeout: float = 20.0,
+    timeouts: Optional[Dict[str, float]] = None,
+    pool: str = "fanout",
+    variants: Optional[Dict[str, Hashable]] = None,
+) -> Iterator[Tuple[str, Any, Dict[str, Any]]]:
+    """
+    Igual que fan_out pero va entregando (nombre, resultado, estado) según termina
+    cada tarea (o vence su deadline). resultado es None si no fue "ok".
+    """
+    timeouts = timeouts or {}
+    variants = variants or {}
+    if not tasks:
+        return
+
+    executor = get_executor(pool, max_workers)
+    pending: Dict[Any, Tuple[str, _Task]] = {}
+    limits: Dict[str, float] = {}
+    for name, fn in tasks.items():
+        task = _acquire_task(pool, name, fn, executor, variants.get(name))
+        pending[task.future] = (name, task)
+        limits[name] = float(timeouts.get(name, timeout))
+
+    while pending:
+        now = time.monotonic()
+        # marcar como timeout las que ya se pasaron de su deadline
+        for fut, (name, task) in list(pending.items()):
+            if not fut.done() and now >= task.deadline(limits[name]):
+                del pending[fut]
+                _drop_waiter(task, cancel=True)
+                yield name, None, {
+                    "status": "timeout",
+                    "latency_ms": task.elapsed_ms(now),
+                    "queued": task.started is None,
+                }
+        if not pending:
+            break
+
+        next_deadline = min(t.deadline(limits[n]) for n, t in pending.values())
+        done, _ = wait(
+            list(pending), timeout=max(0.0, next_deadline - now), return_when=FIRST_COMPLETED
+        )
+        for fut in done:
+            name, task = pending.pop(fut)
+            _drop_waiter(task)
+            latency_ms = task.elapsed_ms(time.monotonic())
+            try:
+                value = fut.result()
+            except Exception as e:
+                yield name, None, {
+                    "status": "error",
+                    "latency_ms": latency_ms,
+                    "error": str(e),
+                }
+                continue
+            yield name, value, {"status": "ok", "latency_ms": latency_ms}
+
+
+def fan_out(
+    tasks: Dict[str, Callable[[], Any]],
+    max_workers: int = 8,
+    timeout: float = 20.0,
+    timeouts: Optional[Dict[str, float]] = None,
+    pool: str = "fanout",
+    variants: Optional[Dict[str, Hashable]] = None,
+) -> Tuple[Dict[str, Any], Dict[str, Dict[str, Any]]]:
+    """
+    Lanza todas las tareas en paralelo y espera como mucho el deadline de cada una
+    (timeouts[nombre] o timeout por defecto, contado desde que empieza a correr).
+    variants[nombre] entra en la clave de coalescencia: solo se comparte una
+    tarea en vuelo con otra del mismo pool, nombre y variante.
+
+    Devuelve (results, status):
+      results = {nombre: valor}                     -> solo las que terminaron OK
+      status  = {nombre: {"status": "ok"|"timeout"|"error", "latency_ms": int, "error"?: str}}
+    """
+    results: Dict[str, Any] = {}
+    status: Dict[str, Dict[str, Any]] = {}
+    for name, value, st in iter_fan_out(
+        tasks,
+        max_workers=max_workers,
+        timeout=timeout,
+        timeouts=timeouts,
+        pool=pool,
+        variants=variants,
+    ):
+        status[name] = st
+        if st["status"] == "ok":
+            results[name] = value
+    return results, status
+
+
+def gather_ordered(
+    fn: Callable[[Any], Any],
+    items: List[Any],
+    workers: int,
+    pool: str,
+    pool_size: int,
+    limit: Optional[threading.Semaphore] = None,
+) -> List[Any]:
+    """
+    Llama fn(item) para cada item en el pool 'pool' y devuelve los resultados en
+    el orden de 'items'. Si alguno lanza, se relanza el primero (en orden) cuando
+    han terminado todos.
+
+    La concurrencia se acota al ENVIAR: como mucho 'workers' items de esta
+    llamada en el pool (y, si se pasa 'limit', un hueco de ese semáforo
+    compartido por item); al acabar uno se envía el siguiente. Quien espera es
+    el hilo llamante, nunca un hilo del pool, así un exchange lento no acapara
+    el pool de los demás. Si ya estamos en un hilo de ese pool (anidamiento) o
+    workers == 1, se ejecuta en línea para no bloquearse esperando hilo libre.
+    """
+    items = list(items)
+    if workers <= 1 or len(items) <= 1 or threading.current_thread().name.startswith(pool):
+        return [fn(it) for it in items]
+
+    executor = get_executor(pool, max(pool_size, workers))
+    local = threading.Semaphore(workers)
+
+    def _release(_fut=None):
+        if limit is not None:
+            limit.release()
+        local.release()
+
+    def _submit(it):
+        local.acquire()
+        if limit is not None:
+            limit.acquire()
+        try:
+            fut = executor.submit(fn, it)
+        except BaseException:
+            _release()
+            raise
+        fut.add_done_callback(_release)
+        return fut
+
+    futures = [_submit(it) for it in items]
+    results: List[Any] = []
+    first_err = None
+    for fut in futures:
+        try:
+            results.append(fut.result())
+        except Exception as err:
+            results.append(None)
+            first_err = first_err or err
+    if first_err is not None:
+        raise first_err
+    return results
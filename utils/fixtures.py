@@ -0,0 +1,258 @@
+# utils/fixtures.py
+"""
+Record/replay de HTTP para correr adapters sin red ni claves.
+
+Se engancha como transport (HTTPAdapter) en la Session compartida de
+utils.http, así cubre a todos los adapters que pasan por ella.
+
+  HTTP_FIXTURES_MODE=record  -> llama de verdad y guarda cada par request/response
+  HTTP_FIXTURES_MODE=replay  -> no abre sockets: responde desde los fixtures
+  HTTP_FIXTURES_DIR=fixtures/http  (un fichero <host>.v<N>.jsonl por host)
+
+Al grabar se limpian los secretos: cabeceras de auth/firma, parámetros
+volátiles (timestamp, signature, recvWindow...) y cualquier valor de variables
+de entorno tipo *KEY*/*SECRET*/*PASSPHRASE*/*JWT*/*TOKEN*/*ACCOUNT*.
+En replay las peticiones se emparejan por método + URL limpia + body limpio y,
+si el mismo endpoint se grabó varias veces, se devuelven en el mismo orden.
+Si no hay coincidencia exacta (ventanas startTime/endTime calculadas desde
+"ahora"), se cae a método + path, también en orden de grabación.
+Para reproducir sin claves basta con poner valores de relleno en esas
+variables (también se sustituyen por *** al calcular la clave).
+Cubre la Session compartida; el SDK de XT (pyxt) usa su propio cliente.
+
+Benchmark / perfil de una función de adapter:
+  HTTP_FIXTURES_MODE=replay python -m utils.fixtures adapters.binance:fetch_positions_binance --profile
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+FIXTURE_VERSION = 1
+FIXTURES_MODE = (os.getenv("HTTP_FIXTURES_MODE") or "").lower()  # "" | record | replay
+FIXTURES_DIR = os.getenv("HTTP_FIXTURES_DIR", os.path.join("fixtures", "http"))
+
+# Parámetros que cambian en cada llamada (no forman parte de la clave) o son firma
+VOLATILE_PARAMS = {
+    "timestamp", "signature", "sign", "recvwindow", "recv_window", "nonce",
+    "reqtime", "request_time", "api_key", "apikey", "access_key",
+}
+# Cabeceras que nunca se guardan
+SECRET_HEADER_RE = re.compile(
+    r"(key|sign|secret|passphrase|token|auth|cookie|timestamp|request-time|recv-window|account)",
+    re.I,
+)
+SECRET_ENV_RE = re.compile(r"(KEY|SECRET|PASSPHRASE|JWT|TOKEN|ACCOUNT|PRIVATE)", re.I)
+REDACTED = "***"
+
+
+def _secret_values() -> List[str]:
+    vals = []
+    for k, v in os.environ.items():
+        if SECRET_ENV_RE.search(k) and v and len(v) >= 6:
+            vals.append(v)
+    return sorted(set(vals), key=len, reverse=True)
+
+
+def scrub_text(text: str, secrets: Optional[List[str]] = None) -> str:
+    for s in secrets if secrets is not None else _secret_values():
+        if s in text:
+            text = text.replace(s, REDACTED)
+    return text
+
+
+def _clean_pairs(pairs) -> List[Tuple[str, str]]:
+    return sorted((k, v) for k, v in pairs if k.lower() not in VOLATILE_PARAMS)
+
+
+def canonical_url(url: str) -> str:
+    """URL sin parámetros volátiles y con la query ordenada."""
+    parts = urlsplit(url)
+    query = urlencode(_clean_pairs(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, query, ""))
+
+
+def _canonical_body(body) -> str:
+    if body is None:
+        return ""
+    if isinstance(body, bytes):
+        body = body.decode("utf-8", "replace")
+    try:
+        obj = json.loads(body)
+        if isinstance(obj, dict):
+            obj = {k: v for k, v in obj.items() if k.lower() not in VOLATILE_PARAMS}
+        return json.dumps(obj, sort_keys=True, separators=(",", ":"))
+    except (ValueError, TypeError):
+        return urlencode(_clean_pairs(parse_qsl(str(body), keep_blank_values=True))) or str(body)
+
+
+def request_key(method: str, url: str, body=None) -> str:
+    secrets = _secret_values()
+    raw = "|".join(
+        (method.upper(), scrub_text(canonical_url(url), secrets), scrub_text(_canonical_body(body), secrets))
+    )
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def _path_key(method: str, url: str) -> str:
+    parts = urlsplit(url)
+    return f"{method.upper()} {parts.netloc}{parts.path}"
+
+
+def fixture_path(url: str, directory: Optional[str] = None) -> str:
+    host = urlsplit(url).netloc.replace(":", "_") or "local"
+    return os.path.join(directory or FIXTURES_DIR, f"{host}.v{FIXTURE_VERSION}.jsonl")
+
+
+# ---------- record ----------
+class RecordingAdapter(HTTPAdapter):
+    """Transport real que además guarda cada respuesta (limpia) en el fixture del host."""
+
+    _lock = threading.Lock()
+
+    def __init__(self, directory: Optional[str] = None, **kw):
+        super().__init__(**kw)
+        self.directory = directory or FIXTURES_DIR
+
+    def send(self, request, **kwargs):
+        resp = super().send(request, **kwargs)
+        secrets = _secret_values()
+        entry = {
+            "v": FIXTURE_VERSION,
+            "key": request_key(request.method, request.url, request.body),
+            "method": request.method,
+            "url": scrub_text(canonical_url(request.url), secrets),
+            "status": resp.status_code,
+            "headers": {
+                k: v for k, v in resp.headers.items()
+                if not SECRET_HEADER_RE.search(k) and k.lower() not in ("content-encoding", "transfer-encoding", "content-length")
+            },
+            "body": scrub_text(resp.text, secrets),
+            "recorded_at": int(time.time()),
+        }
+        path = fixture_path(request.url, self.directory)
+        with self._lock:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "a", encoding="utf-8") as fh:
+                fh.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        return resp
+
+
+# ---------- replay ----------
+class FixtureMiss(requests.exceptions.ConnectionError):
+    """No hay fixture grabado para esta petición (en replay no se sale a la red)."""
+
+
+class ReplayAdapter(HTTPAdapter):
+    """Transport sin red: responde con las respuestas grabadas, en orden, por clave."""
+
+    def __init__(self, directory: Optional[str] = None, **kw):
+        super().__init__(**kw)
+        self.directory = directory or FIXTURES_DIR
+        self._entries: Dict[str, List[dict]] = defaultdict(list)
+        self._by_path: Dict[str, List[dict]] = defaultdict(list)
+        self._cursor: Dict[str, int] = defaultdict(int)
+        self._loaded = set()
+        self._lock = threading.Lock()
+
+    def _load(self, path: str):
+        if path in self._loaded:
+            return
+        self._loaded.add(path)
+        if not os.path.exists(path):
+            return
+        with open(path, encoding="utf-8") as fh:
+            for line in fh:
+                line = line.strip()
+                if not line:
+                    continue
+                entry = json.loads(line)
+                if entry.get("v") == FIXTURE_VERSION:
+                    self._entries[entry["key"]].append(entry)
+                    self._by_path[_path_key(entry["method"], entry["url"])].append(entry)
+
+    def send(self, request, **kwargs):
+        key = request_key(request.method, request.url, request.body)
+        with self._lock:
+            self._load(fixture_path(request.url, self.directory))
+            entries = self._entries.get(key)
+            if not entries:
+                key = _path_key(request.method, request.url)
+                entries = self._by_path.get(key)
+            if not entries:
+                raise FixtureMiss(f"sin fixture para {request.method} {canonical_url(request.url)}", request=request)
+            i = self._cursor[key]
+            entry = entries[min(i, len(entries) - 1)]  # agotadas: se repite la última
+            self._cursor[key] = i + 1
+
+        resp = requests.Response()
+        resp.status_code = entry["status"]
+        resp.headers = CaseInsensitiveDict(entry.get("headers") or {})
+        resp._content = entry["body"].encode("utf-8")
+        resp.encoding = "utf-8"
+        resp.url = request.url
+        resp.request = request
+        resp.reason = "REPLAY"
+        return resp
+
+
+def transport_adapter(**pool_kw) -> Optional[HTTPAdapter]:
+    """Adapter a montar según HTTP_FIXTURES_MODE (None = transport normal)."""
+    if FIXTURES_MODE == "record":
+        return RecordingAdapter(**pool_kw)
+    if FIXTURES_MODE == "replay":
+        from utils import ratelimit
+
+        ratelimit.set_enabled(False)  # en replay no hay venue que proteger
+        return ReplayAdapter(**pool_kw)
+    return None
+
+
+# ---------- CLI de benchmark ----------
+def _main():
+    import argparse
+    import cProfile
+    import importlib
+    import pstats
+
+    ap = argparse.ArgumentParser(description="Ejecuta una función de adapter (con HTTP_FIXTURES_MODE) y la mide")
+    ap.add_argument("target", help="modulo:funcion, p.ej. adapters.binance:fetch_positions_binance")
+    ap.add_argument("--kwargs", default="{}", help="kwargs en JSON")
+    ap.add_argument("--repeat", type=int, default=1)
+    ap.add_argument("--profile", action="store_true", help="cProfile (top 25 por tiempo acumulado)")
+    args = ap.parse_args()
+
+    mod_name, fn_name = args.target.split(":", 1)
+    fn = getattr(importlib.import_module(mod_name), fn_name)
+    kwargs = json.loads(args.kwargs)
+
+    prof = cProfile.Profile() if args.profile else None
+    times = []
+    result = None
+    for _ in range(max(1, args.repeat)):
+        t0 = time.perf_counter()
+        if prof:
+            prof.enable()
+        result = fn(**kwargs)
+        if prof:
+            prof.disable()
+        times.append(time.perf_counter() - t0)
+
+    size = len(result) if hasattr(result, "__len__") else result
+    print(f"⏱️ {args.target} [{FIXTURES_MODE or 'live'}] x{len(times)}: "
+          f"min={min(times)*1000:.1f}ms avg={sum(times)/len(times)*1000:.1f}ms  result={size}")
+    if prof:
+        pstats.Stats(prof).sort_stats("cumulative").print_stats(25)
+
+
+if __name__ == "__main__":
+    _main()
@@ -0,0 +1,168 @@
+# utils/hostpool.py
+"""
+Selección de host por latencia con failover "sticky".
+
+Para exchanges con varios hosts equivalentes (Aster: fapi.asterdex.com,
+fapi.aster.finance, ...). Cada host lleva una media móvil (EWMA) de latencia y
+de tasa de error. La latencia sale SOLO del sondeo en segundo plano (cada
+`interval` segundos, siempre el mismo endpoint ligero): las requests reales
+tardan lo que tarda el endpoint, no el host, y sesgarían la elección. Las
+requests reales sí alimentan éxito/fallo (record_success / record_failure).
+
+ordered() devuelve los hosts a probar en orden:
+  - primero el host actual mientras siga sano (sticky: no saltamos de host
+    por una diferencia pequeña, solo si otro es claramente más rápido)
+  - después el resto de sanos por puntuación (latencia penalizada por errores)
+  - al final los que están caídos (por si todos lo están)
+"""
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+HOST_EWMA_ALPHA = 0.3  # peso de la última medida
+HOST_FAIL_THRESHOLD = 3  # fallos seguidos -> host no sano
+HOST_RETRY_AFTER_SEC = 120  # un host caído se vuelve a considerar tras N s (si el sondeo no lo recuperó antes)
+HOST_SWITCH_MARGIN = 0.6  # cambiar de host solo si el mejor tarda < 60% del actual
+
+
+class _HostStats:
+    __slots__ = ("latency", "error_rate", "fails", "last_ok", "last_fail", "last_error")
+
+    def __init__(self):
+        self.latency: Optional[float] = None
+        self.error_rate = 0.0
+        self.fails = 0
+        self.last_ok = 0.0
+        self.last_fail = 0.0
+        self.last_error = ""
+
+
+class HostPool:
+    def __init__(
+        self,
+        name: str,
+        hosts: List[str],
+        probe: Optional[Callable[[str], None]] = None,
+        interval: float = 60.0,
+    ):
+        self.name = name
+        self.hosts = list(dict.fromkeys(hosts))
+        self._probe = probe
+        self.interval = interval
+        self._stats: Dict[str, _HostStats] = {h: _HostStats() for h in self.hosts}
+        self._current: Optional[str] = None
+        self._failed_from: Optional[str] = None  # host del que acabamos de salir por fallo
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    # ---------- métricas ----------
+    def record_success(self, host: str, latency: Optional[float] = None):
+        """latency solo desde probe_host; las requests reales la omiten."""
+        with self._lock:
+            st = self._stats.get(host)
+            if st is None:
+                return
+            if latency is not None:
+                st.latency = latency if st.latency is None else (
+                    HOST_EWMA_ALPHA * latency + (1 - HOST_EWMA_ALPHA) * st.latency
+                )
+            st.error_rate *= 1 - HOST_EWMA_ALPHA
+            st.fails = 0
+            st.last_ok = time.monotonic()
+
+    def record_failure(self, host: str, error: str = ""):
+        with self._lock:
+            st = self._stats.get(host)
+            if st is None:
+                return
+            st.error_rate = HOST_EWMA_ALPHA + (1 - HOST_EWMA_ALPHA) * st.error_rate
+            st.fails += 1
+            st.last_fail = time.monotonic()
+            st.last_error = error[:200]
+            if host == self._current:
+                # failover: la siguiente request elige otro y se queda en él
+                self._current, self._failed_from = None, host
+
+    def _healthy(self, st: _HostStats, now: float) -> bool:
+        if st.fails < HOST_FAIL_THRESHOLD:
+            return True
+        return now - st.last_fail > HOST_RETRY_AFTER_SEC
+
+    def _score(self, host: str) -> float:
+        st = self._stats[host]
+        # sin medir todavía: detrás de los medidos, respetando el orden configurado
+        base = st.latency if st.latency is not None else 1e6 + self.hosts.index(host)
+        return base * (1 + 10 * st.error_rate)
+
+    # ---------- selección ----------
+    def ordered(self) -> List[str]:
+        self.start()
+        now = time.monotonic()
+        with self._lock:
+            healthy = [h for h in self.hosts if self._healthy(self._stats[h], now)]
+            down = [h for h in self.hosts if h not in healthy]
+            healthy.sort(key=self._score)
+            down.sort(key=lambda h: self._stats[h].last_fail)
+            cur = self._current
+            if healthy:
+                best = healthy[0]
+                if cur is None and best == self._failed_from and len(healthy) > 1:
+                    best = healthy[1]
+                if cur not in healthy or self._score(best) < self._score(cur) * HOST_SWITCH_MARGIN:
+                    if cur is not None and cur != best:
+                        print(f"🔀 {self.name}: host {cur} -> {best}")
+                    cur = self._current = best
+                    self._failed_from = None
+                healthy.remove(cur)
+                healthy.insert(0, cur)
+            return healthy + down
+
+    def current(self) -> str:
+        return self.ordered()[0]
+
+    # ---------- sondeo ----------
+    def probe_host(self, host: str) -> bool:
+        if self._probe is None:
+            return False
+        t0 = time.monotonic()
+        try:
+            self._probe(host)
+        except Exception as e:
+            self.record_failure(host, repr(e))
+            return False
+        self.record_success(host, time.monotonic() - t0)
+        return True
+
+    def probe_all(self) -> Dict[str, bool]:
+        return {h: self.probe_host(h) for h in self.hosts}
+
+    def start(self):
+        """Arranca (una vez) el sondeo en segundo plano. interval <= 0 lo desactiva."""
+        if self._thread is not None or self._probe is None or self.interval <= 0:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+
+            def _loop():
+                while True:
+                    self.probe_all()
+                    time.sleep(self.interval)
+
+            self._thread = threading.Thread(target=_loop, name=f"hosts-{self.name}", daemon=True)
+            self._thread.start()
+
+    def status(self) -> Dict[str, Dict[str, object]]:
+        now = time.monotonic()
+        with self._lock:
+            return {
+                h: {
+                    "current": h == self._current,
+                    "healthy": self._healthy(st, now),
+                    "latency_ms": None if st.latency is None else int(st.latency * 1000),
+                    "error_rate": round(st.error_rate, 3),
+                    "consecutive_failures": st.fails,
+                    "last_error": st.last_error,
+                }
+                for h, st in self._stats.items()
+            }
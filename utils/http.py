@@ -1,17 +1,75 @@
-import requests, time as _t
-def get_session(timeout=15):
-    s = requests.Session()
-    s.request = _wrap(s.request, timeout=timeout)
+import os
+import threading
+import requests
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
+
+# Pool keep-alive compartido: un pool de conexiones por host, así el handshake
+# TCP+TLS se paga una vez por host y no en cada página de una sync.
+HTTP_POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", "32"))  # hosts con pool propio
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "16"))  # conexiones vivas por host
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "15"))  # si la llamada no pasa timeout
+
+_SHARED = None
+_SHARED_LOCK = threading.Lock()
+
+
+def _mount_pool(s):
+    from utils.fixtures import transport_adapter
+
+    pool_kw = dict(
+        pool_connections=HTTP_POOL_CONNECTIONS,
+        pool_maxsize=HTTP_POOL_MAXSIZE,
+        pool_block=False,
+    )
+    # HTTP_FIXTURES_MODE=record|replay cambia el transport (utils.fixtures)
+    adapter = transport_adapter(**pool_kw) or HTTPAdapter(**pool_kw)
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
+    return s
+
+
+def new_session(timeout=HTTP_TIMEOUT, retries=3):
+    """Session propia (con pool y reintentos) para quien necesite cabeceras/cookies aisladas."""
+    from utils.jsonfast import fast_json_hook
+
+    s = _mount_pool(requests.Session())
+    s.hooks["response"].append(fast_json_hook)  # resp.json() con orjson si está
+    s.request = _wrap(s.request, timeout=timeout, retries=retries)
     return s
 
+
+def get_session():
+    """
+    Session compartida por todos los adapters (thread-safe para peticiones).
+    Timeout por defecto único, HTTP_TIMEOUT: al ser compartida no puede
+    depender de quién la pidió primero; quien necesite otro lo pasa por
+    llamada (timeout=...) o usa new_session(timeout=...).
+    Sin reintentos propios: el helper de request de cada adapter envuelve su
+    envío en utils.resilience.call_with_retry (reintentos, Retry-After, rate
+    limit y breaker por exchange, re-firmando en cada intento). Reintentar
+    aquí, por host, duplicaría los intentos y reenviaría firmas caducadas.
+    """
+    global _SHARED
+    with _SHARED_LOCK:
+        if _SHARED is None:
+            _SHARED = new_session(timeout=HTTP_TIMEOUT, retries=1)
+        return _SHARED
+
+
 def _wrap(func, timeout=15, retries=3, backoff=0.5):
+    """Timeout por defecto + política común de reintentos (utils.resilience), por host."""
+    from utils.resilience import call_with_retry
+
     def _req(method, url, **kw):
         kw.setdefault("timeout", timeout)
-        for i in range(retries):
-            try:
-                return func(method, url, **kw)
-            except Exception:
-                if i == retries-1: raise
-                _t.sleep(backoff * (2**i))
+        if retries <= 1:
+            return func(method, url, **kw)
+        return call_with_retry(
+            urlsplit(url).netloc or "http",
+            lambda: func(method, url, **kw),
+            retries=retries,
+            base=backoff,
+            rate_limit=False,
+        )
     return _req
-
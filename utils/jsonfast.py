@@ -0,0 +1,87 @@
+# utils/jsonfast.py
+"""
+Backend JSON rápido con fallback a la stdlib.
+
+Con orjson instalado se usa para:
+  - parsear las respuestas de los exchanges (hook en la Session compartida)
+  - el raw_json de funding_events
+  - las respuestas de Flask (install_flask_json)
+Sin orjson todo sigue funcionando con json de la stdlib.
+"""
+import json as _json
+from typing import Any, Callable, Optional
+
+try:
+    import orjson
+except ImportError:  # dependencia opcional
+    orjson = None
+
+JSON_BACKEND = "orjson" if orjson is not None else "json"
+
+if orjson is not None:
+    _ORJSON_OPTS = orjson.OPT_NON_STR_KEYS
+
+
+def loads(data: Any) -> Any:
+    """bytes/str -> objeto."""
+    if orjson is not None:
+        return orjson.loads(data)
+    if isinstance(data, (bytes, bytearray)):
+        data = data.decode("utf-8")
+    return _json.loads(data)
+
+
+def dumps(obj: Any, default: Optional[Callable] = None, sort_keys: bool = False) -> str:
+    """Objeto -> str JSON compacto (sin espacios, UTF-8 sin escapar)."""
+    if orjson is not None:
+        opts = _ORJSON_OPTS | (orjson.OPT_SORT_KEYS if sort_keys else 0)
+        try:
+            return orjson.dumps(obj, default=default, option=opts).decode("utf-8")
+        except TypeError:
+            pass  # tipos raros (ints > 64 bits, etc.): la stdlib sabe más
+    return _json.dumps(
+        obj, default=default, sort_keys=sort_keys, separators=(",", ":"), ensure_ascii=False
+    )
+
+
+# ---------- requests ----------
+def fast_json_hook(resp, *args, **kwargs):
+    """Hook de respuesta de requests: resp.json() pasa por el backend rápido."""
+    if orjson is None:
+        return resp
+    original = resp.json
+
+    def _json_fast(**kw):
+        if kw:  # parse_float=..., etc. -> comportamiento original
+            return original(**kw)
+        try:
+            return orjson.loads(resp.content)
+        except ValueError:
+            return original()  # mismo error/encoding que requests
+
+    resp.json = _json_fast
+    return resp
+
+
+# ---------- Flask ----------
+def install_flask_json(app):
+    """Pone en la app un JSONProvider que serializa con orjson (si está)."""
+    if orjson is None:
+        return app
+    from flask.json.provider import DefaultJSONProvider
+
+    class FastJSONProvider(DefaultJSONProvider):
+        sort_keys = False  # ordenar claves de 10k filas no aporta nada al front
+
+        def dumps(self, obj, **kw):
+            if set(kw) - {"default", "sort_keys", "ensure_ascii"}:
+                return super().dumps(obj, **kw)  # indent/separators (modo debug)
+            return dumps(obj, default=kw.get("default", self.default), sort_keys=kw.get("sort_keys", False))
+
+        def loads(self, s, **kw):
+            if kw:
+                return super().loads(s, **kw)
+            return loads(s)
+
+    app.json = FastJSONProvider(app)
+    return app
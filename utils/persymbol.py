@@ -0,0 +1,82 @@
+# utils/persymbol.py
+"""
+Fan-out por símbolo para endpoints que exigen una request por símbolo/mercado
+(funding de KuCoin, funding de WhiteBIT, userTrades de Aster, myTrades de MEXC
+spot, positionHistory de BingX...).
+
+Cada símbolo se pide en paralelo con dos límites:
+  - por llamada: max_workers (o SYMBOL_WORKERS)
+  - por exchange: SYMBOL_CONCURRENCY[ex] requests por símbolo en vuelo a la vez,
+    compartido entre todas las llamadas concurrentes de ese exchange
+Los dos se aplican al enviar al pool (utils.fanout.gather_ordered), no dentro
+de él: un exchange en su tope no ocupa hilos que otro exchange podría usar.
+El ritmo (req/s) lo siguen marcando los token buckets de utils.ratelimit dentro
+de los helpers de request; aquí solo se acota la concurrencia.
+
+  SYMBOL_WORKERS=8                  tamaño del pool
+  SYMBOL_CONCURRENCY_<EX>=N         override por exchange (p.ej. SYMBOL_CONCURRENCY_BINGX=2)
+"""
+import os
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from utils.fanout import gather_ordered
+
+SYMBOL_WORKERS = int(os.getenv("SYMBOL_WORKERS", "8"))
+
+# Concurrencia por exchange (los que tienen límites por IP/uid más estrictos, más bajo)
+SYMBOL_CONCURRENCY: Dict[str, int] = {
+    "aster": 6,
+    "bingx": 3,
+    "kucoin": 4,
+    "mexc_spot": 4,
+    "whitebit": 4,
+}
+DEFAULT_SYMBOL_CONCURRENCY = 4
+
+_POOL = "persymbol"
+_SEMAPHORES: Dict[str, threading.BoundedSemaphore] = {}
+_SEM_LOCK = threading.Lock()
+
+
+def symbol_concurrency(exchange: str) -> int:
+    env = os.getenv(f"SYMBOL_CONCURRENCY_{exchange.upper()}")
+    if env:
+        try:
+            return max(1, int(env))
+        except ValueError:
+            pass
+    return SYMBOL_CONCURRENCY.get(exchange, DEFAULT_SYMBOL_CONCURRENCY)
+
+
+def _semaphore(exchange: str) -> threading.BoundedSemaphore:
+    with _SEM_LOCK:
+        sem = _SEMAPHORES.get(exchange)
+        if sem is None:
+            sem = _SEMAPHORES[exchange] = threading.BoundedSemaphore(symbol_concurrency(exchange))
+        return sem
+
+
+def for_each_symbol(
+    exchange: str,
+    symbols: Iterable[str],
+    fetch: Callable[[str], Any],
+    max_workers: Optional[int] = None,
+) -> List[Tuple[str, Any]]:
+    """
+    Llama fetch(symbol) para cada símbolo (sin repetidos) en paralelo y devuelve
+    [(symbol, resultado)] en el orden de entrada. Si alguno lanza, se relanza el
+    primero (en orden) cuando han terminado todos: los adapters ya capturan sus
+    errores por símbolo dentro de fetch.
+    """
+    symbols = list(dict.fromkeys(symbols))
+    workers = max(1, min(int(max_workers or SYMBOL_WORKERS), symbol_concurrency(exchange), len(symbols) or 1))
+    results = gather_ordered(
+        fetch,
+        symbols,
+        workers,
+        pool=_POOL,
+        pool_size=SYMBOL_WORKERS,
+        limit=_semaphore(exchange),
+    )
+    return list(zip(symbols, results))
@@ -0,0 +1,141 @@
+# utils/procpool.py
+"""
+Reconstrucción CPU-heavy (FIFO sobre miles de fills) en un pool de procesos.
+
+Las funciones FIFO de los adapters agrupan por símbolo y cada símbolo es
+independiente, así que se parten los fills por símbolo, cada trozo va a un
+proceso y se juntan los resultados, reordenados por close_time/símbolo (o por
+sort_key) para que salgan igual que en línea. Así una resync grande usa todos
+los cores y no retiene el GIL de los workers de Flask.
+
+RECONSTRUCT_MODE:
+  "process" -> pool de procesos si hay suficientes fills (por defecto)
+  "inline"  -> como antes, en el hilo actual
+
+Los procesos se crean con "forkserver" (o "spawn"), nunca con fork: el padre es
+un Flask lleno de hilos y un fork puede dejar al hijo bloqueado en un lock que
+estaba tomado en ese instante. Como esos hijos importan el __main__ del padre
+(portfolio.py entero), antes de crear el pool se fija utils.procpool_worker
+como __main__ para ellos: ver _pin_main.
+"""
+import importlib.util
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Iterable, List, Optional
+
+from utils.procpool_worker import run_chunk
+
+RECONSTRUCT_MODE = os.getenv("RECONSTRUCT_MODE", "process").lower()
+RECONSTRUCT_MIN_ITEMS = int(os.getenv("RECONSTRUCT_MIN_ITEMS", "1500"))  # por debajo no compensa serializar
+RECONSTRUCT_WORKERS = int(os.getenv("RECONSTRUCT_WORKERS", "0")) or (os.cpu_count() or 2)
+RECONSTRUCT_START_METHOD = os.getenv("RECONSTRUCT_START_METHOD", "forkserver").lower()
+RECONSTRUCT_TIMEOUT_SEC = float(os.getenv("RECONSTRUCT_TIMEOUT_SEC", "120"))  # luego, en línea
+
+_POOL = None
+_POOL_LOCK = threading.Lock()
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _pin_main()
+            _POOL = ProcessPoolExecutor(
+                max_workers=RECONSTRUCT_WORKERS, mp_context=_mp_context()
+            )
+        return _POOL
+
+
+def _mp_context():
+    methods = multiprocessing.get_all_start_methods()
+    method = RECONSTRUCT_START_METHOD if RECONSTRUCT_START_METHOD in methods else "spawn"
+    if method == "fork":  # no se permite: ver docstring del módulo
+        method = "forkserver" if "forkserver" in methods else "spawn"
+    return multiprocessing.get_context(method)
+
+
+def _pin_main():
+    """
+    Los hijos de forkserver/spawn reconstruyen __main__ a partir de su __spec__
+    (o de su __file__ si no tiene): con el de portfolio.py cada proceso nuevo
+    volvería a ejecutar todo el módulo. Con el spec de utils.procpool_worker
+    importan ese módulo, que no tiene efectos secundarios.
+    """
+    main = sys.modules.get("__main__")
+    if main is not None:
+        main.__spec__ = importlib.util.find_spec("utils.procpool_worker")
+
+
+def closed_order(row) -> tuple:
+    """Orden por defecto de las posiciones reconstruidas: close_time y luego símbolo."""
+    return (int(row.get("close_time") or 0), str(row.get("symbol") or ""))
+
+
+def _reset_pool():
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is not None:
+            _POOL.shutdown(wait=False, cancel_futures=True)
+        _POOL = None
+
+
+def _partition(items: List[Any], key: Callable[[Any], Any], parts: int) -> List[List[Any]]:
+    """Agrupa por key y reparte los grupos en 'parts' trozos de tamaño parecido (mayores primero)."""
+    groups = defaultdict(list)
+    for it in items:
+        groups[key(it)].append(it)
+    bins = [[] for _ in range(max(1, min(parts, len(groups))))]
+    for grp in sorted(groups.values(), key=len, reverse=True):
+        min(bins, key=len).extend(grp)
+    return [b for b in bins if b]
+
+
+def reconstruct_in_pool(
+    fn: Callable[..., list],
+    items: Iterable[Any],
+    key: Callable[[Any], Any],
+    *args,
+    sort_key: Optional[Callable[[Any], Any]] = closed_order,
+    **kwargs,
+) -> list:
+    """
+    Ejecuta fn(items, *args, **kwargs) -> list partiendo items por key (símbolo).
+    fn tiene que ser una función de módulo (picklable) y no depender de estado
+    que solo exista en el proceso padre. Ante cualquier fallo del pool, o si
+    no termina en RECONSTRUCT_TIMEOUT_SEC, se vuelve a ejecutar en línea.
+
+    Los trozos vuelven agrupados por proceso, así que el resultado (en pool o
+    en línea, para que no dependa del camino) se ordena por sort_key:
+    close_order por defecto; None lo deja como lo devuelve fn.
+    """
+    items = list(items or [])
+
+    def _inline():
+        out = fn(items, *args, **kwargs)
+        return sorted(out, key=sort_key) if sort_key and out else out
+
+    if RECONSTRUCT_MODE != "process" or len(items) < RECONSTRUCT_MIN_ITEMS:
+        return _inline()
+
+    chunks = _partition(items, key, RECONSTRUCT_WORKERS)
+    if len(chunks) <= 1 and len(items) < RECONSTRUCT_MIN_ITEMS * 4:
+        # un solo símbolo mediano: no compensa mandarlo a otro proceso
+        return _inline()
+
+    try:
+        pool = get_process_pool()
+        futures = [pool.submit(run_chunk, fn, chunk, args, kwargs) for chunk in chunks]
+        deadline = time.monotonic() + RECONSTRUCT_TIMEOUT_SEC
+        out: List[Any] = []
+        for fut in futures:
+            out.extend(fut.result(timeout=max(0.0, deadline - time.monotonic())))
+    except Exception as e:
+        print(f"⚠️ Process pool no disponible ({e}); reconstruyendo en línea")
+        _reset_pool()
+        return _inline()
+    return sorted(out, key=sort_key) if sort_key else out
@@ -0,0 +1,14 @@
+# utils/procpool_worker.py
+"""
+Punto de entrada de los procesos de utils.procpool. Import-safe: solo stdlib.
+
+Con forkserver/spawn cada proceso hijo vuelve a importar el __main__ del padre,
+que es portfolio.py (Flask, adapters, colas de jobs...). procpool fija este
+módulo como __main__ de los hijos, así un proceso nuevo solo importa esto y el
+módulo de la función FIFO que recibe.
+"""
+
+
+def run_chunk(fn, chunk, args, kwargs):
+    """fn(chunk, *args, **kwargs) en el proceso hijo (fn llega por referencia a su módulo)."""
+    return fn(chunk, *args, **kwargs) or []
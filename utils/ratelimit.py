@@ -0,0 +1,126 @@
+# utils/ratelimit.py
+"""
+Rate limit por exchange con token buckets.
+
+Cada exchange tiene un bucket (tokens/seg + ráfaga máxima) y cada endpoint un
+peso (p.ej. /fapi/v1/income pesa 30 en Binance). Los adapters llaman
+acquire(exchange, path=...) antes de cada request: si hay presupuesto sale al
+instante, si no espera justo lo necesario. Como el bucket es compartido entre
+hilos, sigue siendo seguro cuando las syncs van en paralelo.
+
+Override por entorno: RATE_LIMIT_<EXCHANGE>="rate:burst" (p.ej. "40:400").
+"""
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+# exchange -> (tokens por segundo, ráfaga)
+RATE_LIMITS: Dict[str, Tuple[float, float]] = {
+    "binance": (40.0, 400.0),  # 2400 weight/min (futures)
+    "aster": (40.0, 200.0),  # API estilo MBX, 2400 weight/min
+    "bitget": (10.0, 10.0),
+    "bingx": (5.0, 10.0),
+    "edgex": (10.0, 10.0),
+    "extended": (15.0, 15.0),  # 1000 req/min
+    "gate": (20.0, 20.0),  # 200 req/10s en spot privado
+    "mexc": (10.0, 20.0),  # 20 req / 2 s
+    "pacifica": (10.0, 10.0),
+    "paradex": (20.0, 20.0),
+    "xt": (10.0, 10.0),
+}
+DEFAULT_RATE_LIMIT = (10.0, 10.0)
+
+# (exchange, path) -> peso; lo que no está pesa 1
+ENDPOINT_WEIGHTS: Dict[Tuple[str, str], float] = {
+    ("binance", "/fapi/v1/income"): 30,
+    ("binance", "/fapi/v1/userTrades"): 5,
+    ("binance", "/fapi/v2/account"): 5,
+    ("binance", "/fapi/v2/positionRisk"): 5,
+    ("aster", "/fapi/v1/income"): 30,
+    ("aster", "/fapi/v1/userTrades"): 5,
+    ("aster", "/fapi/v2/account"): 5,
+    ("aster", "/fapi/v2/positionRisk"): 5,
+}
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = float(capacity)
+        self._ts = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, weight: float = 1.0) -> float:
+        """Bloquea hasta tener 'weight' tokens. Devuelve los segundos esperados."""
+        weight = min(float(weight), self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._ts) * self.rate)
+                self._ts = now
+                if self._tokens >= weight:
+                    self._tokens -= weight
+                    return waited
+                wait = (weight - self._tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+    def penalize(self, seconds: float):
+        """El exchange pidió esperar (429/Retry-After): vacía el bucket durante 'seconds'."""
+        with self._lock:
+            self._tokens = min(self._tokens, -float(seconds) * self.rate)
+            self._ts = time.monotonic()
+
+
+_BUCKETS: Dict[str, TokenBucket] = {}
+_BUCKETS_LOCK = threading.Lock()
+_ENABLED = True
+
+
+def set_enabled(flag: bool):
+    """Apaga/enciende el rate limit (p.ej. en replay de fixtures no hay red que proteger)."""
+    global _ENABLED
+    _ENABLED = bool(flag)
+
+
+def _limits_for(exchange: str) -> Tuple[float, float]:
+    env = os.getenv(f"RATE_LIMIT_{exchange.upper()}")
+    if env:
+        try:
+            rate, _, burst = env.partition(":")
+            return float(rate), float(burst or rate)
+        except ValueError:
+            pass
+    return RATE_LIMITS.get(exchange, DEFAULT_RATE_LIMIT)
+
+
+def get_bucket(exchange: str) -> TokenBucket:
+    with _BUCKETS_LOCK:
+        b = _BUCKETS.get(exchange)
+        if b is None:
+            b = _BUCKETS[exchange] = TokenBucket(*_limits_for(exchange))
+        return b
+
+
+def endpoint_weight(exchange: str, path: Optional[str]) -> float:
+    if not path:
+        return 1.0
+    return float(ENDPOINT_WEIGHTS.get((exchange, path.split("?", 1)[0]), 1))
+
+
+def acquire(exchange: str, weight: Optional[float] = None, path: Optional[str] = None) -> float:
+    """Consume presupuesto del exchange (peso explícito o el del endpoint)."""
+    if not _ENABLED:
+        return 0.0
+    if weight is None:
+        weight = endpoint_weight(exchange, path)
+    return get_bucket(exchange).acquire(weight)
+
+
+def penalize(exchange: str, seconds: float):
+    """Frena a todos los hilos del exchange tras un 429 / Retry-After."""
+    if _ENABLED and seconds and seconds > 0:
+        get_bucket(exchange).penalize(seconds)
@@ -0,0 +1,237 @@
+# utils/resilience.py
+"""
+Política única de reintentos para las requests de los adapters.
+
+- Reintenta errores de red, 429 y 5xx con backoff exponencial con jitter.
+- Respeta Retry-After y las cabeceras de rate limit de cada exchange
+  (Bybit X-Bapi-*, Gate X-Gate-RateLimit-*, X-RateLimit-* genéricas) y frena
+  el token bucket del exchange para que los demás hilos también esperen.
+- Circuit breaker por exchange: tras varios fallos seguidos el exchange queda
+  "abierto" durante un cooldown y las llamadas fallan al instante
+  (CircuitOpenError) en vez de gastar 3 timeouts de 20-30 s en cada refresco.
+  Pasado el cooldown se deja pasar una llamada de prueba (half-open).
+"""
+import email.utils
+import random
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+import requests
+
+from utils.ratelimit import acquire, penalize
+
+RETRY_STATUS = {408, 425, 429, 500, 502, 503, 504}
+RETRY_BASE_SEC = 0.5
+RETRY_CAP_SEC = 10.0
+BREAKER_FAIL_THRESHOLD = 3  # llamadas fallidas seguidas (ya con sus reintentos)
+BREAKER_COOLDOWN_SEC = 60.0
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """El exchange está en cooldown por fallos recientes; no se intenta la llamada."""
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, threshold: int = BREAKER_FAIL_THRESHOLD, cooldown: float = BREAKER_COOLDOWN_SEC):
+        self.name = name
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._fails = 0
+        self._opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def check(self):
+        with self._lock:
+            if self._opened_at is None:
+                return
+            remaining = self.cooldown - (time.monotonic() - self._opened_at)
+            if remaining > 0 or self._probing:
+                raise CircuitOpenError(
+                    f"{self.name}: circuito abierto ({max(remaining, 0):.0f}s de cooldown)"
+                )
+            self._probing = True  # half-open: deja pasar una sola llamada
+
+    def release(self):
+        """La llamada de prueba terminó sin veredicto (error no de red): se permite otra."""
+        with self._lock:
+            self._probing = False
+
+    def record_success(self):
+        with self._lock:
+            self._fails = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._fails += 1
+            self._probing = False
+            if self._opened_at is not None or self._fails >= self.threshold:
+                if self._opened_at is None:
+                    print(f"⛔ {self.name}: {self._fails} fallos seguidos, pausa de {self.cooldown:.0f}s")
+                self._opened_at = time.monotonic()
+
+    def status(self) -> Dict[str, object]:
+        with self._lock:
+            open_for = 0.0
+            if self._opened_at is not None:
+                open_for = max(0.0, self.cooldown - (time.monotonic() - self._opened_at))
+            return {"state": "open" if open_for > 0 else ("half_open" if self._opened_at else "closed"),
+                    "fails": self._fails, "cooldown_left": round(open_for, 1)}
+
+
+_BREAKERS: Dict[str, CircuitBreaker] = {}
+_BREAKERS_LOCK = threading.Lock()
+
+
+def get_breaker(exchange: str) -> CircuitBreaker:
+    with _BREAKERS_LOCK:
+        b = _BREAKERS.get(exchange)
+        if b is None:
+            b = _BREAKERS[exchange] = CircuitBreaker(exchange)
+        return b
+
+
+def breaker_status() -> Dict[str, Dict[str, object]]:
+    with _BREAKERS_LOCK:
+        items = list(_BREAKERS.items())
+    return {ex: b.status() for ex, b in items}
+
+
+# ---------- cabeceras de rate limit ----------
+def _reset_to_seconds(value: str, now: float) -> Optional[float]:
+    """Convierte un reset (delta en s, epoch en s o epoch en ms) a segundos de espera."""
+    try:
+        v = float(value)
+    except (TypeError, ValueError):
+        return None
+    if v > 1e12:  # epoch ms
+        return max(0.0, v / 1000.0 - now)
+    if v > 1e9:  # epoch s
+        return max(0.0, v - now)
+    return max(0.0, v)
+
+
+def retry_after_seconds(headers) -> Optional[float]:
+    """Segundos que el exchange pide esperar, o None si no lo indica."""
+    if not headers:
+        return None
+    now = time.time()
+    ra = headers.get("Retry-After")
+    if ra:
+        try:
+            return max(0.0, float(ra))
+        except ValueError:
+            try:
+                return max(0.0, email.utils.parsedate_to_datetime(ra).timestamp() - now)
+            except Exception:
+                pass
+    for h in (
+        "X-Bapi-Limit-Reset-Timestamp",  # bybit (epoch ms)
+        "X-Gate-RateLimit-Reset-Timestamp",  # gate (epoch ms)
+        "X-RateLimit-Reset",
+        "RateLimit-Reset",
+    ):
+        if headers.get(h):
+            return _reset_to_seconds(headers[h], now)
+    return None
+
+
+def _budget_exhausted(headers) -> bool:
+    if not headers:
+        return False
+    for h in ("X-Bapi-Limit-Status", "X-Gate-RateLimit-Requests-Remain", "X-RateLimit-Remaining", "RateLimit-Remaining"):
+        v = headers.get(h)
+        if v is not None:
+            try:
+                return float(v) <= 0
+            except ValueError:
+                return False
+    return False
+
+
+def backoff_delay(attempt: int, base: float = RETRY_BASE_SEC, cap: float = RETRY_CAP_SEC) -> float:
+    """Backoff exponencial con 'full jitter' (attempt empieza en 0)."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+# ---------- API ----------
+def call_with_retry(
+    exchange: str,
+    send: Callable[[], requests.Response],
+    retries: int = 3,
+    path: Optional[str] = None,
+    base: float = RETRY_BASE_SEC,
+    cap: float = RETRY_CAP_SEC,
+    rate_limit: bool = True,
+    breaker: bool = True,
+) -> requests.Response:
+    """
+    Ejecuta send() (que debe construir y firmar la request de cero, p.ej. con
+    timestamp nuevo) con la política común. Devuelve la última Response; el
+    llamante decide con raise_for_status() qué es error. Lanza la excepción de
+    red si se agotan los intentos, o CircuitOpenError si el exchange está en pausa.
+    """
+    cb = get_breaker(exchange) if breaker else None
+    if cb:
+        cb.check()
+    retries = max(1, int(retries))
+    for attempt in range(retries):
+        if rate_limit:
+            acquire(exchange, path=path)
+        try:
+            resp = send()
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            if attempt == retries - 1:
+                if cb:
+                    cb.record_failure()
+                raise
+            time.sleep(backoff_delay(attempt, base, cap))
+            continue
+        except Exception:
+            if cb:
+                cb.release()
+            raise
+
+        wait = retry_after_seconds(resp.headers) if (
+            resp.status_code in RETRY_STATUS or _budget_exhausted(resp.headers)
+        ) else None
+        if wait and rate_limit:
+            penalize(exchange, min(wait, RETRY_CAP_SEC * 6))
+
+        if resp.status_code not in RETRY_STATUS:
+            if cb:
+                cb.record_success()
+            return resp
+        if attempt == retries - 1:
+            if cb:
+                if resp.status_code >= 500:
+                    cb.record_failure()
+                else:
+                    cb.release()
+            return resp
+        if wait and rate_limit:
+            continue  # el bucket ya está frenado hasta el reset: acquire() espera
+        time.sleep(wait or backoff_delay(attempt, base, cap))
+    return resp
+
+
+def request_with_retry(
+    exchange: str,
+    method: str,
+    url: str,
+    path: Optional[str] = None,
+    retries: int = 3,
+    session=None,
+    **kwargs,
+) -> requests.Response:
+    """Atajo de call_with_retry para requests que no necesitan re-firmarse por intento."""
+    if session is None:
+        from utils.http import get_session
+
+        session = get_session()
+    return call_with_retry(
+        exchange, lambda: session.request(method, url, **kwargs), retries=retries, path=path
+    )
@@ -0,0 +1,95 @@
+# utils/singleflight.py
+"""
+Coalescencia de requests idénticas en vuelo (single-flight).
+
+Si dos hilos piden a la vez lo mismo (mismo exchange, método, path y params),
+solo uno sale a la red; el resto espera ese resultado (o esa excepción).
+Ejemplo típico: /api/balances y /api/positions llegando juntos y ambos
+pidiendo /v1/positions a Aden. No es una caché: cuando la llamada termina, la
+siguiente vuelve a salir a la red.
+
+Uso en los helpers de request de cada adapter:
+
+    @single_flight(lambda method, path, params=None: ("aden", method, path, params)
+                   if method.upper() == "GET" else None)
+    def _send_request(method, path, params=None): ...
+
+key_fn devuelve la clave o None para no coalescer (p.ej. POST/DELETE). La
+clave debe incluir todo lo que cambie la llamada (timeout, reintentos...): un
+llamante con timeout corto no debe quedar esperando a uno con timeout largo.
+
+El líder guarda en el Future una copia profunda hecha una sola vez, antes de
+publicarla; nadie la muta y cada llamante recibe un objeto propio (el líder,
+el original; los demás, una copia de esa instantánea).
+"""
+import copy
+import functools
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable
+
+
+def _freeze(obj: Any) -> Hashable:
+    if isinstance(obj, dict):
+        return tuple(sorted((str(k), _freeze(v)) for k, v in obj.items()))
+    if isinstance(obj, (list, tuple, set)):
+        return tuple(_freeze(v) for v in obj)
+    return obj
+
+
+class SingleFlight:
+    def __init__(self):
+        self._inflight: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            fut = self._inflight.get(key)
+            leader = fut is None
+            if leader:
+                fut = self._inflight[key] = Future()
+        if not leader:
+            # copia de la instantánea: cada llamante puede mutar su resultado
+            return copy.deepcopy(fut.result())
+        try:
+            result = fn()
+            snapshot = copy.deepcopy(result)
+        except BaseException as e:
+            fut.set_exception(e)
+            raise
+        else:
+            # la instantánea se publica antes de devolver: el líder puede mutar
+            # 'result' mientras los seguidores copian sin carrera
+            fut.set_result(snapshot)
+            return result
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def inflight(self) -> int:
+        with self._lock:
+            return len(self._inflight)
+
+
+_GROUP = SingleFlight()
+
+
+def coalesce(exchange: str, method: str, path: str, params: Any, fn: Callable[[], Any]) -> Any:
+    """Ejecuta fn() una sola vez por (exchange, method, path, params) concurrentes."""
+    return _GROUP.do(_freeze((exchange, (method or "").upper(), path, params)), fn)
+
+
+def single_flight(key_fn: Callable[..., Any]):
+    """Decorador: key_fn(*args, **kwargs) -> clave (o None para llamar sin coalescer)."""
+
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            key = key_fn(*args, **kwargs)
+            if key is None:
+                return fn(*args, **kwargs)
+            return _GROUP.do(_freeze(key), lambda: fn(*args, **kwargs))
+
+        return wrapper
+
+    return deco
@@ -0,0 +1,71 @@
+# utils/windows.py
+"""
+Paginación por ventanas de tiempo en paralelo.
+
+Muchos fetchers parten el histórico en ventanas fijas (7d en Binance/Aster/Bybit,
+30d en Gate spot) y las recorrían una detrás de otra. Las ventanas son
+independientes, así que se piden a la vez en un pool acotado y se devuelven en
+el orden de las ventanas (el merge/dedupe/orden final lo hace cada adapter).
+
+El presupuesto de rate limit lo siguen poniendo los helpers de request de cada
+adapter (utils.ratelimit.acquire): aquí solo se acota la concurrencia.
+
+  WINDOW_WORKERS=4      ventanas en vuelo a la vez por llamada (se envían de
+                        N en N y se repone una al acabar otra)
+  WINDOW_POOL_SIZE=16   hilos del pool "windows", uno solo para todo el proceso
+                        y compartido por todos los exchanges
+"""
+import os
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+from utils.fanout import gather_ordered
+
+WINDOW_WORKERS = int(os.getenv("WINDOW_WORKERS", "4"))
+WINDOW_POOL_SIZE = int(os.getenv("WINDOW_POOL_SIZE", "16"))
+DAY_MS = 24 * 3600 * 1000
+
+_POOL = "windows"
+
+
+def split_windows(start: int, end: int, step: int, inclusive: bool = True) -> List[Tuple[int, int]]:
+    """
+    Corta [start, end] en ventanas de 'step' (misma unidad que start/end).
+      inclusive=True  -> [s, e] cerradas sin solape (la siguiente empieza en e+1)
+      inclusive=False -> [s, e) contiguas (la siguiente empieza en e)
+    """
+    out: List[Tuple[int, int]] = []
+    step = max(1, int(step))
+    s, end = int(start), int(end)
+    if inclusive:
+        while s <= end:
+            e = min(s + step - 1, end)
+            out.append((s, e))
+            s = e + 1
+    else:
+        while s < end:
+            e = min(s + step, end)
+            out.append((s, e))
+            s = e
+    return out
+
+
+def fetch_windows(
+    fetch: Callable[[int, int], Any],
+    windows: Sequence[Tuple[int, int]],
+    max_workers: Optional[int] = None,
+) -> List[Any]:
+    """
+    Llama fetch(s, e) para cada ventana en paralelo y devuelve los resultados en
+    el orden de 'windows'. Si alguna ventana lanza, se relanza la primera (en
+    orden) cuando han terminado todas.
+    """
+    windows = list(windows)
+    workers = max(1, min(int(max_workers or WINDOW_WORKERS), len(windows) or 1))
+    # envío acotado, orden y anidamiento: utils.fanout.gather_ordered
+    return gather_ordered(
+        lambda w: fetch(*w),
+        windows,
+        workers,
+        pool=_POOL,
+        pool_size=max(WINDOW_POOL_SIZE, WINDOW_WORKERS),
+    )